@@ -4,6 +4,9 @@ Main application entry point.
 This file serves as the main entry point for the application, importing and using
 the modular components defined in the other files.
 """
+import time
+STARTUP_T0 = time.perf_counter()
+
 import logging.handlers
 import logging
 
@@ -37,6 +40,8 @@ sys.path.insert(0, str(parent_dir))
 # This will register the Chainlit handlers
 from ui.chainlit_handlers import on_chat_start, on_message
 
+logging.info("App modules imported in %.3fs", time.perf_counter() - STARTUP_T0)
+
 # The application will be run using the Chainlit CLI, which will
 # automatically discover and use the handlers defined in chainlit_handlers.py
 
@@ -8,14 +8,30 @@ from typing import List, Dict, Any
 # Load Server Configuration from External File
 CONFIG_FILE_PATH = "config.json"
 
-def load_server_config():
-    """Loads server configurations from an external JSON file."""
+def load_config_data() -> Dict[str, Any]:
+    """Loads the whole external JSON configuration file."""
     if not os.path.exists(CONFIG_FILE_PATH):
         raise FileNotFoundError(f"Configuration file '{CONFIG_FILE_PATH}' not found.")
-    
+
     with open(CONFIG_FILE_PATH, "r", encoding="utf-8") as f:
-        config_data = json.load(f)
+        return json.load(f)
+
+def load_server_config():
+    """Loads server configurations from an external JSON file."""
+    config_data = load_config_data()
 
     # print(config_data)
-    
+
     return config_data.get("servers", [])
+
+def load_llm_endpoints() -> List[Dict[str, Any]]:
+    """Loads the optional list of LLM endpoints to route between from the same JSON file."""
+    if not os.path.exists(CONFIG_FILE_PATH):
+        return []
+    return load_config_data().get("llm_endpoints", [])
+
+def load_model_policy() -> Dict[str, Any]:
+    """Loads the optional per-step model selection policy from the same JSON file."""
+    if not os.path.exists(CONFIG_FILE_PATH):
+        return {}
+    return load_config_data().get("model_policy", {})
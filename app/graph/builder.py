@@ -1,18 +1,34 @@
 """
 Graph builder for LangGraph.
 """
+import os
+
 from langgraph.graph import StateGraph, START, END
 
 from graph.state import GraphState
 from graph.nodes import initial_invoke, tool_call_and_second_invoke, finalize_answer, conditional_next
+from graph.router import local_route, route_next
+from graph.plan import plan_invoke, execute_plan, synthesize_answer, plan_next
+
+# Graph mode: "react" (one LLM call per tool call) or "plan" (plan, execute the steps, synthesize)
+GRAPH_MODE = os.getenv("GRAPH_MODE", "react")
 
-def build_graph():
+def build_graph(local_router: bool = False, mode: str = GRAPH_MODE):
     """
     Builds and compiles the LangGraph.
-    
+
+    Args:
+        local_router (bool): Put the LocalRoute node in front of InvokeLLM (react mode only).
+        mode (str): "react" or "plan".
+
     Returns:
         StateGraph: The compiled graph.
     """
+    if mode == "plan":
+        return build_plan_graph()
+    if mode != "react":
+        raise ValueError(f"Unknown graph mode '{mode}'")
+
     # Create the graph builder
     builder = StateGraph(GraphState)
     builder.auto_fields = True
@@ -22,12 +38,41 @@ def build_graph():
     builder.add_node("InvokeLLM", initial_invoke)
     builder.add_node("ToolCall", tool_call_and_second_invoke)
     builder.add_node("Finalize", finalize_answer)
+    if local_router:
+        builder.add_node("LocalRoute", local_route)
 
     # Add edges
-    builder.add_edge(START, "InvokeLLM")
+    if local_router:
+        builder.add_edge(START, "LocalRoute")
+        builder.add_conditional_edges("LocalRoute", route_next)
+    else:
+        builder.add_edge(START, "InvokeLLM")
     builder.add_conditional_edges("InvokeLLM", conditional_next)
     builder.add_edge("ToolCall", "InvokeLLM")
     builder.add_edge("Finalize", END)
 
     # Compile the graph
     return builder.compile(checkpointer=None)
+
+def build_plan_graph():
+    """
+    Builds and compiles the plan-and-execute LangGraph.
+
+    Returns:
+        StateGraph: The compiled graph.
+    """
+    builder = StateGraph(GraphState)
+
+    # Add nodes
+    builder.add_node("Plan", plan_invoke)
+    builder.add_node("Execute", execute_plan)
+    builder.add_node("Synthesize", synthesize_answer)
+
+    # Add edges
+    builder.add_edge(START, "Plan")
+    builder.add_conditional_edges("Plan", plan_next)
+    builder.add_edge("Execute", "Synthesize")
+    builder.add_edge("Synthesize", END)
+
+    # Compile the graph
+    return builder.compile(checkpointer=None)
@@ -0,0 +1,262 @@
+"""
+Tool-output compaction before results enter the chat history.
+
+A tool result is resent with every later LLM call of the conversation, so a
+verbose tool (a whole web page, a summary of a whole vault) makes every
+following turn slow and expensive. Results over TOOL_RESULT_BUDGET tokens
+are reduced locally, without an LLM call:
+
+1. whitespace is normalized and repeated lines are dropped,
+2. boilerplate is stripped: cookie and login banners, navigation menus,
+   share buttons and similar lines,
+3. if the result is still over budget, it is cut into passages and the ones
+   most relevant to the user's request and the tool arguments are kept, in
+   their original order, up to the budget.
+
+The full original is kept in the session's ToolResultStore and the history
+refers to it, so the LLM can still ask for it (see expand_result). A result
+read in full is only sent within the turn that read it; the history keeps a
+reference to it, so one expansion does not undo the budget for every later
+turn.
+"""
+import os
+import re
+import math
+from collections import Counter
+from typing import Any, Dict, List, Optional, Tuple, TYPE_CHECKING
+
+from utils.tokens import count_tokens
+
+if TYPE_CHECKING:
+    from graph.history import ToolResultStore
+
+# Logging setting
+import logging
+logger = logging.getLogger(__name__)
+
+# Token budget of one tool result in the history (0 disables compaction)
+TOOL_RESULT_BUDGET = int(os.getenv("TOOL_RESULT_BUDGET", "1500"))
+
+# Built-in tool the LLM calls to read a shortened result in full
+RESULT_SERVER = "history"
+EXPAND_TOOL = "expand_result"
+
+# Lines dropped as page furniture
+_BOILERPLATE = re.compile(
+    r"cookie|privacy policy|terms of (use|service)|all rights reserved|sign (in|up)|log ?in\b|subscribe|"
+    r"newsletter|skip to (main )?content|enable javascript|javascript is (disabled|required)|"
+    r"advertisement|^\s*(share|tweet|print|email|menu|home|search|next|previous|back to top)\s*$|"
+    r"share (on|this)|follow us|download (the|our) app|accept( all)?$|©",
+    re.IGNORECASE,
+)
+
+# A run of at least this many short lines without sentence punctuation is a menu
+_MENU_RUN = 3
+_MENU_LINE_WORDS = 4
+
+_WORD = re.compile(r"[a-z0-9]+")
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+
+_STOPWORDS = frozenset(
+    "a an the and or of for to in on at by with from is are be was were it this that as "
+    "me my i you your what which about some any can could would please".split()
+)
+
+def _terms(text: str) -> List[str]:
+    return [w for w in _WORD.findall(text.lower()) if w not in _STOPWORDS and len(w) > 1]
+
+def _is_menu_line(line: str) -> bool:
+    words = line.split()
+    return (0 < len(words) <= _MENU_LINE_WORDS and any(c.isalpha() for c in line)
+            and not line.endswith((".", "!", "?", ":", ",", ";")))
+
+def clean(text: str) -> str:
+    """
+    Normalizes whitespace and drops repeated lines and boilerplate.
+
+    Args:
+        text (str): The tool output.
+
+    Returns:
+        str: The cleaned output, paragraphs separated by blank lines.
+    """
+    lines = []
+    seen = set()
+    for raw in text.splitlines():
+        line = " ".join(raw.split())
+        if not line:
+            if lines and lines[-1]:
+                lines.append("")
+            continue
+        key = line.lower()
+        # Short structural lines (closing brackets, list markers) are kept even when repeated
+        if len(line) > 20 and key in seen:
+            continue
+        if _BOILERPLATE.search(line) and len(line) < 200:
+            continue
+        seen.add(key)
+        lines.append(line)
+
+    # Drop runs of short, unpunctuated lines: navigation menus, tag lists
+    kept = []
+    run: List[str] = []
+    for line in lines + [""]:
+        if line and _is_menu_line(line):
+            run.append(line)
+            continue
+        if len(run) < _MENU_RUN:
+            kept.extend(run)
+        run = []
+        kept.append(line)
+    return "\n".join(kept).strip()
+
+def _passages(text: str, max_tokens: int) -> List[Tuple[str, int]]:
+    """
+    Splits text into paragraphs, and paragraphs over max_tokens into groups of sentences or lines.
+    Returns each passage with its token count, so no passage is counted twice.
+    """
+    passages = []
+    for paragraph in text.split("\n\n"):
+        size = count_tokens(paragraph)
+        if size <= max_tokens:
+            passages.append((paragraph, size))
+            continue
+        pieces = paragraph.splitlines() if "\n" in paragraph else _SENTENCE_END.split(paragraph)
+        chunk: List[str] = []
+        size = 0
+        joiner = "\n" if "\n" in paragraph else " "
+        for piece in pieces:
+            n = count_tokens(piece)
+            if chunk and size + n > max_tokens:
+                passages.append((joiner.join(chunk), size))
+                chunk, size = [], 0
+            chunk.append(piece)
+            size += n
+        if chunk:
+            passages.append((joiner.join(chunk), size))
+    return [(p, size) for p, size in passages if p.strip()]
+
+def select_passages(text: str, query: str, budget: int) -> str:
+    """
+    Keeps the passages most relevant to the query, in their original order, within the budget.
+
+    Args:
+        text (str): The cleaned tool output.
+        query (str): The user's request and the tool arguments.
+        budget (int): Token budget of the result.
+
+    Returns:
+        str: The selected passages, with "[…]" where passages were left out.
+    """
+    return _select_passages(text, query, budget)[0]
+
+def _select_passages(text: str, query: str, budget: int) -> Tuple[str, int]:
+    """select_passages, also returning the tokens of the passages kept."""
+    counted = _passages(text, max(budget // 4, 50))
+    if not counted:
+        return "", 0
+    passages = [p for p, _ in counted]
+    query_terms = set(_terms(query))
+    passage_terms = [Counter(_terms(p)) for p in passages]
+    df = Counter(t for terms in passage_terms for t in terms)
+    n = len(passages)
+
+    scores = []
+    for i, terms in enumerate(passage_terms):
+        length = sum(terms.values()) or 1
+        relevance = sum(math.log((n + 1) / df[t]) * (1 + math.log(terms[t])) for t in query_terms if t in terms)
+        # Earlier passages win ties: results usually lead with what matters most
+        scores.append(relevance / math.sqrt(length) + 0.1 / (1 + i))
+
+    chosen = set()
+    used = 0
+    for i in sorted(range(n), key=lambda i: scores[i], reverse=True):
+        size = counted[i][1]
+        if used + size > budget:
+            continue
+        chosen.add(i)
+        used += size
+
+    out = []
+    for i in range(n):
+        if i in chosen:
+            out.append(passages[i])
+        elif out and out[-1] != "[…]":
+            out.append("[…]")
+    if chosen and max(chosen) < n - 1 and out[-1] != "[…]":
+        out.append("[…]")
+    return "\n\n".join(out), used
+
+def compact_tool_output(text: str, query: str, budget: int = TOOL_RESULT_BUDGET) -> str:
+    """
+    Reduces a tool output to the token budget.
+
+    Args:
+        text (str): The tool output.
+        query (str): What the output is needed for: the user's request and the tool arguments.
+        budget (int): Token budget, 0 or less to keep the output as is.
+
+    Returns:
+        str: The output itself when within budget, otherwise the reduced output.
+    """
+    return _compact(text, query, budget)[0]
+
+def _compact(text: str, query: str, budget: int) -> Tuple[str, int, int]:
+    """compact_tool_output, also returning the tokens of the output before and after, each counted once."""
+    original = count_tokens(text) if budget > 0 else 0
+    if budget <= 0 or original <= budget:
+        return text, original, original
+    cleaned = clean(text)
+    kept = count_tokens(cleaned)
+    if kept <= budget:
+        return cleaned, original, kept
+    selected, kept = _select_passages(cleaned, query, budget)
+    return selected, original, kept
+
+def _query_of(user_input: str, tool_args: Optional[Dict[str, Any]]) -> str:
+    values = [str(v) for v in (tool_args or {}).values() if isinstance(v, (str, int, float))]
+    return " ".join([user_input, *values])
+
+def history_text(store: "ToolResultStore", text: str, user_input: str,
+                 tool_args: Optional[Dict[str, Any]] = None, budget: int = TOOL_RESULT_BUDGET) -> str:
+    """
+    The form of a tool result that goes into the chat history.
+
+    Args:
+        store (ToolResultStore): The session's store, receives the original of a shortened result.
+        text (str): The tool output.
+        user_input (str): The user's request.
+        tool_args (Optional[Dict[str, Any]]): The arguments the tool was called with.
+        budget (int): Token budget of the result.
+
+    Returns:
+        str: The output, or its reduction followed by a reference to the original.
+
+    Counting tokens of a large result takes a while: async callers run this in a thread,
+    off the event loop that serves every session.
+    """
+    compacted, original, kept = _compact(text, _query_of(user_input, tool_args), budget)
+    if compacted is text:
+        return text
+
+    ref = store.put(text)
+    logger.info(f"Tool result compacted from {original} to {kept} tokens (ref {ref})")
+    return (
+        f"{compacted}\n[Shortened from about {original} tokens. To read it in full, call tool_server "
+        f"\"{RESULT_SERVER}\", tool \"{EXPAND_TOOL}\" with tool_args {{\"ref\": \"{ref}\"}}.]"
+    )
+
+def expanded_reference(ref: str) -> str:
+    """
+    What the history keeps of a result read in full with expand_result.
+
+    Args:
+        ref (str): The reference of the stored original.
+
+    Returns:
+        str: A note saying how to read the result again.
+    """
+    return (
+        f"[Result {ref} was read in full for that answer. To read it again, call tool_server "
+        f"\"{RESULT_SERVER}\", tool \"{EXPAND_TOOL}\" with tool_args {{\"ref\": \"{ref}\"}}.]"
+    )
@@ -0,0 +1,269 @@
+"""
+Bounded per-session conversation store.
+
+Tool results are held once per session in a content-addressed store; history
+messages refer to them by hash. When the recent history is rendered for an LLM
+request, each distinct result is written out once and repeats of it become a
+short back-reference, so a result returned again on a later turn costs neither
+prompt tokens nor memory a second time.
+"""
+import os
+import sys
+import json
+import hashlib
+import tempfile
+from collections import OrderedDict, deque
+from typing import Dict, Iterator, List, Optional, Set, Tuple
+import logging
+
+# Logging setting
+logger = logging.getLogger(__name__)
+
+# Number of most recent messages kept in memory for each session
+HISTORY_RING_SIZE = int(os.getenv("HISTORY_RING_SIZE", "50"))
+
+# Directory older messages are spilled to (empty string drops them instead)
+HISTORY_SPILL_DIR = os.getenv("HISTORY_SPILL_DIR", tempfile.gettempdir())
+
+# Bytes of tool results not referenced by the history (originals of shortened results) kept for each session
+TOOL_RESULT_STORE_BYTES = int(os.getenv("TOOL_RESULT_STORE_BYTES", str(8 * 1024 * 1024)))
+
+class Message:
+    """
+    A single chat message record.
+
+    A tool-result message holds (header, ref) pairs in results instead of the
+    result texts, which live in the session's ToolResultStore.
+    """
+    __slots__ = ("role", "content", "results")
+
+    def __init__(self, role: str, content: str, results: Tuple[Tuple[str, str], ...] = ()):
+        # Roles come from a tiny fixed set, interning lets every record share one string
+        self.role = sys.intern(role)
+        self.content = content
+        self.results = results
+
+class ToolResultStore:
+    """
+    Tool results of a session, each distinct content held once and addressed by a hash of it.
+
+    Results referenced by history messages are pinned until the messages leave
+    memory. Unpinned results are dropped least recently used first once the
+    store holds more than max_bytes.
+    """
+    def __init__(self, max_bytes: int = TOOL_RESULT_STORE_BYTES):
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self._results: "OrderedDict[str, str]" = OrderedDict()
+        self._pins: Dict[str, int] = {}
+
+    def put(self, text: str, pin: bool = False) -> str:
+        """
+        Stores a result.
+
+        Args:
+            text (str): The result.
+            pin (bool): Keep the result until release() is called for it.
+
+        Returns:
+            str: Its reference. Storing the same content again returns the same reference.
+        """
+        ref = hashlib.sha1(text.encode("utf-8")).hexdigest()[:12]
+        if pin:
+            self._pins[ref] = self._pins.get(ref, 0) + 1
+        if ref in self._results:
+            self._results.move_to_end(ref)
+            return ref
+        self._results[ref] = text
+        self.nbytes += len(text)
+        self._evict(keep=ref)
+        return ref
+
+    def release(self, ref: str) -> None:
+        """
+        Unpins a result stored with pin=True, making it evictable once nothing else pins it.
+
+        Args:
+            ref (str): The reference returned by put().
+        """
+        pins = self._pins.get(ref, 0) - 1
+        if pins > 0:
+            self._pins[ref] = pins
+            return
+        self._pins.pop(ref, None)
+        self._evict()
+
+    def _evict(self, keep: Optional[str] = None) -> None:
+        """Drops unpinned results, oldest first, until the store is within max_bytes."""
+        if self.nbytes <= self.max_bytes:
+            return
+        for ref in [r for r in self._results if r != keep and r not in self._pins]:
+            self.nbytes -= len(self._results.pop(ref))
+            if self.nbytes <= self.max_bytes:
+                return
+
+    def get(self, ref: str) -> Optional[str]:
+        """
+        Returns a stored result.
+
+        Args:
+            ref (str): The reference returned by put().
+
+        Returns:
+            Optional[str]: The result, or None if it is unknown or was dropped.
+        """
+        text = self._results.get(ref)
+        if text is not None:
+            self._results.move_to_end(ref)
+        return text
+
+    def clear(self) -> None:
+        self._results.clear()
+        self._pins.clear()
+        self.nbytes = 0
+
+    def __contains__(self, ref: str) -> bool:
+        return ref in self._results
+
+    def __len__(self) -> int:
+        return len(self._results)
+
+class ConversationBuffer:
+    """
+    Ring of recent chat messages with older messages spilled out of memory.
+
+    Appending is O(1) and never copies the buffer. Once the ring is full, the
+    oldest message is written to a per-session JSONL spill file before it is
+    evicted, so the in-memory footprint of a session stays bounded.
+    """
+    def __init__(self, capacity: int = HISTORY_RING_SIZE, spill_dir: Optional[str] = HISTORY_SPILL_DIR):
+        """
+        Initialize the conversation buffer.
+
+        Args:
+            capacity (int): Number of messages kept in memory.
+            spill_dir (Optional[str]): Directory for the spill file, or None/"" to drop old messages.
+        """
+        self._ring: deque = deque(maxlen=max(1, capacity))
+        self._spill_dir = spill_dir or None
+        self._spill_path: Optional[str] = None
+        self._spilled = 0
+        self.results = ToolResultStore()  # Tool results in the history, and originals of the shortened ones
+
+    def append(self, role: str, content: str) -> None:
+        """
+        Appends a message, spilling the oldest one if the ring is full.
+
+        Args:
+            role (str): The message role.
+            content (str): The message content.
+        """
+        self._push(Message(role, content))
+
+    def append_tool_results(self, sections: List[Tuple[str, str]], role: str = "assistant") -> None:
+        """
+        Appends tool results as a single message, holding each result text in the store.
+
+        Args:
+            sections (List[Tuple[str, str]]): (header, result text) of each result.
+            role (str): The message role.
+        """
+        self._push(Message(role, "", tuple((header, self.results.put(text, pin=True)) for header, text in sections)))
+
+    def _push(self, message: Message) -> None:
+        if len(self._ring) == self._ring.maxlen:
+            evicted = self._ring[0]
+            self._spill(evicted)
+            for _, ref in evicted.results:
+                self.results.release(ref)
+        self._ring.append(message)
+
+    def _text(self, message: Message, expanded: Optional[Set[str]] = None) -> str:
+        """
+        The content of a message, with its tool results written out.
+
+        Args:
+            message (Message): The message.
+            expanded (Optional[Set[str]]): Refs already written out in the request being built;
+                their repeats become back-references. Refs written out here are added.
+
+        Returns:
+            str: The message content.
+        """
+        if not message.results:
+            return message.content
+        sections = []
+        for header, ref in message.results:
+            if expanded is not None and ref in expanded:
+                body = f"[Same result as above, ref {ref}]"
+            else:
+                body = self.results.get(ref) or f"[Result {ref} is no longer available]"
+                if expanded is not None:
+                    expanded.add(ref)
+            sections.append(header + body)
+        return "\n\n".join(sections)
+
+    def recent(self, n: int) -> List[Dict[str, str]]:
+        """
+        Returns the last n messages in the OpenAI chat format.
+
+        Each distinct tool result is written out once, at its first occurrence;
+        later occurrences refer back to it.
+
+        Args:
+            n (int): Number of messages to return.
+
+        Returns:
+            List[Dict[str, str]]: The most recent messages, oldest first.
+        """
+        size = len(self._ring)
+        start = max(0, size - n)
+        expanded: Set[str] = set()
+        return [{"role": self._ring[i].role, "content": self._text(self._ring[i], expanded)}
+                for i in range(start, size)]
+
+    def spilled(self) -> Iterator[Message]:
+        """Yields the messages that were spilled out of memory, oldest first."""
+        if self._spill_path is None:
+            return
+        with open(self._spill_path, "r", encoding="utf-8") as f:
+            for line in f:
+                record = json.loads(line)
+                yield Message(record["role"], record["content"])
+
+    @property
+    def nbytes(self) -> int:
+        """Approximate number of bytes of message content and distinct tool results held in memory."""
+        return sum(len(m.content) for m in self._ring) + self.results.nbytes
+
+    def close(self) -> None:
+        """Drops all messages and removes the spill file."""
+        self._ring.clear()
+        self.results.clear()
+        self._spilled = 0
+        if self._spill_path is not None:
+            try:
+                os.remove(self._spill_path)
+            except OSError as e:
+                logger.warning(f"Could not remove history spill file {self._spill_path}: {e}")
+            self._spill_path = None
+
+    def _spill(self, message: Message) -> None:
+        """Writes an evicted message to the spill file."""
+        self._spilled += 1
+        if self._spill_dir is None:
+            return
+        try:
+            if self._spill_path is None:
+                fd, self._spill_path = tempfile.mkstemp(prefix="history-", suffix=".jsonl", dir=self._spill_dir)
+                os.close(fd)
+            with open(self._spill_path, "a", encoding="utf-8") as f:
+                f.write(json.dumps({"role": message.role, "content": self._text(message)}) + "\n")
+        except OSError as e:
+            logger.warning(f"Could not spill chat history: {e}")
+
+    def __len__(self) -> int:
+        return self._spilled + len(self._ring)
+
+    def __iter__(self) -> Iterator[Message]:
+        return (Message(m.role, self._text(m)) for m in self._ring)
@@ -1,12 +1,13 @@
 """
 Node functions for LangGraph.
 """
+import asyncio
 from typing import Dict, Any
-from dataclasses import asdict
 
 from langgraph.types import Command
 
 from graph.state import GraphState, MyState
+from graph.compaction import history_text, expanded_reference, RESULT_SERVER, EXPAND_TOOL
 from utils.prompts import generate_system_prompt
 from utils.parsing import parse_ai_response
 from utils.formatting import pretty_print, print_tool_response
@@ -15,6 +16,20 @@ import logging
 # Logging setting
 logger = logging.getLogger(__name__)
 
+def tool_result_text(tool_res: Any) -> str:
+    """
+    Converts an MCP tool result to a string.
+
+    Args:
+        tool_res (Any): The result of MCPToolManager.call_tool.
+
+    Returns:
+        str: The text content of the result.
+    """
+    if hasattr(tool_res, "content"):
+        return "\n".join(content.text for content in tool_res.content)
+    return str(tool_res)  # Fallback if `content` is not present
+
 async def initial_invoke(state: GraphState, config: dict):
     """
     Initial node function that invokes the LLM with the user input.
@@ -30,21 +45,20 @@ async def initial_invoke(state: GraphState, config: dict):
     tm = my_state.tool_manager
     llm = my_state.llm
 
-    if not hasattr(my_state, "chat_history") or my_state.chat_history is None:
-        my_state.chat_history = []
-
     # Generate the system prompt dynamically
     system_prompt = generate_system_prompt(tm)
     
     if len(my_state.chat_history) > 10:
         call_message = [
-            *(my_state.chat_history[-10:]),
+            *my_state.chat_history.recent(10),
+            *my_state.expanded_messages(),
             {"role": "user", "content": my_state.user_input}
         ]    
     else:
         call_message = [
             {"role": "system", "content": system_prompt},
-            *(my_state.chat_history[-10:]),
+            *my_state.chat_history.recent(10),
+            *my_state.expanded_messages(),
             {"role": "user", "content": my_state.user_input}
         ]
 
@@ -54,32 +68,50 @@ async def initial_invoke(state: GraphState, config: dict):
     logger.debug("%s", pretty_print(call_message))
     logger.debug("---")
 
-    content = llm.invoke(call_message)
+    # Pick the model for this step (cheap for tool decisions, strong for the final answer)
+    policy = my_state.model_policy
+    model = policy.select(state) if policy else None
+    content = await llm.ainvoke(call_message, model=model)
 
     need_tool, tool_server, tname, targs, final_ans = parse_ai_response(content)
 
+    escalate_model = policy.escalation(model, need_tool, state) if policy else None
+    if escalate_model:
+        logger.info(f"Escalating InvokeLLM step from {model} to {escalate_model}")
+        content = await llm.ainvoke(call_message, model=escalate_model)
+        need_tool, tool_server, tname, targs, final_ans = parse_ai_response(content)
+
     logger.debug("---")
     logger.debug("Call LLM Responses:")
     logger.debug(content)
     logger.debug("need_tool: %s", need_tool)
     logger.debug("---")
 
+    # Teach the local router the requests it had to leave to the LLM
+    if need_tool and my_state.local_router and not state.tool_result:
+        my_state.local_router.learn(my_state.user_input, tool_server, tname)
+
     # Update chat history based on response
     if need_tool is not None:
         if need_tool == False:
             my_state.final_answer = final_ans
             # Append new interaction to chat history
-            my_state.chat_history.append({"role": "assistant", "content": final_ans})
+            my_state.chat_history.append("assistant", final_ans)
         else:
-            my_state.chat_history.append({"role": "assistant", "content": final_ans})
+            my_state.chat_history.append("assistant", final_ans)
 
-    return Command(update=asdict(GraphState(
-        tool_invocation_needed=need_tool,
-        tool_server=tool_server,
-        tool_name=tname,
-        tool_arguments=targs,
-        final_answer=final_ans
-    )))
+    # Every channel is decided by this step, so all of them are updated
+    return Command(update={
+        "tool_invocation_needed": need_tool,
+        "tool_server": tool_server,
+        "tool_name": tname,
+        "tool_arguments": targs,
+        "final_answer": final_ans,
+    })
+
+def tool_limit_message(tool_name: str, limit: int) -> str:
+    """The result given in place of a tool call over the tool's usage limit."""
+    return f"Tool usage limit reached: {tool_name} can only be used {limit} times."
 
 async def tool_call_and_second_invoke(state: GraphState, config: dict):
     """
@@ -94,51 +126,51 @@ async def tool_call_and_second_invoke(state: GraphState, config: dict):
     """
     my_state: MyState = config["configurable"]["my_state"]
     tm = my_state.tool_manager
+    header = f"Tool result from {state.tool_server} {state.tool_name} using {state.tool_arguments} below:\n"
+    history_str = None  # What the history keeps, when it is not the result itself
     
-    # Initialize the tool server in the usage counts dictionary if it doesn't exist
-    if state.tool_server not in my_state.tool_usage_counts:
-        my_state.tool_usage_counts[state.tool_server] = {}
-    
-    # Initialize the tool name in the usage counts dictionary if it doesn't exist
-    if state.tool_name not in my_state.tool_usage_counts[state.tool_server]:
-        my_state.tool_usage_counts[state.tool_server][state.tool_name] = 0
-    
-    # Check if the tool has reached its usage limit
-    if my_state.tool_usage_counts[state.tool_server][state.tool_name] >= my_state.max_tool_uses:
+    # Check if the tool has reached its usage limit, and count this use if not
+    if not my_state.use_tool(state.tool_server, state.tool_name):
         # Tool limit reached, return a message instead of calling the tool
-        tool_res_str = f"Tool usage limit reached: {state.tool_name} can only be used {my_state.max_tool_uses} times."
+        tool_res_str = tool_limit_message(state.tool_name, my_state.max_tool_uses)
         logger.warning(tool_res_str)
+    elif state.tool_server == RESULT_SERVER and state.tool_name == EXPAND_TOOL:
+        # Built-in tool: the full original of a result that was shortened in the history
+        ref = str((state.tool_arguments or {}).get("ref", ""))
+        tool_res_str = my_state.chat_history.results.get(ref)
+        if tool_res_str is None:
+            tool_res_str = f"No stored tool result with ref '{ref}'."
+        else:
+            # Sent in full with this message's LLM calls only, the history keeps the reference
+            my_state.expanded_results.append((header, tool_res_str))
+            history_str = expanded_reference(ref)
     else:
-        # Increment the tool usage counter
-        my_state.tool_usage_counts[state.tool_server][state.tool_name] += 1
-        
         # Log the current tool usage
         logger.info(f"Tool usage: {state.tool_server}.{state.tool_name} - " +
                     f"{my_state.tool_usage_counts[state.tool_server][state.tool_name]}/{my_state.max_tool_uses}")
         
         # Call the tool
-        tool_res = await tm.call_tool(state.tool_server, state.tool_name, state.tool_arguments)
+        tool_res = await tm.call_tool(state.tool_server, state.tool_name, state.tool_arguments,
+                                      progress=my_state.progress_for(f"{state.tool_server}.{state.tool_name}"))
         
         logger.info("---")
         logger.info("Tool response:")
         logger.info("%s", print_tool_response(tool_res))
         logger.info("---")
 
-        # Convert tool_res to a string before using it
-        if hasattr(tool_res, "content"):
-            tool_res_str = "\n".join(content.text for content in tool_res.content)
-        else:
-            tool_res_str = str(tool_res)  # Fallback if `content` is not present
+        # Verbose results are reduced to a token budget, the original stays retrievable by reference.
+        # Off the event loop: counting the tokens of a large result would stall every session
+        tool_res_str = await asyncio.to_thread(history_text, my_state.chat_history.results, tool_result_text(tool_res),
+                                               my_state.user_input, state.tool_arguments)
     
-    my_state.chat_history.append({"role": "assistant", "content": f"Tool result from {state.tool_server} {state.tool_name} using {state.tool_arguments} below:"})
-    my_state.chat_history.append({"role": "assistant", "content": tool_res_str})
+    # Store the tool result as a single message; its text is held once per session and replayed once per request
+    my_state.chat_history.append_tool_results([(header, tool_res_str if history_str is None else history_str)])
     
-    return Command(update=asdict(GraphState(
-        tool_invocation_needed=False,
-        tool_name=None,
-        tool_arguments=None,
-        tool_result=tool_res_str        
-    )))
+    # Only the channels this step changes are updated; the rest are left as they are
+    return Command(update={
+        "tool_invocation_needed": False,
+        "tool_result": tool_res_str,
+    })
 
 def finalize_answer(state: GraphState, config: dict):
     """
@@ -0,0 +1,354 @@
+"""
+Plan-and-execute nodes for LangGraph.
+
+Instead of one LLM call per tool call, the LLM plans every tool step of the
+request at once, with declared dependencies. The steps are run as a DAG:
+each starts as soon as the steps it depends on have finished, so
+independent steps run concurrently, and a step's arguments can use the
+results of its dependencies. One more LLM call writes the answer from all
+results, so a request using N tools costs two LLM calls instead of N + 1.
+"""
+import os
+import re
+import json
+import asyncio
+from typing import Any, Dict, List, Optional, Tuple
+
+from langgraph.types import Command
+
+from graph.state import GraphState, MyState
+from graph.nodes import tool_result_text, tool_limit_message
+from graph.compaction import history_text, expanded_reference, RESULT_SERVER, EXPAND_TOOL
+from utils.prompts import generate_system_prompt, load_prompt_template, PLAN_PROMPT_PATH, SYNTHESIS_PROMPT_PATH
+from utils.formatting import pretty_print
+import logging
+
+# Logging setting
+logger = logging.getLogger(__name__)
+
+# Upper bound on the steps of one plan, and on the steps running at the same time
+PLAN_MAX_STEPS = int(os.getenv("PLAN_MAX_STEPS", "8"))
+PLAN_MAX_PARALLEL = int(os.getenv("PLAN_MAX_PARALLEL", "4"))
+
+# Uses of one tool allowed in a plan, e.g. parallel searches (never fewer than max_tool_uses, never more than PLAN_MAX_STEPS)
+PLAN_MAX_TOOL_USES = int(os.getenv("PLAN_MAX_TOOL_USES", "4"))
+
+# Used when the synthesis prompt template is missing
+SYNTHESIS_FALLBACK_PROMPT = "You are a helpful AI assistant. Answer the user in markdown using the tool results in the conversation."
+
+# Sent back to the planner with the validation error of an invalid plan, which it gets one chance to correct
+PLAN_RETRY_PROMPT = "Your plan is invalid: {error}. Return the corrected plan as raw JSON in the same format."
+
+# The answer when the corrected plan is invalid too
+PLAN_FAILED_ANSWER = "Sorry, I could not plan the tool calls needed to answer this ({error}). Please try rephrasing the request."
+
+# "$s1" in a step's arguments is replaced by the result of step s1
+_STEP_REF = re.compile(r"\$(\w+)")
+
+class PlanError(ValueError):
+    """Raised when a plan is not a valid DAG of tool steps."""
+
+def parse_plan(content: str) -> Tuple[Optional[List[Dict[str, Any]]], str]:
+    """
+    Parses and validates the planner's response.
+
+    Args:
+        content (str): The raw response from the LLM.
+
+    Returns:
+        tuple: (steps, response). steps is empty when no tool is needed, and None when the
+            response is not JSON, in which case response holds the raw text.
+
+    Raises:
+        PlanError: The response is a plan, but its steps are not a valid DAG.
+    """
+    try:
+        data = json.loads(content)
+    except json.JSONDecodeError:
+        logger.error("Loading AI JSON plan failed!!!")
+        logger.error(content)
+        return None, content.strip()
+
+    response = data.get("response", "")
+    if not isinstance(response, str):
+        response = str(response)
+
+    return validate_plan(data.get("steps") or []), response.strip()
+
+def validate_plan(steps: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Checks that the steps form a DAG over known step ids and normalizes them.
+
+    A step whose arguments use "$<step id>" of another step depends on it, listed or not.
+
+    Args:
+        steps (List[Dict[str, Any]]): Steps with "id", "tool_server", "tool", "tool_args", "depends_on".
+
+    Returns:
+        List[Dict[str, Any]]: The normalized steps, in the planned order.
+    """
+    if len(steps) > PLAN_MAX_STEPS:
+        raise PlanError(f"{len(steps)} steps, at most {PLAN_MAX_STEPS} are allowed")
+
+    normalized = []
+    ids = set()
+    for i, step in enumerate(steps):
+        if not isinstance(step, dict) or not step.get("tool_server") or not step.get("tool"):
+            raise PlanError(f"step {i} has no tool_server or tool")
+        step_id = str(step.get("id") or f"s{i + 1}")
+        if step_id in ids:
+            raise PlanError(f"duplicate step id {step_id}")
+        ids.add(step_id)
+        normalized.append({
+            "id": step_id,
+            "tool_server": step["tool_server"],
+            "tool": step["tool"],
+            "tool_args": step.get("tool_args") or {},
+            "depends_on": [str(d) for d in step.get("depends_on") or []],
+        })
+
+    # A step using another step's result waits for it, whether or not the planner listed it
+    for step in normalized:
+        for ref in step_references(step["tool_args"]):
+            if ref in ids and ref not in step["depends_on"]:
+                step["depends_on"].append(ref)
+
+    deps = {s["id"]: s["depends_on"] for s in normalized}
+    for step_id, step_deps in deps.items():
+        unknown = [d for d in step_deps if d not in ids]
+        if unknown:
+            raise PlanError(f"step {step_id} depends on unknown steps {unknown}")
+
+    # Depth-first search for cycles
+    state: Dict[str, int] = {}  # 1 = visiting, 2 = done
+    def visit(step_id: str):
+        if state.get(step_id) == 2:
+            return
+        if state.get(step_id) == 1:
+            raise PlanError(f"dependency cycle through step {step_id}")
+        state[step_id] = 1
+        for d in deps[step_id]:
+            visit(d)
+        state[step_id] = 2
+    for step_id in deps:
+        visit(step_id)
+
+    return normalized
+
+def step_references(value: Any) -> List[str]:
+    """The "$<step id>" references in tool arguments, in order; dicts and lists are searched recursively."""
+    if isinstance(value, str):
+        return _STEP_REF.findall(value)
+    if isinstance(value, dict):
+        return [ref for v in value.values() for ref in step_references(v)]
+    if isinstance(value, list):
+        return [ref for v in value for ref in step_references(v)]
+    return []
+
+def plan_tool_limit(my_state: MyState) -> int:
+    """Uses of each tool allowed in plan mode."""
+    return max(my_state.max_tool_uses, min(PLAN_MAX_TOOL_USES, PLAN_MAX_STEPS))
+
+def substitute_results(value: Any, results: Dict[str, str]) -> Any:
+    """
+    Replaces "$<step id>" references in tool arguments with the steps' results.
+
+    Args:
+        value (Any): An argument value; dicts and lists are handled recursively.
+        results (Dict[str, str]): Results of the finished steps.
+
+    Returns:
+        Any: The value with references replaced.
+    """
+    if isinstance(value, str):
+        return _STEP_REF.sub(lambda m: results.get(m.group(1), m.group(0)), value)
+    if isinstance(value, dict):
+        return {k: substitute_results(v, results) for k, v in value.items()}
+    if isinstance(value, list):
+        return [substitute_results(v, results) for v in value]
+    return value
+
+async def plan_invoke(state: GraphState, config: dict):
+    """
+    Node function that asks the LLM for a plan of tool steps.
+
+    Args:
+        state (GraphState): The current graph state.
+        config (dict): Configuration including the MyState instance.
+
+    Returns:
+        Command: Update command with the plan, or the final answer when no tool is needed.
+    """
+    my_state: MyState = config["configurable"]["my_state"]
+    system_prompt = generate_system_prompt(my_state.tool_manager, PLAN_PROMPT_PATH)
+    # The planner is told the limit the executor applies, so it does not plan steps that will be refused
+    system_prompt += f"\nEach tool can be used at most {plan_tool_limit(my_state)} times in a plan."
+    call_message = [
+        {"role": "system", "content": system_prompt},
+        *my_state.chat_history.recent(10),
+        {"role": "user", "content": my_state.user_input}
+    ]
+
+    logger.debug("---")
+    logger.debug("Call LLM Plan Messages:")
+    logger.debug("%s", pretty_print(call_message))
+    logger.debug("---")
+
+    policy = my_state.model_policy
+    model = policy.tool_model if policy else None
+    content = await my_state.llm.ainvoke(call_message, model=model)
+    try:
+        steps, response = parse_plan(content)
+    except PlanError as e:
+        # Its preamble ("I will look up...") is no answer: the planner gets one chance to fix the plan
+        logger.warning(f"Invalid plan, asking the planner to correct it: {e}")
+        call_message += [
+            {"role": "assistant", "content": content},
+            {"role": "user", "content": PLAN_RETRY_PROMPT.format(error=e)},
+        ]
+        content = await my_state.llm.ainvoke(call_message, model=model)
+        try:
+            steps, response = parse_plan(content)
+        except PlanError as e:
+            logger.error(f"Invalid plan after correction: {e}")
+            steps, response = [], PLAN_FAILED_ANSWER.format(error=e)
+
+    if not steps:
+        # No tool needed (or a response that is not a plan): the response is the answer
+        my_state.final_answer = response
+        my_state.chat_history.append("assistant", response)
+        return Command(update={"plan": [], "final_answer": response})
+
+    logger.info("Planned %d steps: %s", len(steps),
+                ", ".join(f"{s['id']}={s['tool_server']}.{s['tool']}" for s in steps))
+    return Command(update={"plan": steps})
+
+async def execute_plan(state: GraphState, config: dict):
+    """
+    Node function that runs the planned steps, each as soon as its dependencies are done.
+
+    Args:
+        state (GraphState): The current graph state.
+        config (dict): Configuration including the MyState instance.
+
+    Returns:
+        Command: Update command with the results by step id.
+    """
+    my_state: MyState = config["configurable"]["my_state"]
+    tm = my_state.tool_manager
+    steps = {s["id"]: s for s in state.plan}
+    results: Dict[str, str] = {}
+    failed = set()
+    limit = asyncio.Semaphore(PLAN_MAX_PARALLEL)
+    tasks: Dict[str, asyncio.Task] = {}
+    store = my_state.chat_history.results
+    expanded: Dict[str, str] = {}  # Steps that read a stored result in full, and the result's ref
+    tool_limit = plan_tool_limit(my_state)
+
+    async def run(step: Dict[str, Any]):
+        if step["depends_on"]:
+            await asyncio.gather(*(tasks[d] for d in step["depends_on"]))
+        blocked = [d for d in step["depends_on"] if d in failed]
+        if blocked:
+            failed.add(step["id"])
+            results[step["id"]] = f"Skipped: depends on failed steps {blocked}"
+            return
+
+        # Counted like in react mode, against the plan's own limit
+        if not my_state.use_tool(step["tool_server"], step["tool"], tool_limit):
+            failed.add(step["id"])
+            results[step["id"]] = tool_limit_message(step["tool"], tool_limit)
+            logger.warning(f"Plan step {step['id']}: {results[step['id']]}")
+            return
+
+        args = substitute_results(step["tool_args"], results)
+        if (step["tool_server"], step["tool"]) == (RESULT_SERVER, EXPAND_TOOL):
+            ref = str(args.get("ref", ""))
+            full = store.get(ref)
+            if full is None:
+                results[step["id"]] = f"No stored tool result with ref '{ref}'."
+            else:
+                results[step["id"]] = full
+                expanded[step["id"]] = ref
+            return
+        async with limit:
+            logger.info(f"Plan step {step['id']}: {step['tool_server']}.{step['tool']}")
+            try:
+                tool_res = await tm.call_tool(step["tool_server"], step["tool"], args,
+                                              progress=my_state.progress_for(f"{step['id']}: {step['tool_server']}.{step['tool']}"))
+            except Exception as e:
+                tool_res = {"error": str(e)}
+
+        if isinstance(tool_res, dict) and "error" in tool_res:
+            failed.add(step["id"])
+            results[step["id"]] = f"Error: {tool_res['error']}"
+        else:
+            results[step["id"]] = tool_result_text(tool_res)
+
+    # Tasks are created in plan order; validation guarantees dependencies exist and form no cycle
+    for step_id, step in steps.items():
+        tasks[step_id] = asyncio.create_task(run(step))
+    try:
+        await asyncio.gather(*tasks.values())
+    finally:
+        for task in tasks.values():
+            task.cancel()
+
+    # Store all results as a single message so they are only held (and replayed) once.
+    # Dependent steps got the full results; the history gets them reduced to the token budget, off the event loop.
+    # A result read in full is sent with this message's synthesis only, the history keeps its reference
+    headers = {step_id: f"Tool result of step {step_id} from {s['tool_server']} {s['tool']} using {s['tool_args']} below:\n"
+               for step_id, s in steps.items()}
+    def history_sections():
+        return [
+            (headers[step_id],
+             expanded_reference(expanded[step_id]) if step_id in expanded else
+             history_text(store, results[step_id], my_state.user_input, s['tool_args']))
+            for step_id, s in steps.items()
+        ]
+    sections = await asyncio.to_thread(history_sections)
+    my_state.chat_history.append_tool_results(sections)
+    my_state.expanded_results += [(headers[step_id], results[step_id]) for step_id in expanded]
+
+    return Command(update={"step_results": results})
+
+async def synthesize_answer(state: GraphState, config: dict):
+    """
+    Node function that writes the answer from all step results with one LLM call.
+
+    Args:
+        state (GraphState): The current graph state.
+        config (dict): Configuration including the MyState instance.
+
+    Returns:
+        Command: Update command with the final answer.
+    """
+    my_state: MyState = config["configurable"]["my_state"]
+    call_message = [
+        {"role": "system", "content": load_prompt_template(SYNTHESIS_PROMPT_PATH, SYNTHESIS_FALLBACK_PROMPT)},
+        *my_state.chat_history.recent(10),
+        *my_state.expanded_messages(),
+        {"role": "user", "content": my_state.user_input}
+    ]
+
+    policy = my_state.model_policy
+    answer = (await my_state.llm.ainvoke(call_message, model=policy.answer_model if policy else None)).strip()
+
+    my_state.final_answer = answer
+    my_state.chat_history.append("assistant", answer)
+    return Command(update={"final_answer": answer})
+
+def plan_next(state: GraphState, config: dict) -> str:
+    """
+    Conditional edge after Plan.
+
+    Args:
+        state (GraphState): The current graph state.
+        config (dict): Configuration.
+
+    Returns:
+        str: "Execute" when there are steps to run, otherwise END.
+    """
+    from langgraph.graph import END
+
+    return "Execute" if state.plan else END
@@ -0,0 +1,74 @@
+"""
+Per-step model selection policy for the graph.
+"""
+from dataclasses import dataclass, field
+from typing import Any, Dict, FrozenSet, Optional
+
+from graph.state import GraphState
+
+# Conditions under which a tool-model turn is redone with the answer model
+ESCALATE_PARSE_ERROR = "parse_error"      # the response is not the expected JSON
+ESCALATE_DIRECT_ANSWER = "direct_answer"  # the model answered without using any tool
+
+@dataclass(slots=True)
+class ModelPolicy:
+    """
+    Chooses the model for each InvokeLLM step.
+
+    Turns that have not seen a tool result yet are usually routing decisions
+    and go to the cheap tool_model; turns after a tool result write the final
+    report and go to the strong answer_model. None means the client's default
+    model. A tool-model turn matching one of the escalate_on conditions is
+    redone with the answer model.
+    """
+    tool_model: Optional[str] = None
+    answer_model: Optional[str] = None
+    escalate_on: FrozenSet[str] = field(default_factory=lambda: frozenset({ESCALATE_PARSE_ERROR}))
+
+    @classmethod
+    def from_config(cls, cfg: Dict[str, Any]) -> "ModelPolicy":
+        """
+        Builds a policy from the "model_policy" section of config.json.
+
+        Args:
+            cfg (Dict[str, Any]): Keys "tool_model", "answer_model" and "escalate_on" (list).
+
+        Returns:
+            ModelPolicy: The policy.
+        """
+        policy = cls(tool_model=cfg.get("tool_model"), answer_model=cfg.get("answer_model"))
+        if "escalate_on" in cfg:
+            policy.escalate_on = frozenset(cfg["escalate_on"])
+        return policy
+
+    def select(self, state: GraphState) -> Optional[str]:
+        """
+        Returns the model for the next InvokeLLM step.
+
+        Args:
+            state (GraphState): The current graph state.
+
+        Returns:
+            Optional[str]: The model name, or None for the client's default.
+        """
+        return self.answer_model if state.tool_result else self.tool_model
+
+    def escalation(self, model: Optional[str], need_tool: Optional[bool], state: GraphState) -> Optional[str]:
+        """
+        Decides whether a response should be redone with the answer model.
+
+        Args:
+            model (Optional[str]): The model that produced the response.
+            need_tool (Optional[bool]): The parsed tool_call flag, None if the response did not parse.
+            state (GraphState): The graph state the response was produced from.
+
+        Returns:
+            Optional[str]: The model to redo the step with, or None to keep the response.
+        """
+        if model != self.tool_model or self.answer_model in (None, model):
+            return None
+        if need_tool is None and ESCALATE_PARSE_ERROR in self.escalate_on:
+            return self.answer_model
+        if need_tool is False and not state.tool_result and ESCALATE_DIRECT_ANSWER in self.escalate_on:
+            return self.answer_model
+        return None
@@ -0,0 +1,271 @@
+"""
+Local fast-path router that picks a tool without calling the LLM.
+
+The user input is scored against every tool's name, description and
+example requests with TF-IDF cosine similarity. When one tool wins clearly
+and its arguments can be filled without the LLM (no required arguments, a
+single free-text argument such as "query", or arguments given by the
+matching example), the graph goes straight to ToolCall and skips the first
+InvokeLLM round-trip. Anything less certain falls through to the LLM.
+"""
+import os
+import re
+import json
+import math
+from collections import Counter, defaultdict, deque
+from typing import Any, Dict, List, Optional, Tuple, TYPE_CHECKING
+from weakref import WeakKeyDictionary
+
+from langgraph.types import Command
+
+from graph.state import MyState, GraphState
+
+if TYPE_CHECKING:
+    from tools.mcp_manager import MCPToolManager
+
+# Logging setting
+import logging
+logger = logging.getLogger(__name__)
+
+# Enables the LocalRoute node in front of InvokeLLM
+LOCAL_ROUTER = os.getenv("LOCAL_ROUTER", "").lower() in ("1", "true", "yes")
+
+# Example requests per tool, one JSON object per line: {"server", "tool", "text", optional "args"}
+LOCAL_ROUTER_EXAMPLES = os.getenv("LOCAL_ROUTER_EXAMPLES", "router_examples.jsonl")
+
+# Minimum similarity of the best tool, and its minimum lead over the runner-up
+LOCAL_ROUTER_THRESHOLD = float(os.getenv("LOCAL_ROUTER_THRESHOLD", "0.6"))
+LOCAL_ROUTER_MARGIN = float(os.getenv("LOCAL_ROUTER_MARGIN", "0.15"))
+
+# Appends requests the LLM answered with a tool call to the examples file
+LOCAL_ROUTER_LEARN = os.getenv("LOCAL_ROUTER_LEARN", "").lower() in ("1", "true", "yes")
+
+# Argument names that take the user's request as free text
+FREE_TEXT_ARGS = frozenset({"query", "question", "q", "prompt", "text", "input", "topic"})
+
+# Examples kept per tool
+LOCAL_ROUTER_MAX_EXAMPLES = 200
+
+_STOPWORDS = frozenset(
+    "a an the and or of for to in on at by with from me my i you your it is are be "
+    "can could would please show give get find what whats which tell about some any".split()
+)
+
+def tokenize(text: str) -> List[str]:
+    """
+    Splits text into lowercase terms, including the parts of snake_case and camelCase names.
+
+    Args:
+        text (str): The text to split.
+
+    Returns:
+        List[str]: The terms, without stopwords and with a trailing plural "s" removed.
+    """
+    text = re.sub(r"([a-z])([A-Z])", r"\1 \2", text).lower()
+    terms = []
+    for word in re.findall(r"[a-z0-9]+", text):
+        if word in _STOPWORDS:
+            continue
+        if len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+            word = word[:-1]
+        terms.append(word)
+    return terms
+
+class _Index:
+    """TF-IDF vectors of every tool document for one tool catalog."""
+    __slots__ = ("docs", "schemas", "df")
+
+    def __init__(self, docs: List[Tuple[Tuple[str, str], Dict[str, float], Optional[Dict[str, Any]]]],
+                 schemas: Dict[Tuple[str, str], Dict[str, Any]], df: Counter):
+        self.docs = docs        # ((server, tool), unit vector, example args or None)
+        self.schemas = schemas  # (server, tool) -> input schema
+        self.df = df            # term -> number of documents containing it
+
+class LocalRouter:
+    """
+    Lexical tool router shared by all sessions of the process.
+    """
+    def __init__(self, examples: Optional[List[Dict[str, Any]]] = None,
+                 learn_path: Optional[str] = None,
+                 threshold: float = LOCAL_ROUTER_THRESHOLD,
+                 margin: float = LOCAL_ROUTER_MARGIN):
+        self.threshold = threshold
+        self.margin = margin
+        self.learn_path = learn_path
+        self.examples: Dict[Tuple[str, str], deque] = defaultdict(lambda: deque(maxlen=LOCAL_ROUTER_MAX_EXAMPLES))
+        for ex in examples or []:
+            self.examples[(ex["server"], ex["tool"])].append((ex["text"], ex.get("args")))
+        self.version = 0  # Bumped whenever examples are learned
+        self._indexes: "WeakKeyDictionary[MCPToolManager, Tuple[Tuple[int, int], _Index]]" = WeakKeyDictionary()
+
+    @classmethod
+    def from_file(cls, path: str = LOCAL_ROUTER_EXAMPLES) -> "LocalRouter":
+        """
+        Creates a router seeded with the examples of a JSONL file.
+
+        Learned examples are appended to the same file when LOCAL_ROUTER_LEARN is set.
+
+        Args:
+            path (str): Path of the examples file. A missing file means no examples.
+
+        Returns:
+            LocalRouter: The router.
+        """
+        examples = []
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                for line in f:
+                    if line.strip():
+                        examples.append(json.loads(line))
+        logger.info(f"Local router loaded {len(examples)} examples from {path}")
+        return cls(examples, learn_path=path if LOCAL_ROUTER_LEARN else None)
+
+    def learn(self, text: str, server: str, tool: str):
+        """
+        Records a request the LLM answered with a tool call, so similar requests can be routed locally.
+
+        Args:
+            text (str): The user input.
+            server (str): The tool server the LLM picked.
+            tool (str): The tool the LLM picked.
+        """
+        known = self.examples[(server, tool)]
+        if any(t == text for t, _ in known):
+            return
+        known.append((text, None))
+        self.version += 1
+        if self.learn_path:
+            try:
+                with open(self.learn_path, "a", encoding="utf-8") as f:
+                    f.write(json.dumps({"server": server, "tool": tool, "text": text}) + "\n")
+            except OSError as e:
+                logger.warning(f"Could not save router example to {self.learn_path}: {e}")
+
+    def _index(self, tool_manager: "MCPToolManager") -> _Index:
+        """Builds, or reuses, the index of the manager's current tool catalog."""
+        key = (tool_manager.catalog_version, self.version)
+        cached = self._indexes.get(tool_manager)
+        if cached is not None and cached[0] == key:
+            return cached[1]
+
+        raw: List[Tuple[Tuple[str, str], Counter, Optional[Dict[str, Any]]]] = []
+        schemas: Dict[Tuple[str, str], Dict[str, Any]] = {}
+        for server, listing in tool_manager.tools.items():
+            for tool in getattr(listing, "tools", []):
+                ref = (server, tool.name)
+                schemas[ref] = tool.inputSchema or {}
+                raw.append((ref, Counter(tokenize(tool.name) * 2 + tokenize(tool.description or "")), None))
+                for text, args in self.examples.get(ref, ()):
+                    raw.append((ref, Counter(tokenize(text)), args))
+
+        df = Counter(term for _, tf, _ in raw for term in tf)
+        n = len(raw)
+        docs = []
+        for ref, tf, args in raw:
+            docs.append((ref, self._vector(tf, df, n), args))
+
+        index = _Index(docs, schemas, df)
+        self._indexes[tool_manager] = (key, index)
+        return index
+
+    @staticmethod
+    def _vector(tf: Counter, df: Counter, n: int) -> Dict[str, float]:
+        """Unit-length TF-IDF vector; terms unknown to the catalog get the highest weight."""
+        vec = {t: c * (math.log((n + 1) / (df[t] + 1)) + 1.0) for t, c in tf.items()}
+        norm = math.sqrt(sum(w * w for w in vec.values())) or 1.0
+        return {t: w / norm for t, w in vec.items()}
+
+    def route(self, text: str, tool_manager: "MCPToolManager") -> Optional[Tuple[str, str, Dict[str, Any], float]]:
+        """
+        Picks a tool for the user input if the match is confident and the arguments can be filled.
+
+        Args:
+            text (str): The user input.
+            tool_manager (MCPToolManager): The session's tool manager.
+
+        Returns:
+            Optional[Tuple[str, str, Dict[str, Any], float]]: (server, tool, args, score), or None to ask the LLM.
+        """
+        index = self._index(tool_manager)
+        if not index.docs:
+            return None
+
+        query = self._vector(Counter(tokenize(text)), index.df, len(index.docs))
+        if not query:
+            return None
+
+        # Best document per tool
+        best: Dict[Tuple[str, str], Tuple[float, Optional[Dict[str, Any]]]] = {}
+        for ref, vec, args in index.docs:
+            score = sum(w * vec.get(t, 0.0) for t, w in query.items())
+            if ref not in best or score > best[ref][0]:
+                best[ref] = (score, args)
+
+        ranked = sorted(best.items(), key=lambda item: item[1][0], reverse=True)
+        (server, tool), (score, example_args) = ranked[0]
+        runner_up = ranked[1][1][0] if len(ranked) > 1 else 0.0
+        if score < self.threshold or score - runner_up < self.margin:
+            logger.debug(f"Local router not confident: {server}.{tool} {score:.2f} (runner-up {runner_up:.2f})")
+            return None
+
+        args = self._fill_args(text, index.schemas.get((server, tool), {}), example_args)
+        if args is None:
+            logger.debug(f"Local router matched {server}.{tool} but cannot fill its arguments")
+            return None
+        return server, tool, args, score
+
+    @staticmethod
+    def _fill_args(text: str, schema: Dict[str, Any], example_args: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+        """Arguments for the tool, or None when only the LLM can produce them."""
+        if example_args is not None:
+            # "{input}" in an example's arguments stands for the user input
+            return {k: v.replace("{input}", text) if isinstance(v, str) else v for k, v in example_args.items()}
+        required = schema.get("required", [])
+        if not required:
+            return {}
+        if len(required) == 1 and required[0] in FREE_TEXT_ARGS \
+                and schema.get("properties", {}).get(required[0], {}).get("type") == "string":
+            return {required[0]: text}
+        return None
+
+async def local_route(state: GraphState, config: dict):
+    """
+    Node function that routes obvious tool requests without the LLM.
+
+    Args:
+        state (GraphState): The current graph state.
+        config (dict): Configuration including the MyState instance.
+
+    Returns:
+        Command: Update command with the tool call, or an empty update to fall through to InvokeLLM.
+    """
+    my_state: MyState = config["configurable"]["my_state"]
+    router = my_state.local_router
+    if router is None or my_state.tool_manager is None:
+        return Command(update={})
+
+    routed = router.route(my_state.user_input, my_state.tool_manager)
+    if routed is None:
+        return Command(update={})
+
+    server, tool, args, score = routed
+    logger.info(f"Local router picked {server}.{tool} ({score:.2f}), skipping the first LLM call")
+    return Command(update={
+        "tool_invocation_needed": True,
+        "tool_server": server,
+        "tool_name": tool,
+        "tool_arguments": args,
+    })
+
+def route_next(state: GraphState, config: dict) -> str:
+    """
+    Conditional edge after LocalRoute.
+
+    Args:
+        state (GraphState): The current graph state.
+        config (dict): Configuration.
+
+    Returns:
+        str: "ToolCall" when the router picked a tool, otherwise "InvokeLLM".
+    """
+    return "ToolCall" if state.tool_invocation_needed else "InvokeLLM"
@@ -1,57 +1,106 @@
 """
 State definitions for LangGraph.
 """
-from typing import Dict, Any, Optional, List
-from dataclasses import dataclass
+from typing import Callable, Dict, Any, List, Optional, Tuple, TYPE_CHECKING
+from dataclasses import dataclass, field
+from functools import partial
 
-from tools.mcp_manager import MCPToolManager
+from graph.history import ConversationBuffer
 
+if TYPE_CHECKING:
+    from tools.mcp_manager import MCPToolManager
+    from graph.policy import ModelPolicy
+    from graph.router import LocalRouter
+    from tools.mcp_progress import ProgressUpdate
+
+@dataclass(slots=True)
 class MyState:
     """
-    Custom state class for maintaining application state.
+    Per-message application context shared by the graph nodes.
+
+    The graph channels (tool call details, tool result) live only in
+    GraphState; this object holds what the nodes need but never route on.
     """
-    def __init__(
-        self,
-        user_input: str,
-        tool_invocation_needed: bool = False,
-        tool_server: str = "",
-        tool_name: str = "",
-        tool_arguments: Optional[Dict[str, Any]] = None,
-        tool_result: str = "",
-        final_answer: str = ""
-    ):
-        self.user_input = user_input
-        self.tool_invocation_needed = tool_invocation_needed
-        self.tool_server = tool_server
-        self.tool_name = tool_name
-        self.tool_arguments = tool_arguments or {}
-        self.tool_result = tool_result
-        self.final_answer = final_answer
-        self.chat_history = []
-        
-        # Tool usage counter dictionary to track how many times each tool has been used
-        # Format: {tool_server: {tool_name: count}}
-        self.tool_usage_counts: Dict[str, Dict[str, int]] = {}
-        
-        # Maximum allowed uses per tool (can be customized)
-        self.max_tool_uses: int = 1
-
-        # These will be set later
-        self.llm = None
-        self.tool_manager: Optional[MCPToolManager] = None
-
-@dataclass
+    user_input: str
+    chat_history: Optional[ConversationBuffer] = None
+    final_answer: str = ""
+
+    # Tool usage counter dictionary to track how many times each tool has been used
+    # Format: {tool_server: {tool_name: count}}
+    tool_usage_counts: Dict[str, Dict[str, int]] = field(default_factory=dict)
+
+    # Maximum allowed uses per tool (can be customized)
+    max_tool_uses: int = 1
+
+    # These will be set later
+    llm: Any = None
+    tool_manager: Optional["MCPToolManager"] = None
+    model_policy: Optional["ModelPolicy"] = None
+    local_router: Optional["LocalRouter"] = None
+
+    # Stored results read in full with expand_result during this message, as (header, text).
+    # They are sent with the LLM calls of this message only; the history keeps a reference
+    expanded_results: List[Tuple[str, str]] = field(default_factory=list)
+
+    # Set by the UI to show tool progress: called with a label of the tool call and each update
+    tool_progress: Optional[Callable[[str, "ProgressUpdate"], None]] = None
+
+    def __post_init__(self):
+        if self.chat_history is None:
+            self.chat_history = ConversationBuffer()
+
+    def use_tool(self, tool_server: str, tool_name: str, limit: Optional[int] = None) -> bool:
+        """
+        Counts a use of a tool, unless it has reached its limit.
+
+        Args:
+            tool_server (str): The server of the tool.
+            tool_name (str): The tool.
+            limit (Optional[int]): Uses allowed, max_tool_uses if not given.
+
+        Returns:
+            bool: True if the tool may be called, False once its limit is reached.
+        """
+        counts = self.tool_usage_counts.setdefault(tool_server, {})
+        if counts.get(tool_name, 0) >= (self.max_tool_uses if limit is None else limit):
+            return False
+        counts[tool_name] = counts.get(tool_name, 0) + 1
+        return True
+
+    def expanded_messages(self) -> List[Dict[str, str]]:
+        """The results read in full during this message, as a message to send after the history (empty if none)."""
+        if not self.expanded_results:
+            return []
+        return [{"role": "assistant", "content": "\n\n".join(header + text for header, text in self.expanded_results)}]
+
+    def progress_for(self, label: str) -> Optional[Callable[["ProgressUpdate"], None]]:
+        """
+        The progress callback of one tool call.
+
+        Args:
+            label (str): How the UI names the tool call, e.g. "Weather.get_forecast".
+
+        Returns:
+            Optional[Callable]: The callback, or None when the UI does not show progress.
+        """
+        if self.tool_progress is None:
+            return None
+        return partial(self.tool_progress, label)
+
+@dataclass(slots=True)
 class GraphState:
     """
     Dataclass for LangGraph state.
+
+    Nodes return partial updates holding only the channels they change.
     """
-    tool_invocation_needed: bool = False
+    tool_invocation_needed: Optional[bool] = False
     tool_server: str = ""
     tool_name: str = ""
-    tool_arguments: Dict[str, Any] = None
+    tool_arguments: Optional[Dict[str, Any]] = None
     tool_result: str = ""
     final_answer: str = ""
 
-    def __post_init__(self):
-        if self.tool_arguments is None:
-            self.tool_arguments = {}
+    # Plan-and-execute mode: the planned steps and their results by step id
+    plan: Optional[List[Dict[str, Any]]] = None
+    step_results: Optional[Dict[str, str]] = None
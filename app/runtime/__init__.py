@@ -0,0 +1,3 @@
+"""
+Process-wide runtime: warm start and resources shared by every chat session.
+"""
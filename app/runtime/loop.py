@@ -0,0 +1,63 @@
+"""
+Long-lived asyncio event loop running in a background thread.
+
+Front ends whose script thread is not itself async (Streamlit) submit their
+coroutines to this loop. Because every session shares the same loop, the MCP
+sessions and the LLM client created on it can be shared as well.
+"""
+import asyncio
+import threading
+from concurrent.futures import Future
+from typing import Any, Coroutine, Optional
+import logging
+
+# Logging setting
+logger = logging.getLogger(__name__)
+
+class BackgroundLoop:
+    """
+    An asyncio event loop owned by a daemon thread.
+    """
+    def __init__(self, name: str = "background-loop"):
+        self.loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        asyncio.set_event_loop(self.loop)
+        logger.info("Background event loop started")
+        self.loop.run_forever()
+
+    def submit(self, coro: Coroutine[Any, Any, Any]) -> Future:
+        """
+        Schedules a coroutine on the loop from any thread.
+
+        Args:
+            coro (Coroutine): The coroutine to run.
+
+        Returns:
+            Future: A thread-safe future for the coroutine's result.
+        """
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def stop(self):
+        """Stops the loop and waits for its thread to exit."""
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread.join()
+
+_background_loop: Optional[BackgroundLoop] = None
+_background_loop_lock = threading.Lock()
+
+def get_background_loop() -> BackgroundLoop:
+    """
+    Returns the process-wide background loop, starting it on first use.
+
+    Returns:
+        BackgroundLoop: The shared background loop.
+    """
+    global _background_loop
+    if _background_loop is None:
+        with _background_loop_lock:
+            if _background_loop is None:
+                _background_loop = BackgroundLoop()
+    return _background_loop
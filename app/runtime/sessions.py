@@ -0,0 +1,246 @@
+"""
+Lifecycle of the chat sessions of one worker process.
+
+Every UI session registers its resources here: the tool manager with its
+private MCP server subprocesses, the conversation buffer and the task
+answering the current message. A session is closed, and its resources
+released, when the UI reports its end, when it has been idle for longer
+than SESSION_IDLE_TIMEOUT, or when the worker holds more than
+SESSION_MAX_PER_WORKER sessions and it is the least recently used one.
+"""
+import os
+import time
+import asyncio
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, List, Optional, TYPE_CHECKING
+import logging
+
+if TYPE_CHECKING:
+    from tools.mcp_manager import MCPToolManager
+    from graph.history import ConversationBuffer
+
+# Logging setting
+logger = logging.getLogger(__name__)
+
+# Seconds without activity after which a session is closed
+SESSION_IDLE_TIMEOUT = float(os.getenv("SESSION_IDLE_TIMEOUT", "1800"))
+
+# Live sessions per worker; the least recently used one is closed beyond it
+SESSION_MAX_PER_WORKER = int(os.getenv("SESSION_MAX_PER_WORKER", "100"))
+
+# Seconds a cancelled message gets to unwind before the session's servers are closed
+SESSION_CANCEL_TIMEOUT = 5.0
+
+# Seconds between two idle-session sweeps
+SESSION_REAP_INTERVAL = float(os.getenv("SESSION_REAP_INTERVAL", "60"))
+
+# Shown to the user when a closed session is reopened, since its history is gone
+SESSION_RESET_NOTICE = ("This chat had been inactive and was closed, so it was restarted: "
+                        "I no longer have the earlier messages in context.")
+
+class SessionRecord:
+    """
+    The resources held by one chat session.
+    """
+    __slots__ = ("session_id", "tool_manager", "chat_history", "created", "last_active", "run")
+
+    def __init__(self, session_id: str, tool_manager: Optional["MCPToolManager"],
+                 chat_history: Optional["ConversationBuffer"]):
+        self.session_id = session_id
+        self.tool_manager = tool_manager
+        self.chat_history = chat_history
+        self.created = time.monotonic()
+        self.last_active = self.created
+        self.run: Optional[asyncio.Future] = None  # The message being answered, if any
+
+    @property
+    def busy(self) -> bool:
+        return self.run is not None and not self.run.done()
+
+    def usage(self) -> Dict[str, Any]:
+        """
+        Resource accounting of the session.
+
+        Returns:
+            Dict[str, Any]: Subprocesses owned, open MCP connections, history bytes and idle seconds.
+        """
+        tm = self.tool_manager
+        return {
+            "session_id": self.session_id,
+            "subprocesses": tm.owned_servers if tm else 0,
+            "connections": len(tm.sessions) if tm else 0,
+            "history_bytes": self.chat_history.nbytes if self.chat_history is not None else 0,
+            "idle_seconds": round(time.monotonic() - self.last_active, 1),
+            "busy": self.busy,
+        }
+
+class SessionRegistry:
+    """
+    Live sessions of the worker, least recently used first.
+
+    All methods must be called on the event loop the sessions' tool managers run on.
+    """
+    def __init__(self, idle_timeout: float = SESSION_IDLE_TIMEOUT,
+                 max_sessions: int = SESSION_MAX_PER_WORKER,
+                 reap_interval: float = SESSION_REAP_INTERVAL):
+        self.idle_timeout = idle_timeout
+        self.max_sessions = max_sessions
+        self.reap_interval = reap_interval
+        self._sessions: "OrderedDict[str, SessionRecord]" = OrderedDict()
+        self._reaper: Optional[asyncio.Task] = None
+
+    def __contains__(self, session_id: str) -> bool:
+        return session_id in self._sessions
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    async def register(self, session_id: str, tool_manager: Optional["MCPToolManager"],
+                       chat_history: Optional["ConversationBuffer"]) -> SessionRecord:
+        """
+        Adds a session, evicting the least recently used ones beyond the cap.
+
+        Args:
+            session_id (str): Unique id of the UI session.
+            tool_manager (Optional[MCPToolManager]): The session's tool manager.
+            chat_history (Optional[ConversationBuffer]): The session's conversation.
+
+        Returns:
+            SessionRecord: The record of the session.
+        """
+        if session_id in self._sessions:
+            await self.close(session_id, "registered again")
+
+        record = SessionRecord(session_id, tool_manager, chat_history)
+        self._sessions[session_id] = record
+        self._start_reaper()
+
+        while len(self._sessions) > self.max_sessions:
+            oldest = next(iter(self._sessions))
+            await self.close(oldest, f"over the limit of {self.max_sessions} sessions")
+        return record
+
+    def touch(self, session_id: str, run: Optional[asyncio.Future] = None) -> Optional[SessionRecord]:
+        """
+        Marks a session as active, optionally recording the task answering its current message.
+
+        Args:
+            session_id (str): The session.
+            run (Optional[asyncio.Future]): The task or future answering the message.
+
+        Returns:
+            Optional[SessionRecord]: The record, or None if the session was closed.
+        """
+        record = self._sessions.get(session_id)
+        if record is None:
+            return None
+        record.last_active = time.monotonic()
+        if run is not None:
+            record.run = run
+        self._sessions.move_to_end(session_id)
+        return record
+
+    async def resume(self, session_id: str, run: Optional[asyncio.Future],
+                     reopen: Callable[[], Awaitable[None]]) -> bool:
+        """
+        Marks a session as active for a new message, reopening it first if it was closed.
+
+        Args:
+            session_id (str): The session.
+            run (Optional[asyncio.Future]): The task answering the message.
+            reopen (Callable[[], Awaitable[None]]): Creates and registers the session's resources again.
+
+        Returns:
+            bool: True if the session was reopened, with fresh servers and an empty history.
+        """
+        if self.touch(session_id, run) is not None:
+            return False
+        logger.info(f"Session {session_id} was closed, reopening it.")
+        await reopen()
+        self.touch(session_id, run)
+        return True
+
+    async def close(self, session_id: str, reason: str = "ended"):
+        """
+        Closes a session: cancels its current message and releases its servers and history.
+
+        Args:
+            session_id (str): The session to close.
+            reason (str): Why it is closed, for the logs.
+        """
+        record = self._sessions.pop(session_id, None)
+        if record is None:
+            return
+        logger.info(f"Closing session {session_id} ({reason}): {record.usage()}")
+
+        if record.busy and record.run is not asyncio.current_task():
+            # Let the run unwind (and cancel its tool calls) before its servers go away
+            record.run.cancel()
+            await asyncio.wait([record.run], timeout=SESSION_CANCEL_TIMEOUT)
+        if record.tool_manager is not None:
+            try:
+                await record.tool_manager.cleanup()
+            except Exception as e:
+                logger.error(f"Error cleaning up session {session_id}: {e}")
+        if record.chat_history is not None:
+            record.chat_history.close()
+
+    async def reap_idle(self):
+        """Closes the sessions idle for longer than the timeout; a session answering a message is never idle."""
+        deadline = time.monotonic() - self.idle_timeout
+        idle = [sid for sid, r in self._sessions.items() if r.last_active < deadline and not r.busy]
+        for session_id in idle:
+            await self.close(session_id, f"idle for more than {self.idle_timeout:.0f}s")
+
+    async def close_all(self):
+        """Closes every session, at worker shutdown."""
+        if self._reaper is not None:
+            self._reaper.cancel()
+            self._reaper = None
+        for session_id in list(self._sessions):
+            await self.close(session_id, "worker shutdown")
+
+    def usage(self) -> Dict[str, Any]:
+        """
+        Resource accounting of the worker.
+
+        Returns:
+            Dict[str, Any]: Totals over all sessions and the per-session figures.
+        """
+        sessions: List[Dict[str, Any]] = [r.usage() for r in self._sessions.values()]
+        return {
+            "sessions": len(sessions),
+            "subprocesses": sum(s["subprocesses"] for s in sessions),
+            "connections": sum(s["connections"] for s in sessions),
+            "history_bytes": sum(s["history_bytes"] for s in sessions),
+            "per_session": sessions,
+        }
+
+    def _start_reaper(self):
+        if self._reaper is None or self._reaper.done():
+            self._reaper = asyncio.ensure_future(self._reap_forever())
+
+    async def _reap_forever(self):
+        while True:
+            await asyncio.sleep(self.reap_interval)
+            try:
+                await self.reap_idle()
+                usage = self.usage()
+                logger.debug("Session usage: %d sessions, %d subprocesses, %d connections, %d history bytes",
+                             usage["sessions"], usage["subprocesses"], usage["connections"], usage["history_bytes"])
+            except Exception as e:
+                logger.error(f"Error reaping idle sessions: {e}")
+
+_registry: Optional[SessionRegistry] = None
+
+def get_session_registry() -> SessionRegistry:
+    """
+    Returns the worker's session registry, creating it on first use.
+
+    Returns:
+        SessionRegistry: The shared registry.
+    """
+    global _registry
+    if _registry is None:
+        _registry = SessionRegistry()
+    return _registry
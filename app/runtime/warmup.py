@@ -0,0 +1,182 @@
+"""
+Process-wide warm start.
+
+Everything that does not depend on a particular chat session is built once
+per process: the compiled graph, the LLM client and its connection pool, the
+shared MCP tool servers and the system prompt rendered for them. The warm-up
+runs at process boot so the first user after a deploy gets the same latency
+as the hundredth.
+"""
+import os
+import time
+import asyncio
+import threading
+from typing import Any, Dict, List, Optional, TYPE_CHECKING
+import logging
+
+from config.loader import load_server_config, load_llm_endpoints, load_model_policy
+
+if TYPE_CHECKING:
+    from tools.mcp_manager import MCPToolManager
+
+# Logging setting
+logger = logging.getLogger(__name__)
+
+# LLM configuration
+LLM_API_ENDPOINT = os.getenv("OPENAI_API_BASE", "https://api.openai.com/v1")
+LLM_API_KEY = os.getenv("OPENAI_API_KEY", "")
+LLM_MODEL = os.getenv("OPENAI_MODEL") or "gpt-4o-mini"
+
+class Runtime:
+    """
+    Resources shared by every chat session of the process.
+    """
+    def __init__(self):
+        # Heavy dependencies (langgraph, mcp, httpx) are imported here rather than at module import
+        from tools.mcp_manager import MCPToolManager
+        from graph.builder import build_graph
+        from graph.policy import ModelPolicy
+        from graph.router import LOCAL_ROUTER, LocalRouter
+
+        self.servers_config: List[Dict[str, Any]] = load_server_config()
+        self.graph = build_graph(local_router=LOCAL_ROUTER)
+        self.model_policy = ModelPolicy.from_config(load_model_policy())
+        self.local_router = LocalRouter.from_file() if LOCAL_ROUTER else None
+
+        # Several endpoints in config.json enable routing with hedged requests
+        llm_endpoints = load_llm_endpoints()
+        if llm_endpoints:
+            from tools.llm_router import RoutingLLMClient
+            client = RoutingLLMClient(llm_endpoints)
+        else:
+            from tools.llm_client import SingleLLMClient
+            client = SingleLLMClient(LLM_API_ENDPOINT, LLM_API_KEY, LLM_MODEL)
+
+        # CASSETTE_MODE records the LLM traffic, or replays it without calling the provider
+        from tools.cassette import get_cassette, CassetteLLMClient
+        self.cassette = get_cassette()
+        if self.cassette is not None:
+            client = CassetteLLMClient(client, self.cassette)
+
+        # TOKEN_PROFILE accounts the prompt tokens of every call by component, tool and server
+        from tools.token_profiler import TOKEN_PROFILE, TokenProfiler, ProfilingLLMClient
+        self.token_profiler = TokenProfiler() if TOKEN_PROFILE else None
+        if self.token_profiler is not None:
+            client = ProfilingLLMClient(client, self.token_profiler)
+
+        # All sessions share one scheduler, so provider quotas are respected process-wide
+        from tools.llm_scheduler import LLMScheduler, ScheduledLLMClient, BACKGROUND
+        self.llm_scheduler = LLMScheduler()
+        self.llm = ScheduledLLMClient(client, self.llm_scheduler)
+        # Work no user is waiting on yields to the sessions' calls
+        self.background_llm = self.llm.with_priority(BACKGROUND)
+
+        # Servers marked "shared" in config.json are spawned once and used by all sessions
+        self.tool_manager = MCPToolManager([cfg for cfg in self.servers_config if cfg.get("shared")])
+        self.system_prompt = ""
+        self._langfuse_handler = None
+
+    @property
+    def langfuse_handler(self):
+        """The Langfuse callback handler, created on first use."""
+        if self._langfuse_handler is None:
+            from langfuse import Langfuse
+            from langfuse.callback import CallbackHandler
+
+            Langfuse(
+                secret_key=os.getenv("LANGFUSE_SECRET_KEY"),
+                public_key=os.getenv("LANGFUSE_PUBLIC_KEY"),
+                host=os.getenv("LANGFUSE_HOST", "http://localhost:3000")
+            )
+            self._langfuse_handler = CallbackHandler()
+        return self._langfuse_handler
+
+    async def create_session_tool_manager(self, share: bool = True) -> "MCPToolManager":
+        """
+        Creates the tool manager for one chat session.
+
+        Args:
+            share (bool): Reuse the process-wide shared servers. Must only be set when
+                the session runs on the same event loop as the warm-up.
+
+        Returns:
+            MCPToolManager: A tool manager owning the session's private servers.
+        """
+        from tools.mcp_manager import MCPToolManager
+
+        if share:
+            tm = MCPToolManager([cfg for cfg in self.servers_config if not cfg.get("shared")])
+            tm.attach(self.tool_manager)
+        else:
+            tm = MCPToolManager(self.servers_config)
+        await tm.initialize()
+        return tm
+
+_runtime: Optional[Runtime] = None
+_runtime_lock = threading.Lock()
+_warm_task: Optional[asyncio.Task] = None
+
+# Set once the warm-up has completed
+READY = threading.Event()
+
+def get_runtime() -> Runtime:
+    """
+    Returns the process-wide runtime, building it on first use.
+
+    Returns:
+        Runtime: The shared runtime.
+    """
+    global _runtime
+    if _runtime is None:
+        with _runtime_lock:
+            if _runtime is None:
+                _runtime = Runtime()
+    return _runtime
+
+async def _warm_up() -> Runtime:
+    """Builds the runtime and brings up everything that can be prepared ahead of the first chat."""
+    start = time.perf_counter()
+    runtime = get_runtime()
+
+    try:
+        await runtime.tool_manager.initialize()
+    except Exception as e:
+        logger.error(f"Error starting shared MCP servers: {e}")
+
+    from utils.prompts import generate_system_prompt
+    runtime.system_prompt = generate_system_prompt(runtime.tool_manager)
+    await runtime.background_llm.awarm()
+
+    try:
+        runtime.langfuse_handler
+    except Exception as e:
+        logger.error(f"Error creating Langfuse handler: {e}")
+
+    READY.set()
+    logger.info(f"Warm-up complete in {time.perf_counter() - start:.2f}s")
+    return runtime
+
+def start_warm_up() -> asyncio.Task:
+    """
+    Schedules the warm-up on the running event loop if it has not been started yet.
+
+    Returns:
+        asyncio.Task: The warm-up task.
+    """
+    global _warm_task
+    if _warm_task is None:
+        _warm_task = asyncio.ensure_future(_warm_up())
+    return _warm_task
+
+async def warm_up() -> Runtime:
+    """
+    Waits for the warm-up, starting it if needed.
+
+    Returns:
+        Runtime: The warmed-up runtime.
+    """
+    return await asyncio.shield(start_warm_up())
+
+def is_ready() -> bool:
+    """Returns True once the warm-up has completed."""
+    return READY.is_set()
@@ -4,17 +4,15 @@ Streamlit application entry point.
 This file serves as the entry point for the Streamlit version of the application,
 importing and using the modular components defined in the other files.
 """
+import time
+STARTUP_T0 = time.perf_counter()
+
 import os
 import sys
-import asyncio
+import queue
 import logging
 import pathlib
 import streamlit as st
-import nest_asyncio
-from concurrent.futures import ThreadPoolExecutor
-
-# Apply nest_asyncio to allow nested event loops
-nest_asyncio.apply()
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -31,8 +29,11 @@ parent_dir = current_dir.parent
 sys.path.insert(0, str(parent_dir))
 
 # Import Streamlit handlers
+from runtime.loop import get_background_loop
 from ui.streamlit_handlers import initialize_session, process_message
 
+logging.debug("App modules imported in %.3fs", time.perf_counter() - STARTUP_T0)
+
 # Set page configuration
 st.set_page_config(
     page_title="Awe Assistant",
@@ -40,20 +41,20 @@ st.set_page_config(
     layout="wide",
 )
 
-# Create a single event loop for the application
-if not hasattr(st.session_state, "event_loop"):
-    st.session_state.event_loop = asyncio.new_event_loop()
-    asyncio.set_event_loop(st.session_state.event_loop)
+# All sessions share one long-lived event loop running in a background thread
+background_loop = get_background_loop()
 
-# Helper function to run async functions using the shared event loop
-def run_async(async_func, *args, **kwargs):
-    loop = st.session_state.event_loop
-    return loop.run_until_complete(async_func(*args, **kwargs))
+# A response still running from an interrupted script run is no longer wanted
+pending = st.session_state.get("pending_response")
+if pending is not None and not pending.done():
+    pending.cancel()
 
 # Initialize session state - ensure it completes before proceeding
-if "initialized" not in st.session_state:
+if "session" not in st.session_state:
     with st.spinner("Initializing session..."):
-        run_async(initialize_session)
+        st.session_state.session = background_loop.submit(initialize_session()).result()
+    if st.session_state.session.init_error:
+        st.error(st.session_state.session.init_error)
 
 # Display header
 st.title("Awe Assistant")
@@ -77,11 +78,33 @@ if prompt := st.chat_input("What would you like to know?"):
     with st.chat_message("user"):
         st.markdown(prompt)
     
-    # Display assistant response with a spinner while processing
+    # Display assistant response, showing graph progress while it runs on the background loop
     with st.chat_message("assistant"):
-        with st.spinner("Thinking..."):
-            response = run_async(process_message, prompt)
-            st.markdown(response)
+        events = queue.Queue()
+        future = background_loop.submit(process_message(st.session_state.session, prompt, events))
+        st.session_state.pending_response = future
+        try:
+            with st.status("Thinking...", expanded=False) as status:
+                started = time.monotonic()
+                shown = 0
+                while not (future.done() and events.empty()):
+                    try:
+                        _, step = events.get(timeout=0.1)
+                        status.write(step)
+                    except queue.Empty:
+                        pass
+                    # Updating the label each second also lets Streamlit interrupt this run on stop or rerun
+                    elapsed = int(time.monotonic() - started)
+                    if elapsed > shown:
+                        shown = elapsed
+                        status.update(label=f"Thinking... {elapsed}s")
+                status.update(label="Done", state="complete")
+        finally:
+            # Stop, a new message or a closed tab interrupts this run: stop the graph, the LLM request and tool calls
+            if not future.done():
+                future.cancel()
+        response = future.result()
+        st.markdown(response)
     
     # Add assistant response to chat history
     st.session_state.messages.append({"role": "assistant", "content": response})
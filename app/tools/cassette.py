@@ -0,0 +1,309 @@
+"""
+Record/replay cassette for LLM and MCP tool traffic.
+
+With CASSETTE_MODE=record every LLM call and every MCP tool call, with the
+tool catalog of each server, is appended to a JSONL cassette together with
+its latency. With CASSETTE_MODE=replay the recorded responses are served
+back instead: no LLM request is sent and no MCP server is spawned, so real
+conversations can be re-run offline to benchmark a change (see
+benchmarks/replay.py) without network access or API spend.
+
+Replay is deterministic. A call is answered by the next unplayed recording
+of an identical request; when the request changed (a new prompt, a compacted
+tool result) the next unplayed recording of the same kind is used instead.
+Responses are delayed by the recorded latency times CASSETTE_SPEED
+(1 = recorded speed, 0 = as fast as possible).
+"""
+import os
+import json
+import time
+import asyncio
+import hashlib
+from collections import defaultdict, deque
+from typing import Any, Deque, Dict, List, Optional
+
+from tools.llm_client import LLMRequestError
+from tools.token_profiler import report_usage, usage_scope
+
+# Logging setting
+import logging
+logger = logging.getLogger(__name__)
+
+# "record", "replay", or empty to disable
+CASSETTE_MODE = os.getenv("CASSETTE_MODE", "").lower()
+CASSETTE_PATH = os.getenv("CASSETTE_PATH", "cassette.jsonl")
+
+# Multiplier of the recorded latencies during replay
+CASSETTE_SPEED = float(os.getenv("CASSETTE_SPEED", "1"))
+
+# Entry kinds
+LLM = "llm"
+TOOL = "tool"
+CATALOG = "catalog"
+TURN = "turn"
+
+class CassetteMiss(LookupError):
+    """Raised during replay when the cassette has no recording left for a call."""
+
+def request_key(*parts: Any) -> str:
+    """
+    Stable digest of a request.
+
+    Args:
+        *parts (Any): JSON-serializable parts of the request.
+
+    Returns:
+        str: A short hex digest.
+    """
+    data = json.dumps(parts, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha1(data.encode("utf-8")).hexdigest()[:16]
+
+def _dump(value: Any) -> Any:
+    """JSON-compatible form of an MCP result (pydantic model) or plain value."""
+    if hasattr(value, "model_dump"):
+        return value.model_dump(mode="json", exclude_none=True)
+    return value
+
+class Cassette:
+    """
+    A cassette file, open for recording or loaded for replay.
+    """
+    def __init__(self, path: str = CASSETTE_PATH, mode: str = CASSETTE_MODE, speed: float = CASSETTE_SPEED):
+        if mode not in ("record", "replay"):
+            raise ValueError(f"Unknown cassette mode '{mode}'")
+        self.path = path
+        self.mode = mode
+        self.speed = speed
+        self.started = time.monotonic()
+        self._catalogs: Dict[str, Any] = {}
+        self._file = None
+
+        # Replay indexes: recordings by request key and by kind, in recorded order
+        self._entries: List[Dict[str, Any]] = []
+        self._by_key: Dict[str, Deque[int]] = defaultdict(deque)
+        self._by_kind: Dict[str, Deque[int]] = defaultdict(deque)
+        self._played: set = set()
+        self.fallbacks = 0  # Calls answered by a recording of a different request
+
+        if mode == "record":
+            self._file = open(path, "a", encoding="utf-8")
+            logger.info(f"Recording LLM and tool traffic to {path}")
+        else:
+            self._load()
+            logger.info(f"Replaying {len(self._entries)} recorded interactions from {path} at speed {speed}")
+
+    @property
+    def recording(self) -> bool:
+        return self.mode == "record"
+
+    @property
+    def replaying(self) -> bool:
+        return self.mode == "replay"
+
+    def _load(self):
+        with open(self.path, "r", encoding="utf-8") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                entry = json.loads(line)
+                if entry["kind"] == CATALOG:
+                    self._catalogs.setdefault(entry["server"], entry["tools"])
+                    continue
+                i = len(self._entries)
+                self._entries.append(entry)
+                if entry["kind"] in (LLM, TOOL):
+                    self._by_key[entry["key"]].append(i)
+                    self._by_kind[entry["kind"]].append(i)
+
+    def _write(self, entry: Dict[str, Any]):
+        entry["at"] = round(time.monotonic() - self.started, 3)
+        self._file.write(json.dumps(entry, separators=(",", ":"), ensure_ascii=False, default=str) + "\n")
+        self._file.flush()
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    # Recording
+
+    def record(self, kind: str, key: str, request: Dict[str, Any], elapsed: float,
+               response: Any = None, error: Optional[Dict[str, Any]] = None,
+               usage: Optional[Dict[str, Any]] = None):
+        """
+        Appends one interaction.
+
+        Args:
+            kind (str): LLM or TOOL.
+            key (str): The request digest, see request_key().
+            request (Dict[str, Any]): The request.
+            elapsed (float): Seconds the call took.
+            response (Any): The response, when the call succeeded.
+            error (Optional[Dict[str, Any]]): The error, when it failed.
+            usage (Optional[Dict[str, Any]]): Token usage reported by the LLM provider.
+        """
+        entry = {"kind": kind, "key": key, "elapsed": round(elapsed, 4), "request": request}
+        if error is not None:
+            entry["error"] = error
+        else:
+            entry["response"] = _dump(response)
+        if usage:
+            entry["usage"] = usage
+        self._write(entry)
+
+    def record_catalog(self, server: str, tools: Any):
+        """Records the tool listing of a server, once per cassette."""
+        if server in self._catalogs:
+            return
+        self._catalogs[server] = _dump(tools)
+        self._write({"kind": CATALOG, "server": server, "tools": self._catalogs[server]})
+
+    def record_turn(self, session_id: str, user_input: str):
+        """Records a user message, so the benchmark can re-run the conversation."""
+        self._write({"kind": TURN, "session": session_id, "input": user_input})
+
+    # Replay
+
+    def catalog(self, server: str) -> Any:
+        """
+        The recorded tool listing of a server.
+
+        Args:
+            server (str): The server name.
+
+        Returns:
+            ListToolsResult: The listing.
+        """
+        from mcp import types
+
+        if server not in self._catalogs:
+            raise CassetteMiss(f"No tool catalog recorded for server '{server}'")
+        return types.ListToolsResult.model_validate(self._catalogs[server])
+
+    def turns(self) -> List[Dict[str, Any]]:
+        """The recorded user messages, in order."""
+        return [e for e in self._entries if e["kind"] == TURN]
+
+    def take(self, kind: str, key: str) -> Dict[str, Any]:
+        """
+        The next unplayed recording of a request, or of the same kind if the request is unknown.
+
+        Args:
+            kind (str): LLM or TOOL.
+            key (str): The request digest.
+
+        Returns:
+            Dict[str, Any]: The recorded entry.
+        """
+        for queue in (self._by_key.get(key), self._by_kind.get(kind)):
+            while queue:
+                i = queue.popleft()
+                if i not in self._played:
+                    if queue is not self._by_key.get(key):
+                        self.fallbacks += 1
+                        logger.warning(f"Cassette has no recording of this {kind} request, using the next one in order")
+                    self._played.add(i)
+                    return self._entries[i]
+        raise CassetteMiss(f"Cassette {self.path} has no {kind} recording left")
+
+    async def play(self, kind: str, key: str) -> Dict[str, Any]:
+        """Takes a recording and waits for its recorded latency, scaled by the speed."""
+        entry = self.take(kind, key)
+        if self.speed > 0:
+            await asyncio.sleep(entry["elapsed"] * self.speed)
+        return entry
+
+class CassetteLLMClient:
+    """
+    LLM client wrapper that records calls to, or serves them from, a cassette.
+    """
+    def __init__(self, client: Any, cassette: Cassette):
+        self.client = client
+        self.cassette = cassette
+
+    @property
+    def model(self) -> str:
+        return self.client.model
+
+    async def awarm(self):
+        if self.cassette.recording:
+            await self.client.awarm()
+
+    async def ainvoke(self, messages: List[Dict[str, str]], model: Optional[str] = None) -> str:
+        """
+        Invoke the LLM, or replay the recorded response.
+
+        Args:
+            messages (List[Dict[str, str]]): The messages to send to the LLM.
+            model (Optional[str]): Model to use instead of the client's default.
+
+        Returns:
+            str: The LLM response.
+        """
+        request = {"model": model or self.client.model, "messages": messages}
+        # Keyed on the messages only, so a replay under another model configuration still matches
+        key = request_key(LLM, messages)
+
+        if self.cassette.replaying:
+            entry = await self.cassette.play(LLM, key)
+            if "error" in entry:
+                error = entry["error"]
+                raise LLMRequestError(error["message"], error.get("status"), error.get("retry_after"))
+            report_usage(entry.get("usage"))
+            return entry["response"]
+
+        start = time.perf_counter()
+        try:
+            with usage_scope() as usage:
+                content = await self.client.ainvoke(messages, model)
+        except LLMRequestError as e:
+            self.cassette.record(LLM, key, request, time.perf_counter() - start,
+                                 error={"message": str(e), "status": e.status, "retry_after": e.retry_after})
+            raise
+        self.cassette.record(LLM, key, request, time.perf_counter() - start, response=content, usage=usage.get("usage"))
+        return content
+
+class ReplaySession:
+    """
+    Stands in for an MCP ClientSession during replay, serving recorded tool results.
+    """
+    def __init__(self, server: str, cassette: Cassette):
+        self.server = server
+        self.cassette = cassette
+        self._request_id = 0
+
+    async def call_tool(self, name: str, arguments: Optional[Dict[str, Any]] = None, progress: Any = None,
+                        on_request: Any = None) -> Any:
+        from mcp import types
+
+        self._request_id += 1
+        if on_request is not None:
+            on_request(self._request_id)
+        entry = await self.cassette.play(TOOL, tool_key(self.server, name, arguments))
+        if "error" in entry:
+            raise RuntimeError(entry["error"]["message"])
+        return types.CallToolResult.model_validate(entry["response"])
+
+    async def list_tools(self) -> Any:
+        return self.cassette.catalog(self.server)
+
+    async def send_notification(self, notification: Any):
+        pass
+
+def tool_key(server: str, tool: str, arguments: Optional[Dict[str, Any]]) -> str:
+    """Request digest of a tool call."""
+    return request_key(TOOL, server, tool, arguments or {})
+
+_cassette: Optional[Cassette] = None
+
+def get_cassette() -> Optional[Cassette]:
+    """
+    Returns the process-wide cassette, or None when CASSETTE_MODE is not set.
+
+    Returns:
+        Optional[Cassette]: The cassette.
+    """
+    global _cassette
+    if _cassette is None and CASSETTE_MODE:
+        _cassette = Cassette()
+    return _cassette
@@ -1,18 +1,34 @@
 """
 LLM client for making API calls to language models.
 """
-import requests
-from typing import List, Dict, Any
+import httpx
+from typing import List, Dict, Any, Optional
 import logging
 
+from tools.token_profiler import report_usage
+
 # Logging setting
 logger = logging.getLogger(__name__)
 
+class LLMRequestError(Exception):
+    """
+    Raised when an LLM endpoint answers with an error status or cannot be reached.
+    """
+    def __init__(self, message: str, status: Optional[int] = None, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.status = status
+        self.retry_after = retry_after
+
+    @property
+    def retryable(self) -> bool:
+        """True for errors another attempt or another endpoint may not hit (timeouts, 429, 5xx)."""
+        return self.status is None or self.status == 429 or self.status >= 500
+
 class SingleLLMClient:
     """
     Client for making API calls to a single LLM provider.
     """
-    def __init__(self, endpoint: str, api_key: str, model: str = "gpt-4o"):
+    def __init__(self, endpoint: str, api_key: str, model: str = "gpt-4o", timeout: float = 120.0):
         """
         Initialize the LLM client.
         
@@ -20,39 +36,80 @@ class SingleLLMClient:
             endpoint (str): The API endpoint.
             api_key (str): The API key.
             model (str): The model name.
+            timeout (float): Request timeout in seconds.
         """
         self.endpoint = endpoint.rstrip("/")
         self.api_key = api_key
         self.model = model
+        self.timeout = timeout
 
-    def invoke(self, messages: List[Dict[str, str]]) -> str:
-        """
-        Invoke the LLM with the given messages.
-        
-        Args:
-            messages (List[Dict[str, str]]): The messages to send to the LLM.
-            
-        Returns:
-            str: The LLM response.
-        """
+        # Keep-alive connection pool, created on the event loop that first uses it
+        self._async_client: Optional[httpx.AsyncClient] = None
+
+    @property
+    def async_client(self) -> httpx.AsyncClient:
+        """The httpx client used by ainvoke and awarm."""
+        if self._async_client is None:
+            headers = {"Content-Type": "application/json"}
+            if self.api_key:
+                headers["Authorization"] = f"Bearer {self.api_key}"
+            self._async_client = httpx.AsyncClient(headers=headers, timeout=self.timeout)
+        return self._async_client
+
+    def _payload(self, messages: List[Dict[str, str]], model: Optional[str]) -> Dict[str, Any]:
+        model = model or self.model
         logger.debug("---")
-        logger.debug("Invoking LLM model [%s] with message:", self.model)
+        logger.debug("Invoking LLM model [%s] with message:", model)
         logger.debug(f"\033[33m {messages} \033[0m")
-        
-        headers = {
-            "Content-Type": "application/json",
-            "Authorization": f"Bearer {self.api_key}",
-        }
-        payload = {
-            "model": self.model,
+        return {
+            "model": model,
             "messages": messages,
             "temperature": 0.7,
             "max_tokens": 2048,
         }
-        r = requests.post(f"{self.endpoint}/chat/completions", json=payload, headers=headers)
-        r.raise_for_status()
-        data = r.json()
+
+    def _content(self, status: int, text: str, retry_after: Optional[str], data: Any) -> str:
+        """Extracts the completion, or raises LLMRequestError for an error status."""
+        if status >= 400:
+            raise LLMRequestError(
+                f"{self.endpoint}: HTTP {status}: {text[:200]}",
+                status=status,
+                retry_after=float(retry_after) if retry_after and retry_after.isdigit() else None,
+            )
+        payload = data()
         logger.debug("---")
         logger.debug("LLM response:")
-        logger.debug(f"\033[35m {data} \033[0m")
-        return data["choices"][0]["message"]["content"]
+        logger.debug(f"\033[35m {payload} \033[0m")
+        report_usage(payload.get("usage"))
+        return payload["choices"][0]["message"]["content"]
+
+    async def awarm(self):
+        """
+        Opens a pooled connection to the endpoint so the first call skips the TCP and TLS handshakes.
+        """
+        try:
+            await self.async_client.get(f"{self.endpoint}/models", timeout=10.0)
+            logger.debug("Async LLM connection pool warmed for %s", self.endpoint)
+        except httpx.HTTPError as e:
+            logger.warning(f"Could not warm LLM connection to {self.endpoint}: {e}")
+
+    async def ainvoke(self, messages: List[Dict[str, str]], model: Optional[str] = None) -> str:
+        """
+        Invoke the LLM without blocking the event loop.
+
+        Cancelling the calling task aborts the HTTP request, so the provider
+        stops generating for a user who is no longer waiting.
+
+        Args:
+            messages (List[Dict[str, str]]): The messages to send to the LLM.
+            model (Optional[str]): Model to use instead of the client's default.
+
+        Returns:
+            str: The LLM response.
+        """
+        payload = self._payload(messages, model)
+        try:
+            r = await self.async_client.post(f"{self.endpoint}/chat/completions", json=payload)
+        except httpx.HTTPError as e:
+            raise LLMRequestError(f"{self.endpoint}: {type(e).__name__}: {e}") from e
+        return self._content(r.status_code, r.text, r.headers.get("Retry-After"), r.json)
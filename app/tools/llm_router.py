@@ -0,0 +1,217 @@
+"""
+Routing LLM client with hedged requests and failover across several
+OpenAI-compatible endpoints.
+"""
+import os
+import time
+import asyncio
+from collections import deque
+from typing import List, Dict, Any, Optional
+import logging
+
+import httpx
+
+from tools.llm_client import LLMRequestError
+from tools.token_profiler import report_usage
+
+# Logging setting
+logger = logging.getLogger(__name__)
+
+# Hedge delay used until an endpoint has enough latency samples for a p95
+LLM_HEDGE_DELAY = float(os.getenv("LLM_HEDGE_DELAY", "3.0"))
+
+# Latency samples needed before the observed p95 is trusted as the hedge delay
+LLM_HEDGE_MIN_SAMPLES = int(os.getenv("LLM_HEDGE_MIN_SAMPLES", "20"))
+
+# Seconds an endpoint is ranked last after it failed
+LLM_ENDPOINT_COOLDOWN = float(os.getenv("LLM_ENDPOINT_COOLDOWN", "30"))
+
+class Endpoint:
+    """
+    One OpenAI-compatible endpoint and its observed latency.
+    """
+    def __init__(self, endpoint: str, api_key: str, model: str, timeout: float, window: int = 200):
+        self.endpoint = endpoint.rstrip("/")
+        self.api_key = api_key
+        self.model = model
+        self.timeout = timeout
+        self.latencies: deque = deque(maxlen=window)
+        self.cooldown_until = 0.0
+        self._client: Optional[httpx.AsyncClient] = None
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        """Keep-alive HTTP client, created on the event loop that first uses it."""
+        if self._client is None:
+            headers = {"Content-Type": "application/json"}
+            if self.api_key:
+                headers["Authorization"] = f"Bearer {self.api_key}"
+            self._client = httpx.AsyncClient(headers=headers, timeout=self.timeout)
+        return self._client
+
+    def percentile(self, q: float) -> Optional[float]:
+        """Returns the q-th latency percentile, or None without enough samples."""
+        if len(self.latencies) < LLM_HEDGE_MIN_SAMPLES:
+            return None
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+    @property
+    def hedge_delay(self) -> float:
+        """Seconds to wait on this endpoint before sending a hedged duplicate."""
+        p95 = self.percentile(0.95)
+        return p95 if p95 is not None else LLM_HEDGE_DELAY
+
+    @property
+    def healthy(self) -> bool:
+        return time.monotonic() >= self.cooldown_until
+
+    def rank_key(self):
+        """Sort key: healthy endpoints first, then by median latency."""
+        p50 = self.percentile(0.5)
+        return (not self.healthy, p50 if p50 is not None else 0.0)
+
+    async def invoke(self, messages: List[Dict[str, str]], model: Optional[str] = None) -> str:
+        """
+        Sends one chat completion request to this endpoint.
+
+        Args:
+            messages (List[Dict[str, str]]): The messages to send.
+            model (Optional[str]): Model to use instead of the endpoint's default.
+
+        Returns:
+            str: The LLM response.
+        """
+        payload = {
+            "model": model or self.model,
+            "messages": messages,
+            "temperature": 0.7,
+            "max_tokens": 2048,
+        }
+        start = time.monotonic()
+        try:
+            r = await self.client.post(f"{self.endpoint}/chat/completions", json=payload)
+        except asyncio.CancelledError:
+            # A request hedged away for being slow still took at least this long. Leaving it out
+            # would keep only the fast requests in the window and pull the hedge delay down
+            elapsed = time.monotonic() - start
+            if elapsed >= self.hedge_delay:
+                self.latencies.append(elapsed)
+            raise
+        except httpx.HTTPError as e:
+            self.cooldown_until = time.monotonic() + LLM_ENDPOINT_COOLDOWN
+            raise LLMRequestError(f"{self.endpoint}: {type(e).__name__}: {e}") from e
+
+        if r.status_code >= 400:
+            if r.status_code == 429 or r.status_code >= 500:
+                self.cooldown_until = time.monotonic() + LLM_ENDPOINT_COOLDOWN
+            retry_after = r.headers.get("Retry-After")
+            raise LLMRequestError(
+                f"{self.endpoint}: HTTP {r.status_code}: {r.text[:200]}",
+                status=r.status_code,
+                retry_after=float(retry_after) if retry_after and retry_after.isdigit() else None,
+            )
+
+        self.latencies.append(time.monotonic() - start)
+        data = r.json()
+        report_usage(data.get("usage"))
+        return data["choices"][0]["message"]["content"]
+
+    async def warm(self):
+        """Opens a pooled connection to the endpoint."""
+        try:
+            await self.client.get(f"{self.endpoint}/models", timeout=10.0)
+        except httpx.HTTPError as e:
+            logger.warning(f"Could not warm LLM connection to {self.endpoint}: {e}")
+
+class RoutingLLMClient:
+    """
+    Client spreading calls over several OpenAI-compatible endpoints.
+
+    Each call goes to the fastest healthy endpoint. If it has not answered
+    within that endpoint's observed p95 latency, a hedged duplicate is sent to
+    the next endpoint; the first answer wins and the other request is
+    cancelled. Timeouts, connection errors, 429 and 5xx fail over to the next
+    endpoint, other errors are raised to the caller.
+    """
+    def __init__(self, endpoints: List[Dict[str, Any]], timeout: float = 120.0):
+        """
+        Initialize the routing client.
+
+        Args:
+            endpoints (List[Dict[str, Any]]): Endpoint configs with "endpoint", "model" and
+                either "api_key" or "api_key_env" (name of the environment variable holding it).
+            timeout (float): Per-request timeout in seconds.
+        """
+        if not endpoints:
+            raise ValueError("RoutingLLMClient needs at least one endpoint.")
+        self.endpoints = [
+            Endpoint(
+                cfg["endpoint"],
+                cfg.get("api_key") or os.getenv(cfg.get("api_key_env", "OPENAI_API_KEY"), ""),
+                cfg.get("model", "gpt-4o-mini"),
+                cfg.get("timeout", timeout),
+            )
+            for cfg in endpoints
+        ]
+
+    @property
+    def model(self) -> str:
+        return self.endpoints[0].model
+
+    async def awarm(self):
+        """Opens a pooled connection to every endpoint."""
+        await asyncio.gather(*(ep.warm() for ep in self.endpoints))
+
+    async def ainvoke(self, messages: List[Dict[str, str]], model: Optional[str] = None) -> str:
+        """
+        Invoke the LLM through the fastest endpoint, hedging slow requests.
+
+        Args:
+            messages (List[Dict[str, str]]): The messages to send to the LLM.
+            model (Optional[str]): Model to use on every endpoint instead of their defaults.
+
+        Returns:
+            str: The LLM response.
+        """
+        candidates = sorted(self.endpoints, key=Endpoint.rank_key)
+        in_flight: Dict[asyncio.Task, Endpoint] = {}
+        errors: List[LLMRequestError] = []
+
+        def launch():
+            ep = candidates.pop(0)
+            logger.debug("Sending LLM request to %s [%s]", ep.endpoint, model or ep.model)
+            in_flight[asyncio.create_task(ep.invoke(messages, model))] = ep
+
+        launch()
+        try:
+            while in_flight:
+                # Wait for the newest request's hedge delay, or for ever once nothing is left to hedge to
+                newest = next(reversed(in_flight.values()))
+                timeout = newest.hedge_delay if candidates else None
+                done, _ = await asyncio.wait(in_flight, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+
+                if not done:
+                    logger.info(f"LLM request to {newest.endpoint} slower than {timeout:.2f}s, hedging")
+                    launch()
+                    continue
+
+                for task in done:
+                    ep = in_flight.pop(task)
+                    try:
+                        return task.result()
+                    except LLMRequestError as e:
+                        if not e.retryable:
+                            raise
+                        logger.warning(f"LLM request failed, failing over: {e}")
+                        errors.append(e)
+
+                if not in_flight and candidates:
+                    launch()
+        finally:
+            # Cancel the losing duplicates; httpx aborts their connections
+            for task in in_flight:
+                task.cancel()
+            await asyncio.gather(*in_flight, return_exceptions=True)
+
+        raise errors[-1] if errors else LLMRequestError("No LLM endpoint available.")
@@ -0,0 +1,245 @@
+"""
+Shared, rate-limit-aware scheduler for LLM calls.
+
+Every session sends its LLM calls through one scheduler per process. Calls
+are admitted by priority (interactive turns before background work), within
+request and token quotas enforced by token buckets and within a concurrency
+limit that adapts AIMD-style: it grows by one per window of successful calls
+and halves when the provider throttles, once per throttling episode (429s
+of calls sent before the last decrease do not decrease it again). A 429
+pauses admissions for the provider's Retry-After and the call is retried,
+so a burst of users queues up instead of erroring. Background work (the
+warm-up) runs at BACKGROUND priority, behind every interactive turn.
+"""
+import os
+import time
+import heapq
+import asyncio
+import itertools
+from typing import Any, Awaitable, Callable, Dict, List, Optional, TypeVar
+import logging
+
+from tools.llm_client import LLMRequestError
+
+# Logging setting
+logger = logging.getLogger(__name__)
+
+# Provider quotas and concurrency bounds
+LLM_REQUESTS_PER_MINUTE = float(os.getenv("LLM_REQUESTS_PER_MINUTE", "500"))
+LLM_TOKENS_PER_MINUTE = float(os.getenv("LLM_TOKENS_PER_MINUTE", "200000"))
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "16"))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "4"))
+
+# Priorities, lower runs first
+INTERACTIVE = 0
+BACKGROUND = 10
+
+T = TypeVar("T")
+
+class TokenBucket:
+    """
+    Token bucket refilled continuously at a per-minute rate.
+    """
+    def __init__(self, per_minute: float, capacity: Optional[float] = None):
+        self.rate = per_minute / 60.0
+        self.capacity = capacity if capacity is not None else per_minute
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float) -> float:
+        """Returns how long until `amount` tokens are available (0 if they are now)."""
+        self._refill()
+        amount = min(amount, self.capacity)
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) / self.rate
+
+    def take(self, amount: float):
+        """Removes tokens; the balance may go negative when a call used more than estimated."""
+        self._refill()
+        self.tokens -= min(amount, self.capacity)
+
+def estimate_tokens(messages: List[Dict[str, str]], max_tokens: int = 2048) -> int:
+    """
+    Rough token estimate for a chat request (about four characters per token plus the completion budget).
+
+    Args:
+        messages (List[Dict[str, str]]): The request messages.
+        max_tokens (int): Completion token budget of the request.
+
+    Returns:
+        int: Estimated tokens charged against the quota.
+    """
+    return sum(len(m.get("content") or "") for m in messages) // 4 + max_tokens
+
+class LLMScheduler:
+    """
+    Admission control shared by all LLM calls of the process.
+    """
+    def __init__(self, requests_per_minute: float = LLM_REQUESTS_PER_MINUTE,
+                 tokens_per_minute: float = LLM_TOKENS_PER_MINUTE,
+                 max_concurrency: int = LLM_MAX_CONCURRENCY,
+                 max_retries: int = LLM_MAX_RETRIES):
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+
+        # AIMD concurrency limit, kept as a float so additive increase can be fractional
+        self.limit = float(max_concurrency)
+        self.in_flight = 0
+        self.paused_until = 0.0
+        self.decreased_at = float("-inf")  # When the limit was last halved
+
+        self._waiters: list = []  # heap of (priority, seq, future, est_tokens)
+        self._seq = itertools.count()
+        self._wakeup: Optional[asyncio.TimerHandle] = None
+
+    async def run(self, call: Callable[[], Awaitable[T]], est_tokens: int, priority: int = INTERACTIVE) -> T:
+        """
+        Runs an LLM call once it is admitted, retrying when the provider throttles.
+
+        Args:
+            call (Callable[[], Awaitable[T]]): Makes the actual request.
+            est_tokens (int): Tokens the call is expected to consume.
+            priority (int): INTERACTIVE, BACKGROUND or any other int; lower runs first.
+
+        Returns:
+            T: The call's result.
+        """
+        for attempt in range(self.max_retries + 1):
+            await self._acquire(est_tokens, priority)
+            sent = time.monotonic()
+            try:
+                result = await call()
+            except LLMRequestError as e:
+                throttled = e.status == 429
+                if throttled:
+                    # Pause before releasing the slot so no queued call is admitted into the throttle
+                    self._on_throttled(e.retry_after, sent)
+                self._release()
+                if not throttled or attempt == self.max_retries:
+                    raise
+                continue
+            except BaseException:
+                self._release()
+                raise
+            self._release()
+            self._on_success()
+            return result
+
+    async def _acquire(self, est_tokens: int, priority: int):
+        """Waits for a concurrency slot and quota, in priority order."""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        heapq.heappush(self._waiters, (priority, next(self._seq), future, est_tokens))
+        self._dispatch()
+        try:
+            await future
+        except asyncio.CancelledError:
+            # Give the slot back if it was granted just before the cancellation landed
+            if future.done() and not future.cancelled():
+                self._release()
+            raise
+
+    def _dispatch(self):
+        """Admits waiters, highest priority first, while there is capacity and quota."""
+        loop = asyncio.get_running_loop()
+        while self._waiters:
+            _, _, future, est_tokens = self._waiters[0]
+            if future.cancelled():
+                heapq.heappop(self._waiters)
+                continue
+            if self.in_flight >= int(self.limit):
+                return
+
+            now = time.monotonic()
+            wait = max(
+                self.paused_until - now,
+                self.requests.wait_time(1),
+                self.tokens.wait_time(est_tokens),
+            )
+            if wait > 0:
+                self._schedule_wakeup(loop, wait)
+                return
+
+            heapq.heappop(self._waiters)
+            self.requests.take(1)
+            self.tokens.take(est_tokens)
+            self.in_flight += 1
+            future.set_result(None)
+
+    def _schedule_wakeup(self, loop: asyncio.AbstractEventLoop, delay: float):
+        """Re-runs the dispatcher once quota has refilled."""
+        if self._wakeup is not None:
+            self._wakeup.cancel()
+        self._wakeup = loop.call_later(delay, self._dispatch)
+
+    def _release(self):
+        self.in_flight -= 1
+        self._dispatch()
+
+    def _on_success(self):
+        """Additive increase: one more slot per `limit` successful calls."""
+        self.limit = min(float(self.max_concurrency), self.limit + 1.0 / self.limit)
+
+    def _on_throttled(self, retry_after: Optional[float], sent: float):
+        """
+        Multiplicative decrease and a pause honoring the provider's Retry-After.
+
+        Args:
+            retry_after (Optional[float]): The provider's Retry-After, in seconds.
+            sent (float): When the throttled call was sent, on the monotonic clock.
+        """
+        now = time.monotonic()
+        # The other calls in flight when the provider started throttling get their 429s within
+        # a round trip; they belong to the same episode and halve the limit only once
+        if sent >= self.decreased_at:
+            self.limit = max(1.0, self.limit / 2)
+            self.decreased_at = now
+        delay = retry_after if retry_after is not None else 1.0
+        self.paused_until = max(self.paused_until, now + delay)
+        logger.warning(f"LLM provider throttled, concurrency limit now {int(self.limit)}, pausing {delay:.1f}s")
+
+class ScheduledLLMClient:
+    """
+    LLM client wrapper that sends every call through a shared LLMScheduler.
+    """
+    def __init__(self, client: Any, scheduler: LLMScheduler, priority: int = INTERACTIVE):
+        self.client = client
+        self.scheduler = scheduler
+        self.priority = priority
+
+    @property
+    def model(self) -> str:
+        return self.client.model
+
+    def with_priority(self, priority: int) -> "ScheduledLLMClient":
+        """Returns a wrapper around the same client and scheduler with another priority."""
+        return ScheduledLLMClient(self.client, self.scheduler, priority)
+
+    async def awarm(self):
+        """Warms the client's connections, admitted like a call at this wrapper's priority."""
+        await self.scheduler.run(self.client.awarm, 0, self.priority)
+
+    async def ainvoke(self, messages: List[Dict[str, str]], model: Optional[str] = None) -> str:
+        """
+        Invoke the LLM once the scheduler admits the call.
+
+        Args:
+            messages (List[Dict[str, str]]): The messages to send to the LLM.
+            model (Optional[str]): Model to use instead of the client's default.
+
+        Returns:
+            str: The LLM response.
+        """
+        return await self.scheduler.run(
+            lambda: self.client.ainvoke(messages, model),
+            estimate_tokens(messages),
+            self.priority,
+        )
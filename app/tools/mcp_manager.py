@@ -3,11 +3,16 @@ MCP Tool Manager module.
 """
 import os
 import json
-from typing import Dict, Any, List, Optional
+import time
+import asyncio
+from typing import Dict, Any, List, Optional, Set, Tuple, TYPE_CHECKING
 from contextlib import AsyncExitStack
 
-from mcp import ClientSession, StdioServerParameters
-from mcp.client.stdio import stdio_client
+from tools.cassette import get_cassette, ReplaySession, CassetteMiss, TOOL, tool_key
+
+if TYPE_CHECKING:
+    from mcp import ClientSession
+    from tools.mcp_progress import ProgressCallback
 
 import logging
 # Logging setting
@@ -15,6 +20,9 @@ logger = logging.getLogger(__name__)
 grpc_logger = logging.getLogger("grpc")
 grpc_logger.setLevel(logging.DEBUG)
 
+# Seconds a server gets to shut down before its owner task is cancelled
+MCP_SHUTDOWN_TIMEOUT = float(os.getenv("MCP_SHUTDOWN_TIMEOUT", "5"))
+
 class MCPToolManager:
     """
     Manages MCP tool servers and provides an interface for tool invocation.
@@ -22,15 +30,28 @@ class MCPToolManager:
     def __init__(self, server_configs: List[Dict[str, Any]]):
         self.server_configs = server_configs
         self.tools: Dict[str, Any] = {}
-        self.sessions: Dict[str, ClientSession] = {}  # Store persistent sessions
-        self.exit_stacks: Dict[str, AsyncExitStack] = {} # Store exit stacks
+        self.sessions: Dict[str, "ClientSession"] = {}  # Store persistent sessions
+        self.owners: Dict[str, Tuple[asyncio.Task, asyncio.Event]] = {} # Task owning each server, and its stop event
+        self.catalog_version = 0 # Bumped whenever the set of available tools changes
+        self.cancellable: Set[str] = set() # Servers that accept "notifications/cancelled"
+        self.cassette = get_cassette() # Records or replays tool calls when CASSETTE_MODE is set
 
     async def initialize(self):
         """Initializes all configured servers and stores their sessions."""
         logger.debug("MCP tools configs:")
         for cfg in self.server_configs:
             logger.debug(cfg)
+            if cfg["name"] in self.sessions:
+                continue
             await self.connect_one_server(cfg)
+
+    def attach(self, shared: "MCPToolManager"):
+        """Makes the servers of a shared manager callable through this one without taking ownership."""
+        for name, session in shared.sessions.items():
+            self.sessions[name] = session
+            self.tools[name] = shared.tools[name]
+        self.cancellable |= shared.cancellable
+        self.catalog_version += 1
     
     def get_venv_python(self):
         """Returns the correct Python executable path inside the virtual environment."""
@@ -45,7 +66,21 @@ class MCPToolManager:
 
     async def connect_one_server(self, cfg: Dict[str, Any]):
         """Establishes a connection to a tool server and initializes tool mappings."""
+        # Imported on first use to keep process startup fast
+        from mcp import StdioServerParameters
+
         name = cfg["name"] # Tool Name (eg. WeatherTool)
+        if self.cassette is not None and self.cassette.replaying:
+            # Replay serves the recorded catalog and results, the server is not started
+            try:
+                self.tools[name] = self.cassette.catalog(name)
+            except CassetteMiss as e:
+                logger.error(f"Not replaying MCP server {name}: {e}")
+                return
+            self.sessions[name] = ReplaySession(name, self.cassette)
+            self.catalog_version += 1
+            return
+
         command = cfg["command"]
         args = cfg["args"]
 
@@ -64,15 +99,23 @@ class MCPToolManager:
             args=args,
             env=None
         )
-        self.exit_stacks[name] = AsyncExitStack()
-        stdio_transport = await self.exit_stacks[name].enter_async_context(stdio_client(server_params))
-        self.stdio, self.write = stdio_transport
-        session = await self.exit_stacks[name].enter_async_context(ClientSession(self.stdio, self.write))
-
-        await session.initialize()
+        # The server's contexts are entered and exited by a task of its own: anyio requires both to
+        # happen in the same task, and cleanup may be called from any task (reaper, another handler)
+        ready = asyncio.get_running_loop().create_future()
+        stop = asyncio.Event()
+        owner = asyncio.create_task(self._own_server(name, server_params, ready, stop), name=f"mcp-server-{name}")
+        self.owners[name] = (owner, stop)
+        try:
+            session = await ready
+        except BaseException:
+            owner.cancel()
+            self.owners.pop(name, None)
+            raise
 
         # Store session for future tool calls
         self.sessions[name] = session
+        if cfg.get("cancellable"):
+            self.cancellable.add(name)
 
         # List available tools
         tool_list_resp = await session.list_tools()
@@ -80,6 +123,36 @@ class MCPToolManager:
         logger.debug("List of MCP Tools:")
         logger.debug(f"\033[91m {tool_list_resp}\033[0m")
         self.tools[name] = tool_list_resp
+        self.catalog_version += 1
+        if self.cassette is not None and self.cassette.recording:
+            self.cassette.record_catalog(name, tool_list_resp)
+
+    async def _own_server(self, name: str, server_params: Any, ready: asyncio.Future, stop: asyncio.Event):
+        """Runs one server's stdio connection and session until asked to stop."""
+        from mcp.client.stdio import stdio_client
+        from tools.mcp_progress import ProgressClientSession
+
+        try:
+            async with AsyncExitStack() as stack:
+                read, write = await stack.enter_async_context(stdio_client(server_params))
+                session = await stack.enter_async_context(ProgressClientSession(read, write))
+                await session.initialize()
+                if not ready.done():  # Cancelled if connect_one_server was cancelled meanwhile
+                    ready.set_result(session)
+                await stop.wait()
+        except asyncio.CancelledError:
+            ready.cancel()
+            raise
+        except Exception as e:
+            if not ready.done():
+                ready.set_exception(e)
+            else:
+                logger.error(f"MCP server {name} stopped: {e}")
+
+    @property
+    def owned_servers(self) -> int:
+        """Number of server subprocesses this manager owns (attached shared ones excluded)."""
+        return len(self.owners)
 
     async def async_call_tool(self, tool_server: str, tool_name: str, kwargs) -> Any:
         """Calls a tool asynchronously, ensuring the correct session is used."""
@@ -91,35 +164,75 @@ class MCPToolManager:
         logger.debug(result)
         return result
 
-    async def call_tool(self, tool_server: str, tool_name: str, kwargs) -> Any:
-        """Calls a tool and ensures the result is returned properly."""
+    async def call_tool(self, tool_server: str, tool_name: str, kwargs,
+                        progress: Optional["ProgressCallback"] = None) -> Any:
+        """Calls a tool and ensures the result is returned properly, forwarding its progress to `progress` if given."""
         logger.debug(f"MCP call_tool-1: {tool_server}::{tool_name} with args: {kwargs}")
 
         if tool_server not in self.sessions:
             raise ValueError(f"Tool server '{tool_server}' not found!")
 
+        session = self.sessions[tool_server]
+        sent = []  # The request's id once it is sent, needed to cancel it on the server
+        recording = self.cassette is not None and self.cassette.recording
+        start = time.perf_counter()
         try:
-            result = await self.sessions[tool_server].call_tool(tool_name, kwargs)
+            result = await session.call_tool(tool_name, kwargs, progress=progress, on_request=sent.append)
             logger.debug(f"MCP call Tool-2: '{tool_name}' execution complete. Result: {result}")
+            if recording:
+                self._record(tool_server, tool_name, kwargs, start, response=result)
             return result
+        except asyncio.CancelledError:
+            if tool_server in self.cancellable and sent:
+                await self.cancel_request(tool_server, sent[0], f"Call to '{tool_name}' cancelled by the client")
+            raise
         except Exception as e:
             logger.error(f"Error calling tool '{tool_name}': {e}")
+            if recording:
+                self._record(tool_server, tool_name, kwargs, start, error={"message": str(e)})
             return {"error": str(e)}
 
+    def _record(self, tool_server: str, tool_name: str, kwargs, start: float, **outcome):
+        """Appends a tool call to the cassette."""
+        request = {"server": tool_server, "tool": tool_name, "args": kwargs}
+        self.cassette.record(TOOL, tool_key(tool_server, tool_name, kwargs), request,
+                             time.perf_counter() - start, **outcome)
+
+    async def cancel_request(self, tool_server: str, request_id: int, reason: str):
+        """Tells a tool server to stop working on a request whose result is no longer wanted."""
+        from mcp import types
+
+        notification = types.ClientNotification(types.CancelledNotification(
+            method="notifications/cancelled",
+            params=types.CancelledNotificationParams(requestId=request_id, reason=reason),
+        ))
+        try:
+            # Shielded so a second cancellation cannot drop the notification half-sent
+            await asyncio.shield(self.sessions[tool_server].send_notification(notification))
+            logger.info(f"Sent cancellation of request {request_id} to {tool_server}")
+        except Exception as e:
+            logger.warning(f"Could not cancel request {request_id} on {tool_server}: {e}")
+
     async def cleanup(self):
         """Closes all sessions and exit stacks on shutdown."""
         logger.info("Cleaning up MCP sessions...")
         
-        # Close all exit stacks which will properly clean up all resources
-        for name, exit_stack in list(self.exit_stacks.items()):
+        # Ask every owner task to close its session and subprocess, and wait for them
+        for name, (owner, stop) in list(self.owners.items()):
+            stop.set()
+        for name, (owner, stop) in list(self.owners.items()):
             try:
-                await exit_stack.aclose()
-                logger.info(f"Successfully closed exit stack for {name}")
+                await asyncio.wait_for(owner, MCP_SHUTDOWN_TIMEOUT)
+                logger.info(f"Successfully closed MCP server {name}")
+            except asyncio.TimeoutError:
+                logger.error(f"MCP server {name} did not shut down within {MCP_SHUTDOWN_TIMEOUT}s, cancelled")
             except Exception as e:
-                logger.error(f"Error closing exit stack for {name}: {e}")
+                logger.error(f"Error closing MCP server {name}: {e}")
         
         # Clear all dictionaries
-        self.exit_stacks.clear()
+        self.owners.clear()
         self.sessions.clear()
         self.tools.clear()
+        self.cancellable.clear()
+        self.catalog_version += 1
         logger.info("MCP cleanup complete")
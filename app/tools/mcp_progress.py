@@ -0,0 +1,119 @@
+"""
+MCP client session that forwards tool progress to the caller.
+
+A tool call made with a progress callback carries a progress token in its
+request "_meta". The server then sends "notifications/progress" for that
+token while the tool runs (see mcpservers/progress.py). Besides the standard
+progress and total, the servers in this repository add a status "message"
+and "partial" content, so the UI can show what the tool found so far.
+"""
+import itertools
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Optional, Union
+
+from mcp import ClientSession, types
+
+# Logging setting
+import logging
+logger = logging.getLogger(__name__)
+
+@dataclass(slots=True)
+class ProgressUpdate:
+    """
+    One progress notification of a running tool call.
+    """
+    progress: float
+    total: Optional[float] = None
+    message: Optional[str] = None   # What the tool is doing now
+    partial: Optional[str] = None   # Content of the result the tool already has
+
+    def describe(self) -> str:
+        """Short status line, e.g. "Summarizing page 2 (2/5)"."""
+        count = f"{self.progress:g}/{self.total:g}" if self.total else f"{self.progress:g}"
+        return f"{self.message} ({count})" if self.message else count
+
+# Called with each update of a tool call, from the session's receive loop: must not block
+ProgressCallback = Callable[[ProgressUpdate], None]
+
+class ProgressClientSession(ClientSession):
+    """
+    ClientSession whose call_tool can report the server's progress notifications.
+    """
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._progress: Dict[Union[str, int], ProgressCallback] = {}
+        self._progress_tokens = itertools.count(1)
+
+    async def __aenter__(self):
+        session = await super().__aenter__()
+        # The base session also queues every notification on an unbuffered stream nobody reads,
+        # which blocks its receive loop at the first one; they are handled in _received_notification
+        self._task_group.start_soon(self._drain_incoming)
+        return session
+
+    async def _drain_incoming(self):
+        async for message in self._incoming_message_stream_reader:
+            if isinstance(message, Exception):
+                logger.warning(f"MCP transport error: {message}")
+
+    async def call_tool(self, name: str, arguments: Optional[Dict[str, Any]] = None,
+                        progress: Optional[ProgressCallback] = None,
+                        on_request: Optional[Callable[[types.RequestId], None]] = None) -> types.CallToolResult:
+        """
+        Sends a tools/call request, asking for progress notifications when a callback is given.
+
+        Args:
+            name (str): The tool name.
+            arguments (Optional[Dict[str, Any]]): The tool arguments.
+            progress (Optional[ProgressCallback]): Called with each progress update.
+            on_request (Optional[Callable[[types.RequestId], None]]): Called with the request's
+                JSON-RPC id as it is sent, the id a notifications/cancelled must name.
+
+        Returns:
+            types.CallToolResult: The tool result.
+        """
+        token = None
+        if progress is not None:
+            token = next(self._progress_tokens)
+            self._progress[token] = progress
+        try:
+            return await self.send_request(
+                types.ClientRequest(
+                    types.CallToolRequest(
+                        method="tools/call",
+                        params=types.CallToolRequestParams(
+                            name=name,
+                            arguments=arguments,
+                            _meta=types.RequestParams.Meta(progressToken=token) if token is not None else None,
+                        ),
+                    )
+                ),
+                types.CallToolResult,
+                on_request,
+            )
+        finally:
+            if token is not None:
+                self._progress.pop(token, None)
+
+    async def send_request(self, request: types.ClientRequest, result_type: type,
+                           on_request: Optional[Callable[[types.RequestId], None]] = None) -> Any:
+        if on_request is not None:
+            # The base session numbers requests from this counter as it sends them, with no
+            # await in between, so this is the id the request below goes out with
+            on_request(self._request_id)
+        return await super().send_request(request, result_type)
+
+    async def _received_notification(self, notification: types.ServerNotification) -> None:
+        params = getattr(notification.root, "params", None)
+        if not isinstance(notification.root, types.ProgressNotification) or params is None:
+            return
+
+        callback = self._progress.get(params.progressToken)
+        if callback is None:
+            return  # Late notification of a finished call
+        extra = params.model_extra or {}
+        update = ProgressUpdate(params.progress, params.total, extra.get("message"), extra.get("partial"))
+        try:
+            callback(update)
+        except Exception as e:
+            logger.warning(f"Error in tool progress callback: {e}")
@@ -0,0 +1,305 @@
+"""
+Token and prompt-size profiler for LLM calls.
+
+Every message of every LLM request is counted and attributed to a prompt
+component: the system template, the tool catalog rendered into it, the
+conversation history, tool outputs (by server and tool) and the user input.
+Each call is recorded with its latency and the usage the provider reports,
+and aggregated per component, tool and server, so prompt optimizations can
+target where the tokens actually go.
+
+Enabled with TOKEN_PROFILE=1. Calls are appended to TOKEN_PROFILE_PATH as
+JSON lines; benchmarks/token_report.py turns that file into a report.
+"""
+import os
+import re
+import json
+import time
+import hashlib
+from collections import OrderedDict, defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, List, Optional, Tuple
+
+from utils.tokens import count_tokens, tokenizer_name
+
+# Logging setting
+import logging
+logger = logging.getLogger(__name__)
+
+TOKEN_PROFILE = os.getenv("TOKEN_PROFILE", "").lower() in ("1", "true", "yes")
+TOKEN_PROFILE_PATH = os.getenv("TOKEN_PROFILE_PATH", "token_profile.jsonl")
+
+# Prompt components
+SYSTEM_TEMPLATE = "system_template"
+TOOL_CATALOG = "tool_catalog"
+HISTORY = "history"
+TOOL_OUTPUT = "tool_output"
+USER_INPUT = "user_input"
+COMPONENTS = (SYSTEM_TEMPLATE, TOOL_CATALOG, HISTORY, TOOL_OUTPUT, USER_INPUT)
+
+# Header of a tool result in the history, see tool_call_and_second_invoke and execute_plan
+_TOOL_RESULT = re.compile(r"^Tool result (?:of step \S+ )?from (\S+) (\S+) using ", re.MULTILINE)
+
+# Token counts of recently seen texts, by digest
+_COUNTS_KEPT = 2048
+
+# Usage reported by the provider for the call being profiled
+_usage: ContextVar[Optional[Dict[str, Any]]] = ContextVar("llm_usage", default=None)
+
+def report_usage(usage: Optional[Dict[str, Any]]):
+    """
+    Hands the provider's usage fields of a response to the profiler, if a call is being profiled.
+
+    Args:
+        usage (Optional[Dict[str, Any]]): The "usage" object of the chat completion.
+    """
+    box = _usage.get()
+    if box is not None and usage:
+        box["usage"] = usage
+
+@contextmanager
+def usage_scope():
+    """
+    Collects the usage reported by the LLM call made inside the block.
+
+    Yields:
+        Dict[str, Any]: Holds the usage under "usage" once reported. Nested scopes share the outermost one.
+    """
+    box = _usage.get()
+    if box is not None:
+        yield box
+        return
+    box = {}
+    token = _usage.set(box)
+    try:
+        yield box
+    finally:
+        _usage.reset(token)
+
+def _digest(text: str) -> str:
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()[:16]
+
+class TokenProfiler:
+    """
+    Per-component token accounting of LLM calls.
+    """
+    def __init__(self, path: Optional[str] = TOKEN_PROFILE_PATH):
+        self.path = path
+        self._counts: "OrderedDict[str, int]" = OrderedDict()
+        self.calls = 0
+        self.latency = 0.0
+        self.components: Dict[str, int] = defaultdict(int)
+        self.completion_tokens = 0
+        self.provider: Dict[str, int] = defaultdict(int)  # Summed provider usage fields
+        self.estimated_with_usage = 0  # Our prompt count of the calls the provider reported usage for
+        # Per "server.tool": tokens sent (resends included), messages sent, and distinct results
+        self.tools: Dict[str, Dict[str, Any]] = defaultdict(lambda: {"sent_tokens": 0, "sent": 0, "results": {}})
+
+    def count(self, text: str) -> int:
+        """Counts tokens, remembering the counts of texts resent on every call (prompt, tool results)."""
+        if len(text) < 256:
+            return count_tokens(text)
+        key = _digest(text)
+        n = self._counts.get(key)
+        if n is None:
+            n = count_tokens(text)
+            self._counts[key] = n
+            if len(self._counts) > _COUNTS_KEPT:
+                self._counts.popitem(last=False)
+        else:
+            self._counts.move_to_end(key)
+        return n
+
+    def split(self, messages: List[Dict[str, str]]) -> Tuple[Dict[str, int], Dict[str, Tuple[str, int]]]:
+        """
+        Attributes the tokens of a request to prompt components.
+
+        Args:
+            messages (List[Dict[str, str]]): The request messages.
+
+        Returns:
+            tuple: (tokens per component, {digest: ("server.tool", tokens)} of the tool outputs).
+        """
+        from utils.prompts import tool_section_of
+
+        components = dict.fromkeys(COMPONENTS, 0)
+        tool_outputs: Dict[str, Tuple[str, int]] = {}
+        last = len(messages) - 1
+        for i, message in enumerate(messages):
+            content = message.get("content") or ""
+            role = message.get("role")
+            if i == 0 and role == "system":
+                section = tool_section_of(content)
+                catalog = self.count(section) if section else 0
+                components[TOOL_CATALOG] += catalog
+                components[SYSTEM_TEMPLATE] += max(self.count(content) - catalog, 0)
+            elif i == last and role == "user":
+                components[USER_INPUT] += self.count(content)
+            else:
+                sections = list(_TOOL_RESULT.finditer(content))
+                if not sections:
+                    components[HISTORY] += self.count(content)
+                    continue
+                components[HISTORY] += self.count(content[:sections[0].start()])
+                for j, match in enumerate(sections):
+                    end = sections[j + 1].start() if j + 1 < len(sections) else len(content)
+                    text = content[match.start():end]
+                    n = self.count(text)
+                    components[TOOL_OUTPUT] += n
+                    tool_outputs[_digest(text)] = (f"{match.group(1)}.{match.group(2)}", n)
+        return components, tool_outputs
+
+    def record(self, messages: List[Dict[str, str]], model: str, latency: float,
+               response: str, usage: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """
+        Accounts one LLM call and appends it to the profile file.
+
+        Args:
+            messages (List[Dict[str, str]]): The request messages.
+            model (str): The model called.
+            latency (float): Seconds the call took.
+            response (str): The completion.
+            usage (Optional[Dict[str, Any]]): The provider's usage fields, if reported.
+
+        Returns:
+            Dict[str, Any]: The call record.
+        """
+        components, tool_outputs = self.split(messages)
+        entry = {
+            "ts": round(time.time(), 3),
+            "model": model,
+            "latency_s": round(latency, 4),
+            "prompt_tokens": sum(components.values()),
+            "completion_tokens": self.count(response),
+            "components": components,
+            "tools": {digest: list(tool) for digest, tool in tool_outputs.items()},
+            "usage": usage,
+        }
+        self._add(entry)
+        if self.path:
+            try:
+                with open(self.path, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(entry, separators=(",", ":")) + "\n")
+            except OSError as e:
+                logger.warning(f"Could not write token profile to {self.path}: {e}")
+        return entry
+
+    def load(self, path: str) -> "TokenProfiler":
+        """
+        Aggregates the calls of a profile file, as if they had been recorded by this profiler.
+
+        Args:
+            path (str): A file written with TOKEN_PROFILE_PATH.
+
+        Returns:
+            TokenProfiler: self.
+        """
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    self._add(json.loads(line))
+        return self
+
+    def _add(self, entry: Dict[str, Any]):
+        """Adds a call record to the totals."""
+        self.calls += 1
+        self.latency += entry["latency_s"]
+        self.completion_tokens += entry["completion_tokens"]
+        for name, n in entry["components"].items():
+            self.components[name] += n
+        for digest, (tool, n) in entry["tools"].items():
+            stats = self.tools[tool]
+            stats["sent_tokens"] += n
+            stats["sent"] += 1
+            stats["results"][digest] = n
+        usage = entry.get("usage")
+        if usage:
+            self.estimated_with_usage += entry["prompt_tokens"]
+            for key in ("prompt_tokens", "completion_tokens", "total_tokens"):
+                if isinstance(usage.get(key), int):
+                    self.provider[key] += usage[key]
+
+    def report(self) -> Dict[str, Any]:
+        """
+        Aggregated profile.
+
+        Returns:
+            Dict[str, Any]: Totals and per-call averages by component, tool and server.
+        """
+        calls = self.calls or 1
+        prompt = sum(self.components.values())
+        tools = {}
+        servers: Dict[str, Dict[str, int]] = defaultdict(lambda: {"sent_tokens": 0, "results": 0, "result_tokens": 0})
+        for tool, stats in sorted(self.tools.items(), key=lambda item: -item[1]["sent_tokens"]):
+            results = stats["results"]
+            result_tokens = sum(results.values())
+            tools[tool] = {
+                "results": len(results),
+                "avg_result_tokens": round(result_tokens / len(results)) if results else 0,
+                "sent_tokens": stats["sent_tokens"],
+                "resend_factor": round(stats["sent"] / len(results), 2) if results else 0,
+                "share_of_prompt": round(stats["sent_tokens"] / prompt, 3) if prompt else 0,
+            }
+            server = servers[tool.split(".", 1)[0]]
+            server["sent_tokens"] += stats["sent_tokens"]
+            server["results"] += len(results)
+            server["result_tokens"] += result_tokens
+
+        report = {
+            "tokenizer": tokenizer_name(),
+            "calls": self.calls,
+            "avg_latency_s": round(self.latency / calls, 3),
+            "prompt_tokens": prompt,
+            "completion_tokens": self.completion_tokens,
+            "components": {
+                name: {"tokens": n, "avg_per_call": round(n / calls), "share": round(n / prompt, 3) if prompt else 0}
+                for name, n in self.components.items()
+            },
+            "tools": tools,
+            "servers": {
+                name: {**stats, "avg_result_tokens": round(stats["result_tokens"] / stats["results"]) if stats["results"] else 0}
+                for name, stats in servers.items()
+            },
+            "provider_usage": dict(self.provider),
+        }
+        if self.provider.get("prompt_tokens") and self.estimated_with_usage:
+            # Provider prompt tokens per counted token, > 1 when the count underestimates
+            report["provider_ratio"] = round(self.provider["prompt_tokens"] / self.estimated_with_usage, 3)
+        return report
+
+class ProfilingLLMClient:
+    """
+    LLM client wrapper that profiles every call with a TokenProfiler.
+    """
+    def __init__(self, client: Any, profiler: TokenProfiler):
+        self.client = client
+        self.profiler = profiler
+
+    @property
+    def model(self) -> str:
+        return self.client.model
+
+    async def awarm(self):
+        await self.client.awarm()
+
+    async def ainvoke(self, messages: List[Dict[str, str]], model: Optional[str] = None) -> str:
+        """
+        Invoke the LLM and account the call.
+
+        Args:
+            messages (List[Dict[str, str]]): The messages to send to the LLM.
+            model (Optional[str]): Model to use instead of the client's default.
+
+        Returns:
+            str: The LLM response.
+        """
+        start = time.perf_counter()
+        with usage_scope() as box:
+            content = await self.client.ainvoke(messages, model)
+        try:
+            self.profiler.record(messages, model or self.client.model, time.perf_counter() - start,
+                                 content, box.get("usage"))
+        except Exception as e:
+            logger.warning(f"Token profiling failed: {e}")
+        return content
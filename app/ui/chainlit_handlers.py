@@ -3,43 +3,50 @@ Chainlit UI handlers.
 """
 import os
 import asyncio
+import contextvars
 import chainlit as cl
 import logging
-from typing import Dict, Any
+from contextlib import asynccontextmanager
+from typing import Dict, Any, List, TYPE_CHECKING
 
-from langfuse import Langfuse
-from langfuse.callback import CallbackHandler
-
-from config.loader import load_server_config
-from tools.llm_client import SingleLLMClient
-from tools.mcp_manager import MCPToolManager
 from graph.state import MyState, GraphState
-from graph.builder import build_graph
+from graph.history import ConversationBuffer
+from runtime.warmup import get_runtime, start_warm_up, warm_up, is_ready
+from runtime.sessions import get_session_registry, SESSION_RESET_NOTICE
 
-# Environment variables
-from dotenv import load_dotenv
-load_dotenv()
+if TYPE_CHECKING:
+    from tools.mcp_progress import ProgressUpdate
 
 # Logging setting
 logger = logging.getLogger(__name__)
 
-# Langfuse setup
-langfuse = Langfuse(
-    secret_key=os.getenv("LANGFUSE_SECRET_KEY", "your langfuse secret key"),
-    public_key=os.getenv("LANGFUSE_PUBLIC_KEY", "your langfuse public key"),
-    host=os.getenv("LANGFUSE_HOST", "http://localhost:3000")
-)
+# Seconds between two refreshes of a tool step
+PROGRESS_REFRESH = 0.25
+
+def install_warm_up_hook():
+    """
+    Starts the process warm-up as soon as the Chainlit server boots, before the first chat.
+    """
+    from chainlit.server import app as chainlit_app
+
+    lifespan = chainlit_app.router.lifespan_context
+    if getattr(lifespan, "warm_up_installed", False):
+        return
 
-# LLM configuration
-LLM_API_ENDPOINT = os.getenv("OPENAI_API_BASE", "https://api.openai.com/v1")
-LLM_API_KEY = os.getenv("OPENAI_API_KEY", "YOUR_OPENAI_KEY_HERE")
-LLM_MODEL = "gpt-4o-mini"
+    @asynccontextmanager
+    async def lifespan_with_warm_up(app):
+        async with lifespan(app) as state:
+            start_warm_up()
+            yield state
+            # Release every session's servers, then the shared ones, before the worker exits
+            await get_session_registry().close_all()
+            if is_ready():
+                await get_runtime().tool_manager.cleanup()
 
-# Load server configuration
-SERVERS_CONFIG = load_server_config()
+    lifespan_with_warm_up.warm_up_installed = True
+    chainlit_app.router.lifespan_context = lifespan_with_warm_up
 
-# Create Langfuse handler
-langfuse_handler = CallbackHandler()
+install_warm_up_hook()
 
 @cl.on_chat_start
 async def on_chat_start():
@@ -62,21 +69,7 @@ async def on_chat_start():
 
     # Check if MCP Tool Manager is already initialized
     if cl.user_session.get("tool_manager") is None:
-        llm = SingleLLMClient(LLM_API_ENDPOINT, LLM_API_KEY, LLM_MODEL)
-        mcp_client = MCPToolManager(SERVERS_CONFIG)
-        
-        # Run tool manager initialization in the background
-        task = asyncio.create_task(mcp_client.initialize())
-        await task
-
-        # Store in user session so it's not recreated every time
-        cl.user_session.set("llm", llm)
-        cl.user_session.set("tool_manager", mcp_client)
-        
-        # Build the graph
-        graph = build_graph()
-        cl.user_session.set("graph", graph)
-
+        await open_session(session_id)
         logger.info("MCPToolManager initialized.")
 
     else:
@@ -84,6 +77,29 @@ async def on_chat_start():
 
     await cl.Message(content="Hello! Ask me anything.").send()
 
+async def open_session(session_id: str):
+    """
+    Creates the session's tool manager and history, and registers them for lifecycle management.
+
+    Args:
+        session_id (str): The Chainlit session ID.
+    """
+    # Returns immediately once the process warm-up has completed
+    runtime = await warm_up()
+
+    # Only the session's private servers are spawned here, shared ones are reused
+    mcp_client = await runtime.create_session_tool_manager()
+    chat_history = ConversationBuffer()
+    await get_session_registry().register(session_id, mcp_client, chat_history)
+
+    # Store in user session so it's not recreated every time
+    cl.user_session.set("llm", runtime.llm)
+    cl.user_session.set("tool_manager", mcp_client)
+    cl.user_session.set("chat_history", chat_history)
+
+    # The graph is compiled once per process
+    cl.user_session.set("graph", runtime.graph)
+
 @cl.on_message
 async def on_message(msg: cl.Message):
     """
@@ -95,10 +111,28 @@ async def on_message(msg: cl.Message):
     user_txt = msg.content.strip()
     logger.debug(f"Received message: {user_txt}")  # Debug print
 
+    # A new message supersedes the one still being answered
+    cancel_current_run("superseded by a new message")
+    cl.user_session.set("current_run", asyncio.current_task())
+
+    # A session closed while idle (or evicted) gets fresh resources; the user is told its context is gone
+    session_id = cl.user_session.get("session_id")
+    if await get_session_registry().resume(session_id, asyncio.current_task(), lambda: open_session(session_id)):
+        await cl.Message(content=SESSION_RESET_NOTICE).send()
+
     # Create state for this message
-    my_state = MyState(user_input=user_txt)
+    my_state = MyState(user_input=user_txt, chat_history=cl.user_session.get("chat_history"))
     my_state.llm = cl.user_session.get("llm")
     my_state.tool_manager = cl.user_session.get("tool_manager")
+    my_state.model_policy = get_runtime().model_policy
+    my_state.local_router = get_runtime().local_router
+    cassette = get_runtime().cassette
+    if cassette is not None and cassette.recording:
+        cassette.record_turn(session_id, user_txt)
+
+    # Tools reporting progress are shown as live steps while they run
+    tool_steps = ToolProgressSteps()
+    my_state.tool_progress = tool_steps
 
     # Get the graph
     graph = cl.user_session.get("graph")
@@ -111,7 +145,7 @@ async def on_message(msg: cl.Message):
         "configurable": {
             "my_state": my_state
         },
-        "callbacks": [langfuse_handler]
+        "callbacks": [get_runtime().langfuse_handler]
     }
 
     final_answer = None
@@ -120,9 +154,17 @@ async def on_message(msg: cl.Message):
             logger.debug(f"Stream output: {output}")  # Debug print
             if isinstance(output, dict) and "final_answer" in output:
                 final_answer = output["final_answer"]
+    except asyncio.CancelledError:
+        # Cancelling stops the graph, which aborts the pending LLM request and tool calls
+        logger.info("Message processing cancelled.")
+        raise
     except Exception as e:
         logger.debug(f"Error in stream: {e}")  # Debug print
         final_answer = f"Error occurred: {str(e)}"
+    finally:
+        await tool_steps.close()
+        if cl.user_session.get("current_run") is asyncio.current_task():
+            cl.user_session.set("current_run", None)
 
     # If we didn't get a final answer from the graph, check my_state
     if not final_answer:
@@ -134,3 +176,86 @@ async def on_message(msg: cl.Message):
 
     logger.debug(f"Sending answer: {final_answer}")  # Debug print
     await cl.Message(content=final_answer).send()
+
+class ToolProgressSteps:
+    """
+    Shows the progress and partial results of a message's tool calls as Chainlit steps.
+
+    Updates arrive on the MCP sessions' receive loops, which must not wait on the
+    browser, so they are only recorded there. A task per tool call renders the
+    latest state at most every PROGRESS_REFRESH seconds.
+    """
+    def __init__(self):
+        self.context = contextvars.copy_context()  # The message's Chainlit context
+        self.partials: Dict[str, List[str]] = {}
+        self.status: Dict[str, str] = {}
+        self.changed: Dict[str, asyncio.Event] = {}
+        self.renderers: List[asyncio.Task] = []
+        self.finished = False
+        self.closing = asyncio.Event()
+
+    def __call__(self, label: str, update: "ProgressUpdate"):
+        if self.finished:
+            return
+        if update.partial:
+            self.partials.setdefault(label, []).append(update.partial)
+        self.status[label] = update.describe()
+        if label not in self.changed:
+            self.changed[label] = asyncio.Event()
+            loop = asyncio.get_running_loop()
+            self.renderers.append(loop.create_task(self._show(label), context=self.context.copy()))
+        self.changed[label].set()
+
+    def _output(self, label: str) -> str:
+        return "\n\n".join([*self.partials.get(label, []), f"_{self.status[label]}_"])
+
+    async def _show(self, label: str):
+        changed = self.changed[label]
+        async with cl.Step(name=label, type="tool") as step:
+            while not self.finished:
+                await changed.wait()
+                changed.clear()
+                step.output = self._output(label)
+                await step.update()
+                try:
+                    await asyncio.wait_for(self.closing.wait(), PROGRESS_REFRESH)
+                except asyncio.TimeoutError:
+                    pass
+            step.output = self._output(label)
+
+    async def close(self):
+        """Renders the final state of every step and closes them."""
+        self.finished = True
+        self.closing.set()
+        for event in self.changed.values():
+            event.set()
+        if self.renderers:
+            await asyncio.gather(*self.renderers, return_exceptions=True)
+
+def cancel_current_run(reason: str):
+    """
+    Cancels the message of the session still being processed, if any.
+
+    Args:
+        reason (str): Why the run is cancelled, for the logs.
+    """
+    task = cl.user_session.get("current_run")
+    if task is not None and not task.done() and task is not asyncio.current_task():
+        logger.info(f"Cancelling in-flight message: {reason}")
+        task.cancel()
+
+@cl.on_stop
+async def on_stop():
+    """
+    Handler for the stop button.
+    """
+    cancel_current_run("stopped by the user")
+
+@cl.on_chat_end
+async def on_chat_end():
+    """
+    Handler for the end of a chat (tab closed or new chat).
+    """
+    # Cancels the message still being answered and stops the session's servers
+    await get_session_registry().close(cl.user_session.get("session_id"), "chat ended")
+    cl.user_session.set("tool_manager", None)
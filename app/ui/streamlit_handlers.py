@@ -1,133 +1,145 @@
 """
 Streamlit UI handlers.
+
+The coroutines in this module run on the process-wide background event loop
+(see runtime.loop), not on the Streamlit script thread, so they never touch
+st.session_state. Everything they need is passed in a StreamlitSession.
 """
 import os
+import queue
 import asyncio
-import streamlit as st
-from typing import Dict, Any
-
-from langfuse import Langfuse
-from langfuse.callback import CallbackHandler
+from typing import Dict, Any, Optional, Tuple
 
-from config.loader import load_server_config
-from tools.llm_client import SingleLLMClient
-from tools.mcp_manager import MCPToolManager
 from graph.state import MyState, GraphState
-from graph.builder import build_graph
+from graph.history import ConversationBuffer
+from runtime.warmup import get_runtime, warm_up
+from runtime.sessions import get_session_registry, SESSION_RESET_NOTICE
 
 # Logging setting
 import logging
 logger = logging.getLogger(__name__)
 
-# Environment variables
-from dotenv import load_dotenv
-load_dotenv()
-
-# Langfuse setup
-langfuse = Langfuse(
-    secret_key=os.getenv("LANGFUSE_SECRET_KEY", ""),
-    public_key=os.getenv("LANGFUSE_PUBLIC_KEY", ""),
-    host=os.getenv("LANGFUSE_HOST", "http://localhost:3000")
-)
-
-# LLM configuration
-LLM_API_ENDPOINT = os.getenv("OPENAI_API_BASE", "https://api.openai.com/v1")
-LLM_API_KEY = os.getenv("OPENAI_API_KEY", "")
-LLM_MODEL = "gpt-4o-mini"
-
-# Load server configuration
-SERVERS_CONFIG = load_server_config()
-
-# Create Langfuse handler
-langfuse_handler = CallbackHandler()
+class StreamlitSession:
+    """
+    Per-browser-session resources, owned by the background event loop.
+    """
+    def __init__(self):
+        self.session_id = os.urandom(8).hex()
+        self.chat_history = ConversationBuffer()
+        self.tool_manager = None
+        self.init_error: Optional[str] = None
 
-async def cleanup_previous_session():
+async def initialize_session() -> StreamlitSession:
     """
-    Clean up resources from a previous session if they exist.
+    Initialize a session with the necessary components.
+
+    Returns:
+        StreamlitSession: The new session.
     """
-    if "tool_manager" in st.session_state and st.session_state.tool_manager:
-        try:
-            logger.info("Cleaning up previous MCP sessions...")
-            await st.session_state.tool_manager.cleanup()
-        except Exception as e:
-            logger.error(f"Error during cleanup: {e}")
-
-async def initialize_session():
+    session = StreamlitSession()
+    await open_session(session)
+    logger.info(f"Session initialized with ID: {session.session_id}")
+    return session
+
+async def open_session(session: StreamlitSession):
     """
-    Initialize the session state with necessary components.
+    Creates the session's tool manager and registers its resources for lifecycle management.
+
+    Args:
+        session (StreamlitSession): The session to open.
     """
-    # Clean up previous session if it exists
-    await cleanup_previous_session()
-    
-    # Set initialized flag and create new session ID
-    st.session_state.initialized = True
-    st.session_state.session_id = os.urandom(8).hex()
-    st.session_state.chat_history = []
-    
-    # Initialize LLM client
-    st.session_state.llm = SingleLLMClient(LLM_API_ENDPOINT, LLM_API_KEY, LLM_MODEL)
-    
-    # Initialize MCP Tool Manager with the current event loop
-    st.session_state.tool_manager = MCPToolManager(SERVERS_CONFIG)
-    
+    # The warm-up runs on this loop, so shared servers and the LLM client can be reused
+    runtime = await warm_up()
+
     try:
-        await st.session_state.tool_manager.initialize()
+        session.tool_manager = await runtime.create_session_tool_manager()
+        session.init_error = None
     except Exception as e:
         logger.error(f"Error initializing MCP Tool Manager: {e}")
-        st.error(f"Failed to initialize MCP tools: {e}")
-    
-    # Build the graph
-    st.session_state.graph = build_graph()
-    
-    logger.info(f"Session initialized with ID: {st.session_state.session_id}")
-
-async def process_message(user_input: str):
+        session.init_error = f"Failed to initialize MCP tools: {e}"
+
+    await get_session_registry().register(session.session_id, session.tool_manager, session.chat_history)
+
+def describe_update(update: Dict[str, Any]) -> Optional[str]:
+    """
+    Turns a graph update into a short progress line for the UI.
+
+    Args:
+        update (Dict[str, Any]): A single update from graph.astream(stream_mode="updates").
+
+    Returns:
+        Optional[str]: The progress line, or None if the update is not worth showing.
+    """
+    for node, values in update.items():
+        if not values:
+            continue
+        if node in ("InvokeLLM", "LocalRoute") and values.get("tool_invocation_needed"):
+            return f"Calling `{values.get('tool_server')}.{values.get('tool_name')}` with {values.get('tool_arguments')}"
+        if node == "ToolCall":
+            return f"Tool returned {len(values.get('tool_result') or '')} characters"
+        if node == "Plan" and values.get("plan"):
+            return "Planned: " + ", ".join(f"`{s['tool_server']}.{s['tool']}`" for s in values["plan"])
+        if node == "Execute":
+            return f"Ran {len(values.get('step_results') or {})} tool steps"
+    return None
+
+async def process_message(session: StreamlitSession, user_input: str,
+                          events: Optional["queue.Queue[Tuple[str, str]]"] = None) -> str:
     """
     Process a user message through the LangGraph.
-    
+
     Args:
+        session (StreamlitSession): The session the message belongs to.
         user_input (str): The user's input message.
-        
+        events (Optional[queue.Queue]): Receives ("step", text) progress events while the graph runs.
+
     Returns:
         str: The assistant's response.
     """
-    # Ensure session is initialized
-    if "initialized" not in st.session_state or not st.session_state.initialized:
-        await initialize_session()
-        
-    # Check if required session state variables exist
-    required_vars = ["llm", "tool_manager", "chat_history", "graph"]
-    for var in required_vars:
-        if var not in st.session_state:
-            await initialize_session()
-            break
-    
+    runtime = get_runtime()
+
+    # A session closed while idle (or evicted) gets fresh resources; the user is told its context is gone
+    async def reopen():
+        session.chat_history = ConversationBuffer()
+        await open_session(session)
+    reopened = await get_session_registry().resume(session.session_id, asyncio.current_task(), reopen)
+
     # Create state for this message
-    my_state = MyState(user_input=user_input)
-    my_state.llm = st.session_state.llm
-    my_state.tool_manager = st.session_state.tool_manager
-    my_state.chat_history = st.session_state.chat_history.copy()
-    
+    my_state = MyState(user_input=user_input, chat_history=session.chat_history)
+    my_state.llm = runtime.llm
+    my_state.tool_manager = session.tool_manager
+    my_state.model_policy = runtime.model_policy
+    my_state.local_router = runtime.local_router
+    if events is not None:
+        my_state.tool_progress = lambda label, update: events.put(("step", f"`{label}`: {update.describe()}"))
+    if runtime.cassette is not None and runtime.cassette.recording:
+        runtime.cassette.record_turn(session.session_id, user_input)
+
     # Get the graph
-    graph = st.session_state.graph
-    
+    graph = runtime.graph
+
     # Initial state
     initial_state = GraphState()
-    
+
     # Configuration for the graph
     config = {
         "configurable": {
             "my_state": my_state
         },
-        "callbacks": [langfuse_handler]
+        "callbacks": [runtime.langfuse_handler]
     }
 
     final_answer = None
     try:
-        # Process the message through the graph
-        async for output in graph.astream(initial_state, stream_mode="messages", config=config):
-            if isinstance(output, dict) and "final_answer" in output:
-                final_answer = output["final_answer"]
+        # Process the message through the graph, forwarding progress as it happens
+        async for output in graph.astream(initial_state, stream_mode="updates", config=config):
+            step = describe_update(output) if isinstance(output, dict) else None
+            if step and events is not None:
+                events.put(("step", step))
+    except asyncio.CancelledError:
+        # Cancelling stops the graph, which aborts the pending LLM request and tool calls
+        logger.info(f"Message processing cancelled for session {session.session_id}")
+        raise
     except Exception as e:
         logger.error(f"Error in stream: {e}")
         final_answer = f"Error occurred: {str(e)}"
@@ -135,12 +147,11 @@ async def process_message(user_input: str):
     # If we didn't get a final answer from the graph, check my_state
     if not final_answer:
         final_answer = my_state.final_answer
-    
+
     # If we still don't have an answer, provide a fallback
     if not final_answer:
         final_answer = "I apologize, but I wasn't able to generate a response. Please try again."
-    
-    # Update the session chat history with the new interaction
-    st.session_state.chat_history = my_state.chat_history
-    
+
+    if reopened:
+        final_answer = f"_{SESSION_RESET_NOTICE}_\n\n{final_answer}"
     return final_answer
@@ -2,7 +2,6 @@
 Formatting utilities for pretty printing messages and responses.
 """
 import textwrap
-from colorama import Fore, Style
 from typing import List, Dict, Any
 import io
 import sys
@@ -57,6 +56,8 @@ def pretty_print_raw(messages):
     Returns:
         None
     """
+    from colorama import Fore, Style
+
     for message in messages:
         role = message["role"]
         content = message["content"]
@@ -89,6 +90,8 @@ def print_tool_response_raw(messages):
     Returns:
         None
     """
+    from colorama import Fore, Style
+
     print(Fore.RED)
     pretty_print_long_string(messages)
     print(Style.RESET_ALL + "-" * 80)  # Separator for clarity
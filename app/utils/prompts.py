@@ -1,41 +1,27 @@
 """
 Prompt generation utilities.
 """
-from typing import Dict, Any
-from tools.mcp_manager import MCPToolManager
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Dict, Any, Optional, Tuple, TYPE_CHECKING
+from weakref import WeakKeyDictionary
 
-def generate_system_prompt(tool_manager: MCPToolManager) -> str:
-    """
-    Generates a system prompt that includes available tools categorized by server, including input schemas.
-
-    Args:
-        tool_manager (MCPToolManager): The tool manager instance with available tools.
+if TYPE_CHECKING:
+    from tools.mcp_manager import MCPToolManager
 
-    Returns:
-        str: The formatted system prompt.
-    """
-    tool_section = []
+# Path of the system prompt template
+PROMPT_PATH = "./prompts/prompt_p.txt"
 
-    # Organize tools by server
-    for tool_name, tool_info in tool_manager.tools.items():
-        tool_section.append(tool_name)  # Append tool name as a string
+# Prompt templates of the plan-and-execute graph
+PLAN_PROMPT_PATH = "./prompts/prompt_plan.txt"
+SYNTHESIS_PROMPT_PATH = "./prompts/prompt_synthesis.txt"
 
-        # Convert tool_info (a dict) into a readable string
-        tool_section.append(f"  {tool_info}")  # Indented description for readability
-        
-    formatted_tool_section = "\n".join(tool_section)
-    
-    # Read the prompt template from file
-    try:
-        with open("./prompts/prompt_p.txt", "r") as f:
-            PROMPT = f.read()
-    except FileNotFoundError:
-        # Fallback prompt if file not found
-        PROMPT = """
+# Fallback prompt if the template file is not found
+FALLBACK_PROMPT = """
         You are an AI assistant with access to the following tools:
-        
+
         {formatted_tool_section}
-        
+
         When you need to use a tool, respond with a JSON object in the following format:
         {{
             "tool_call": true,
@@ -47,12 +33,83 @@ def generate_system_prompt(tool_manager: MCPToolManager) -> str:
             }},
             "response": "Your explanation of what you're doing"
         }}
-        
+
         If you don't need to use a tool, respond with:
         {{
             "tool_call": false,
             "response": "Your response to the user"
         }}
         """
-    
-    return PROMPT.format(formatted_tool_section=formatted_tool_section)
+
+# Rendered prompts per tool manager and template, as (catalog_version, prompt)
+_rendered_prompts: "WeakKeyDictionary[MCPToolManager, Dict[str, Tuple[int, str]]]" = WeakKeyDictionary()
+
+# Tool section of the recently rendered prompts, so prompt size can be split between template and tool catalog
+_tool_sections: "OrderedDict[str, str]" = OrderedDict()
+_TOOL_SECTIONS_KEPT = 32
+
+@lru_cache(maxsize=None)
+def load_prompt_template(path: str = PROMPT_PATH, fallback: str = FALLBACK_PROMPT) -> str:
+    """
+    Reads a prompt template once and caches it for the lifetime of the process.
+
+    Args:
+        path (str): Path of the template file.
+        fallback (str): Returned when the file is missing.
+
+    Returns:
+        str: The template, or the fallback prompt if the file is missing.
+    """
+    try:
+        with open(path, "r") as f:
+            return f.read()
+    except FileNotFoundError:
+        return fallback
+
+def generate_system_prompt(tool_manager: "MCPToolManager", path: str = PROMPT_PATH) -> str:
+    """
+    Generates a system prompt that includes available tools categorized by server, including input schemas.
+
+    The prompt is rendered once per tool catalog and reused until the manager's tools change.
+
+    Args:
+        tool_manager (MCPToolManager): The tool manager instance with available tools.
+        path (str): Path of the template, which has a {formatted_tool_section} placeholder.
+
+    Returns:
+        str: The formatted system prompt.
+    """
+    rendered = _rendered_prompts.setdefault(tool_manager, {})
+    cached = rendered.get(path)
+    if cached is not None and cached[0] == tool_manager.catalog_version:
+        return cached[1]
+
+    tool_section = []
+
+    # Organize tools by server
+    for tool_name, tool_info in tool_manager.tools.items():
+        tool_section.append(tool_name)  # Append tool name as a string
+
+        # Convert tool_info (a dict) into a readable string
+        tool_section.append(f"  {tool_info}")  # Indented description for readability
+
+    formatted_tool_section = "\n".join(tool_section)
+
+    prompt = load_prompt_template(path).format(formatted_tool_section=formatted_tool_section)
+    rendered[path] = (tool_manager.catalog_version, prompt)
+    _tool_sections[prompt] = formatted_tool_section
+    while len(_tool_sections) > _TOOL_SECTIONS_KEPT:
+        _tool_sections.popitem(last=False)
+    return prompt
+
+def tool_section_of(prompt: str) -> Optional[str]:
+    """
+    Returns the tool catalog part of a system prompt rendered by generate_system_prompt.
+
+    Args:
+        prompt (str): The rendered system prompt.
+
+    Returns:
+        Optional[str]: The tool section, or None if the prompt was not rendered recently.
+    """
+    return _tool_sections.get(prompt)
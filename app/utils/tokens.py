@@ -0,0 +1,46 @@
+"""
+Token counting.
+
+Uses tiktoken when it is installed, otherwise estimates four characters per
+token, which is close enough to see where the prompt tokens go.
+"""
+import os
+from functools import lru_cache
+from typing import Any, Optional
+
+# Logging setting
+import logging
+logger = logging.getLogger(__name__)
+
+# tiktoken encoding used for counting
+TOKEN_ENCODING = os.getenv("TOKEN_ENCODING", "cl100k_base")
+
+@lru_cache(maxsize=1)
+def _encoder() -> Optional[Any]:
+    try:
+        import tiktoken
+        return tiktoken.get_encoding(TOKEN_ENCODING)
+    except Exception as e:  # Not installed, or the encoding cannot be loaded offline
+        logger.info(f"tiktoken unavailable ({e}), estimating 4 characters per token")
+        return None
+
+def count_tokens(text: str) -> int:
+    """
+    Counts the tokens of a text.
+
+    Args:
+        text (str): The text.
+
+    Returns:
+        int: The number of tokens, exact with tiktoken, estimated otherwise.
+    """
+    if not text:
+        return 0
+    encoder = _encoder()
+    if encoder is None:
+        return (len(text) + 3) // 4
+    return len(encoder.encode(text, disallowed_special=()))
+
+def tokenizer_name() -> str:
+    """Names how tokens are counted, for reports."""
+    return f"tiktoken:{TOKEN_ENCODING}" if _encoder() is not None else "estimate:4-chars"
@@ -0,0 +1,128 @@
+"""
+Offline conversation replay benchmark.
+
+Re-runs the conversations of a cassette recorded with CASSETTE_MODE=record
+through the graph, with the LLM responses and tool results served from the
+cassette (see app/tools/cassette.py). Nothing is sent to the LLM provider and
+no MCP server is started, so a change can be measured against real
+conversations without network access or API spend. Each recorded session is
+replayed in order, sessions run concurrently up to --concurrency.
+
+Usage (from the repository root):
+    python benchmarks/replay.py cassette.jsonl              # recorded latencies
+    python benchmarks/replay.py cassette.jsonl --speed 0    # as fast as possible
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import statistics
+from collections import OrderedDict
+from typing import Any, Dict, List
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def percentile(values: List[float], q: float) -> float:
+    """Nearest-rank percentile of a non-empty list."""
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+async def replay_session(runtime: Any, turns: List[Dict[str, Any]], latencies: List[float]):
+    """
+    Replays the turns of one recorded session with a fresh tool manager and history.
+
+    Args:
+        runtime (Runtime): The replaying runtime.
+        turns (List[Dict[str, Any]]): The session's recorded user messages.
+        latencies (List[float]): Receives the seconds each turn took.
+    """
+    from graph.state import MyState, GraphState
+    from graph.history import ConversationBuffer
+
+    tool_manager = await runtime.create_session_tool_manager()
+    history = ConversationBuffer()
+    try:
+        for turn in turns:
+            my_state = MyState(user_input=turn["input"], chat_history=history)
+            my_state.llm = runtime.llm
+            my_state.tool_manager = tool_manager
+            my_state.model_policy = runtime.model_policy
+            my_state.local_router = runtime.local_router
+
+            start = time.perf_counter()
+            await runtime.graph.ainvoke(GraphState(), config={"configurable": {"my_state": my_state}})
+            latencies.append(time.perf_counter() - start)
+    finally:
+        await tool_manager.cleanup()
+        history.close()
+
+async def run(concurrency: int) -> Dict[str, Any]:
+    """
+    Replays every recorded session.
+
+    Args:
+        concurrency (int): Sessions replayed at the same time.
+
+    Returns:
+        Dict[str, Any]: Turn latencies and cassette statistics.
+    """
+    from runtime.warmup import warm_up
+
+    runtime = await warm_up()
+    cassette = runtime.cassette
+
+    sessions: "OrderedDict[str, List[Dict[str, Any]]]" = OrderedDict()
+    for turn in cassette.turns():
+        sessions.setdefault(turn["session"], []).append(turn)
+
+    latencies: List[float] = []
+    limit = asyncio.Semaphore(concurrency)
+
+    async def one(turns: List[Dict[str, Any]]):
+        async with limit:
+            await replay_session(runtime, turns, latencies)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(turns) for turns in sessions.values()))
+    wall = time.perf_counter() - start
+    await runtime.tool_manager.cleanup()
+
+    return {
+        "sessions": len(sessions),
+        "turns": len(latencies),
+        "wall_s": round(wall, 3),
+        "turn_p50_s": round(statistics.median(latencies), 3) if latencies else None,
+        "turn_p95_s": round(percentile(latencies, 0.95), 3) if latencies else None,
+        "turn_max_s": round(max(latencies), 3) if latencies else None,
+        "fallbacks": cassette.fallbacks,
+    }
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("cassette", help="cassette recorded with CASSETTE_MODE=record")
+    parser.add_argument("--speed", type=float, default=1.0, help="multiplier of the recorded latencies, 0 for none")
+    parser.add_argument("--concurrency", type=int, default=1, help="sessions replayed at the same time")
+    parser.add_argument("--json", action="store_true", help="print the results as JSON")
+    args = parser.parse_args()
+
+    # Read by the app modules at import time
+    os.environ["CASSETTE_MODE"] = "replay"
+    os.environ["CASSETTE_PATH"] = os.path.abspath(args.cassette)
+    os.environ["CASSETTE_SPEED"] = str(args.speed)
+    os.chdir(ROOT)
+    sys.path.insert(0, os.path.join(ROOT, "app"))
+
+    results = asyncio.run(run(args.concurrency))
+    if args.json:
+        print(json.dumps(results, indent=4))
+    else:
+        for key, value in results.items():
+            print(f"{key:12s} {value}")
+    if results["fallbacks"]:
+        print(f"{results['fallbacks']} calls did not match their recording exactly (prompts or tool arguments changed)")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,197 @@
+"""
+Startup-time regression benchmark.
+
+Every chat session spawns its MCP servers as subprocesses, so interpreter
+startup and module import time are paid per session. This script measures, in
+fresh interpreters, the import time of the app modules and of each MCP server
+script (everything up to mcp.run()), together with the wall time of the whole
+subprocess. Results are compared against a saved baseline and the script exits
+non-zero when a target gets slower than the allowed tolerance.
+
+Usage (from the repository root):
+    python benchmarks/startup.py                   # compare against the baseline
+    python benchmarks/startup.py --save-baseline   # record a new baseline
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import statistics
+import subprocess
+import tempfile
+from typing import Dict, List, Optional
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BASELINE_PATH = os.path.join(ROOT, "benchmarks", "startup_baseline.json")
+
+# App modules imported by the Chainlit and Streamlit entry points
+APP_MODULES = [
+    "runtime.warmup",
+    "ui.chainlit_handlers",
+    "ui.streamlit_handlers",
+]
+
+# Extra command-line arguments some server scripts require
+SERVER_ARGS = {
+    "obsidian.py": [tempfile.gettempdir()],
+}
+
+MODULE_PROBE = """
+import sys, time
+sys.path.insert(0, {app_dir!r})
+t = time.perf_counter()
+import {module}
+print(time.perf_counter() - t)
+"""
+
+SCRIPT_PROBE = """
+import sys, time, runpy
+sys.argv = [{path!r}, *{args!r}]
+sys.path.insert(0, {server_dir!r})
+t = time.perf_counter()
+runpy.run_path({path!r}, run_name="startup_benchmark")
+print(time.perf_counter() - t)
+"""
+
+def run_probe(code: str) -> Optional[Dict[str, float]]:
+    """
+    Runs a probe in a fresh interpreter.
+
+    Args:
+        code (str): The probe source.
+
+    Returns:
+        Optional[Dict[str, float]]: Import and process wall time, or None if the probe failed.
+    """
+    start = time.perf_counter()
+    proc = subprocess.run([sys.executable, "-c", code], cwd=ROOT, capture_output=True, text=True)
+    wall = time.perf_counter() - start
+    if proc.returncode != 0:
+        return None
+    return {"import_s": float(proc.stdout.strip().splitlines()[-1]), "process_s": wall}
+
+def measure(code: str, repeat: int) -> Optional[Dict[str, float]]:
+    """
+    Runs a probe several times and keeps the median of each metric.
+
+    Args:
+        code (str): The probe source.
+        repeat (int): Number of runs.
+
+    Returns:
+        Optional[Dict[str, float]]: Median timings, or None if the probe failed.
+    """
+    runs: List[Dict[str, float]] = []
+    for _ in range(repeat):
+        result = run_probe(code)
+        if result is None:
+            return None
+        runs.append(result)
+    return {key: statistics.median(run[key] for run in runs) for key in runs[0]}
+
+def is_server_script(path: str) -> bool:
+    """
+    Tells MCP server scripts from the helper modules they import.
+
+    Every server starts itself under a __main__ guard (FastMCP's mcp.run(), or
+    asyncio.run() for the low-level servers such as obsidian.py); helpers such
+    as walker.py or note_cache.py are only imported and have none.
+
+    Args:
+        path (str): A .py file.
+
+    Returns:
+        bool: True if the file is run as a server.
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        source = f.read()
+    return 'if __name__ == "__main__":' in source or "if __name__ == '__main__':" in source
+
+def collect(repeat: int) -> Dict[str, Dict[str, float]]:
+    """
+    Measures every app module and MCP server script (helper modules in mcpservers/ are skipped).
+
+    Args:
+        repeat (int): Number of runs per target.
+
+    Returns:
+        Dict[str, Dict[str, float]]: Timings per target.
+    """
+    app_dir = os.path.join(ROOT, "app")
+    server_dir = os.path.join(ROOT, "mcpservers")
+    results = {}
+
+    for module in APP_MODULES:
+        results[f"app:{module}"] = measure(MODULE_PROBE.format(app_dir=app_dir, module=module), repeat)
+
+    for name in sorted(os.listdir(server_dir)):
+        if not name.endswith(".py"):
+            continue
+        path = os.path.join(server_dir, name)
+        if not is_server_script(path):
+            continue
+        code = SCRIPT_PROBE.format(path=path, args=SERVER_ARGS.get(name, []), server_dir=server_dir)
+        results[f"server:{name}"] = measure(code, repeat)
+
+    return results
+
+def compare(results: Dict[str, Dict[str, float]], baseline: Dict[str, Dict[str, float]],
+            tolerance: float, slack: float) -> List[str]:
+    """
+    Lists the targets that got slower than the baseline allows.
+
+    Args:
+        results: Current timings.
+        baseline: Baseline timings.
+        tolerance (float): Allowed relative slowdown.
+        slack (float): Allowed absolute slowdown in seconds, absorbs noise on fast targets.
+
+    Returns:
+        List[str]: One line per regression.
+    """
+    regressions = []
+    for target, timings in results.items():
+        if timings is None or baseline.get(target) is None:
+            continue
+        for key, value in timings.items():
+            limit = baseline[target][key] * (1 + tolerance) + slack
+            if value > limit:
+                regressions.append(f"{target} {key}: {value:.3f}s > {limit:.3f}s (baseline {baseline[target][key]:.3f}s)")
+    return regressions
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=5, help="runs per target (median is kept)")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed relative slowdown")
+    parser.add_argument("--slack", type=float, default=0.05, help="allowed absolute slowdown in seconds")
+    parser.add_argument("--save-baseline", action="store_true", help="write the results as the new baseline")
+    args = parser.parse_args()
+
+    results = collect(args.repeat)
+    for target, timings in results.items():
+        if timings is None:
+            print(f"{target:40s} failed to import (missing dependency?)")
+        else:
+            print(f"{target:40s} import {timings['import_s']:.3f}s  process {timings['process_s']:.3f}s")
+
+    if args.save_baseline:
+        with open(BASELINE_PATH, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=4, sort_keys=True)
+        print(f"Baseline written to {BASELINE_PATH}")
+        return 0
+
+    if not os.path.exists(BASELINE_PATH):
+        print("No baseline found, run with --save-baseline first.")
+        return 0
+
+    with open(BASELINE_PATH, "r", encoding="utf-8") as f:
+        baseline = json.load(f)
+
+    regressions = compare(results, baseline, args.tolerance, args.slack)
+    for line in regressions:
+        print(f"REGRESSION {line}")
+    return 1 if regressions else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,72 @@
+"""
+Prompt token report.
+
+Aggregates a profile written with TOKEN_PROFILE=1 (see
+app/tools/token_profiler.py): where the prompt tokens go by component
+(system template, tool catalog, history, tool outputs, user input), which
+tools and servers produce the largest results and how often those results
+are resent, and how the counts compare with the usage the provider billed.
+
+Usage (from the repository root):
+    python benchmarks/token_report.py token_profile.jsonl
+    python benchmarks/token_report.py token_profile.jsonl --json > report.json
+    python benchmarks/token_report.py token_profile.jsonl --csv > tools.csv
+"""
+import os
+import sys
+import csv
+import json
+import argparse
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "app"))
+
+from tools.token_profiler import TokenProfiler
+
+TOOL_COLUMNS = ["results", "avg_result_tokens", "sent_tokens", "resend_factor", "share_of_prompt"]
+
+def print_report(report: dict):
+    """Prints the report as tables."""
+    print(f"{report['calls']} LLM calls, {report['prompt_tokens']} prompt tokens, "
+          f"{report['completion_tokens']} completion tokens ({report['tokenizer']}), "
+          f"average latency {report['avg_latency_s']}s")
+    if "provider_ratio" in report:
+        print(f"Provider billed {report['provider_usage']['prompt_tokens']} prompt tokens "
+              f"({report['provider_ratio']}x the count)")
+
+    print(f"\n{'component':20s} {'tokens':>10s} {'per call':>10s} {'share':>7s}")
+    for name, stats in sorted(report["components"].items(), key=lambda item: -item[1]["tokens"]):
+        print(f"{name:20s} {stats['tokens']:>10d} {stats['avg_per_call']:>10d} {stats['share']:>7.1%}")
+
+    if report["tools"]:
+        print(f"\n{'tool':40s} {'results':>8s} {'avg tok':>8s} {'sent tok':>10s} {'resent':>7s} {'share':>7s}")
+        for tool, stats in report["tools"].items():
+            print(f"{tool:40s} {stats['results']:>8d} {stats['avg_result_tokens']:>8d} {stats['sent_tokens']:>10d} "
+                  f"{stats['resend_factor']:>6.1f}x {stats['share_of_prompt']:>7.1%}")
+
+        print(f"\n{'server':40s} {'results':>8s} {'avg tok':>8s} {'sent tok':>10s}")
+        for server, stats in sorted(report["servers"].items(), key=lambda item: -item[1]["sent_tokens"]):
+            print(f"{server:40s} {stats['results']:>8d} {stats['avg_result_tokens']:>8d} {stats['sent_tokens']:>10d}")
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("profile", help="file written with TOKEN_PROFILE=1")
+    output = parser.add_mutually_exclusive_group()
+    output.add_argument("--json", action="store_true", help="print the whole report as JSON")
+    output.add_argument("--csv", action="store_true", help="print the per-tool table as CSV")
+    args = parser.parse_args()
+
+    report = TokenProfiler(path=None).load(args.profile).report()
+    if args.json:
+        print(json.dumps(report, indent=4))
+    elif args.csv:
+        writer = csv.writer(sys.stdout)
+        writer.writerow(["tool", *TOOL_COLUMNS])
+        for tool, stats in report["tools"].items():
+            writer.writerow([tool, *(stats[c] for c in TOOL_COLUMNS)])
+    else:
+        print_report(report)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,20 +1,17 @@
 
 
-import os
-import random
-import asyncio
-import httpx
 import logging
-import json
 from typing import List
-from bs4 import BeautifulSoup
-from time import sleep
 
 from mcp.server.fastmcp import FastMCP
+import cancellation
 
 # Initialize FastMCP server
 mcp = FastMCP("ai_thinking")
 
+# Let the chat app cancel tool calls it no longer needs
+cancellation.install()
+
 # Alternative: Brave Search API (Recommended)
 SEARCH_ENGINE_URL = "https://www.google.com.tw/search?q="
 
@@ -2,12 +2,15 @@ import os
 import random
 import httpx
 from mcp.server.fastmcp import FastMCP
-from typing import Any
+import cancellation
 
 
 # Initialize FastMCP server
 mcp = FastMCP("google_search")
 
+# Let the chat app cancel tool calls it no longer needs
+cancellation.install()
+
 # Google Search Alternative (Brave Search API - avoids Google bot detection)
 SEARCH_ENGINE_URL = "https://search.brave.com/search?q="
 
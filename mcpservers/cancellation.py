@@ -0,0 +1,31 @@
+"""
+Makes MCP request cancellation safe for the servers in this folder.
+
+The chat app sends "notifications/cancelled" for tool calls whose answer is
+no longer wanted (stop button, closed tab, newer message). In the mcp
+release pinned in requirements.txt the server cancels the running tool but
+RequestResponder.__exit__ drops the cancel scope's result, so the
+cancellation escapes the request and takes the whole server down.
+install() makes the scope absorb its own cancellation, as intended.
+
+Servers calling install() can be marked "cancellable": true in config.json.
+"""
+from mcp.shared.session import RequestResponder
+
+def _exit(self, exc_type, exc_val, exc_tb):
+    """RequestResponder.__exit__ that returns whether the cancel scope absorbed the exception."""
+    try:
+        if self._completed:
+            self._on_complete(self)
+    finally:
+        self._entered = False
+    return self._cancel_scope.__exit__(exc_type, exc_val, exc_tb)
+
+def install():
+    """Patches RequestResponder once, if it has the structure the fix is written for."""
+    if getattr(RequestResponder.__exit__, "cancellation_fix", False):
+        return
+    if not hasattr(RequestResponder, "cancel"):
+        return  # This mcp release does not cancel requests on the server
+    _exit.cancellation_fix = True
+    RequestResponder.__exit__ = _exit
@@ -0,0 +1,204 @@
+"""
+Parallel grep-style search of file contents.
+
+Files stream in from a directory scan and are searched on a thread pool,
+so the reads of many files, the slow part on a cold cache, overlap. Large
+files are memory-mapped instead of read, binary files and files over the
+size limit are skipped, and the search stops at the hit limit or the time
+limit, whichever comes first.
+"""
+import os
+import re
+import mmap
+import stat
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor, Future, wait, FIRST_COMPLETED
+from dataclasses import dataclass
+from typing import Callable, Dict, Iterable, List, Optional, Set
+
+# Worker threads of a search
+CONTENT_SEARCH_WORKERS = int(os.getenv("CONTENT_SEARCH_WORKERS", str(min(32, (os.cpu_count() or 1) * 4))))
+
+# Files at least this large are memory-mapped instead of read
+MMAP_THRESHOLD = 1024 * 1024
+
+# Bytes looked at to tell binary files apart
+BINARY_SNIFF = 8192
+
+# Longest line returned, in characters
+MAX_LINE = 300
+
+@dataclass
+class Hit:
+    """
+    A matching line and its context.
+    """
+    path: str
+    line: int
+    context: str  # "N: text" lines, the matching one marked "N> text"
+
+    def as_dict(self) -> Dict[str, object]:
+        return {"path": self.path, "line": self.line, "context": self.context}
+
+@dataclass
+class SearchStats:
+    """
+    What a search looked at.
+    """
+    files_scanned: int = 0
+    files_skipped: int = 0  # Binary, too large, unreadable
+    bytes_scanned: int = 0
+    stopped: Optional[str] = None  # "hit limit", "time limit" or "cancelled"
+    elapsed: float = 0.0
+
+class ContentSearch:
+    """
+    One content search over a stream of files.
+    """
+    def __init__(self, pattern: str, regex: bool = False, case_sensitive: bool = False,
+                 max_hits: int = 50, context_lines: int = 1, max_file_size: int = 20 * 1024 * 1024,
+                 timeout: float = 20.0, workers: int = CONTENT_SEARCH_WORKERS):
+        """
+        Args:
+            pattern (str): Text, or a regular expression if regex is set.
+            regex (bool): Treat pattern as a regular expression.
+            case_sensitive (bool): Match case.
+            max_hits (int): Stop after this many matching lines.
+            context_lines (int): Lines of context before and after each match.
+            max_file_size (int): Skip larger files, in bytes.
+            timeout (float): Stop after this many seconds.
+            workers (int): Threads searching files.
+        """
+        source = pattern.encode("utf-8") if regex else re.escape(pattern.encode("utf-8"))
+        self.pattern = re.compile(source, 0 if case_sensitive else re.IGNORECASE)
+        self.max_hits = max_hits
+        self.context_lines = context_lines
+        self.max_file_size = max_file_size
+        self.timeout = timeout
+        self.workers = max(1, workers)
+        self.stats = SearchStats()
+        self.hits: List[Hit] = []
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+
+    def cancel(self):
+        """Stops the search; running files finish, no new ones start."""
+        if self.stats.stopped is None:
+            self.stats.stopped = "cancelled"
+        self._stop.set()
+
+    def run(self, files: Iterable[str], on_hit: Optional[Callable[[Hit], None]] = None) -> List[Hit]:
+        """
+        Searches the files.
+
+        Args:
+            files (Iterable[str]): Paths to search, consumed lazily.
+            on_hit (Optional[Callable[[Hit], None]]): Called from the worker threads with every hit.
+
+        Returns:
+            List[Hit]: The hits, at most max_hits.
+        """
+        start = time.monotonic()
+        deadline = start + self.timeout
+        pending: Set[Future] = set()
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="content-search") as pool:
+            for path in files:
+                if self._stop.is_set():
+                    break
+                if time.monotonic() > deadline:
+                    self._stop_for("time limit")
+                    break
+                # Bounded in-flight work, the scan does not run ahead of the search
+                if len(pending) >= self.workers * 4:
+                    _, pending = wait(pending, return_when=FIRST_COMPLETED)
+                pending.add(pool.submit(self._search_file, path, deadline, on_hit))
+        self.stats.elapsed = time.monotonic() - start
+        return self.hits
+
+    def _stop_for(self, reason: str):
+        if self.stats.stopped is None:
+            self.stats.stopped = reason
+        self._stop.set()
+
+    def _search_file(self, path: str, deadline: float, on_hit: Optional[Callable[[Hit], None]]):
+        if self._stop.is_set():
+            return
+        if time.monotonic() > deadline:
+            self._stop_for("time limit")
+            return
+        try:
+            st = os.stat(path)
+            # Only regular files: opening a FIFO or device would block or never end
+            if not stat.S_ISREG(st.st_mode) or st.st_size > self.max_file_size:
+                self._count(skipped=True)
+                return
+            if st.st_size == 0:
+                self._count()
+                return
+            with open(path, "rb") as f:
+                if st.st_size >= MMAP_THRESHOLD:
+                    with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+                        self._search_buffer(path, buffer, st.st_size, on_hit)
+                else:
+                    self._search_buffer(path, f.read(), st.st_size, on_hit)
+        except (OSError, ValueError):
+            self._count(skipped=True)
+
+    def _search_buffer(self, path: str, buffer, size: int, on_hit: Optional[Callable[[Hit], None]]):
+        if b"\0" in buffer[:BINARY_SNIFF]:
+            self._count(skipped=True)
+            return
+        self._count(nbytes=size)
+        line = 1
+        counted = 0
+        last_line_start = -1
+        for match in self.pattern.finditer(buffer):
+            if self._stop.is_set():
+                return
+            start = buffer.rfind(b"\n", 0, match.start()) + 1
+            if start == last_line_start:
+                continue  # One hit per line
+            line += buffer[counted:start].count(b"\n")
+            counted = last_line_start = start
+            hit = Hit(path, line, self._context(buffer, start, line))
+            with self._lock:
+                if len(self.hits) >= self.max_hits:
+                    self._stop_for("hit limit")
+                    return
+                self.hits.append(hit)
+                full = len(self.hits) >= self.max_hits
+            if on_hit is not None:
+                on_hit(hit)
+            if full:
+                self._stop_for("hit limit")
+                return
+
+    def _context(self, buffer, start: int, line: int) -> str:
+        """The matching line starting at start, with context_lines lines around it."""
+        begin = start
+        for _ in range(self.context_lines):
+            if begin == 0:
+                break
+            begin = buffer.rfind(b"\n", 0, begin - 1) + 1
+        end = start
+        for _ in range(self.context_lines + 1):
+            newline = buffer.find(b"\n", end)
+            if newline == -1:
+                end = len(buffer)
+                break
+            end = newline + 1
+        lines = buffer[begin:end].rstrip(b"\n").split(b"\n")
+        first = line - buffer[begin:start].count(b"\n")
+        return "\n".join(
+            f"{n}{'>' if n == line else ':'} {text[:MAX_LINE * 4].decode('utf-8', 'replace').rstrip()[:MAX_LINE]}"
+            for n, text in enumerate(lines, first)
+        )
+
+    def _count(self, skipped: bool = False, nbytes: int = 0):
+        with self._lock:
+            if skipped:
+                self.stats.files_skipped += 1
+            else:
+                self.stats.files_scanned += 1
+                self.stats.bytes_scanned += nbytes
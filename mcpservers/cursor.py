@@ -0,0 +1,22 @@
+"""
+Page cursors of the paged tools.
+
+A cursor is the state needed to continue a listing, as URL-safe base64 of
+compact JSON. Tools put the query in the state too and reject a cursor
+given with a different query.
+"""
+import json
+import base64
+
+def encode_cursor(state: dict) -> str:
+    """The cursor of a listing state."""
+    return base64.urlsafe_b64encode(json.dumps(state, separators=(",", ":")).encode()).decode()
+
+def decode_cursor(cursor: str) -> dict:
+    """
+    The listing state of a cursor.
+
+    Raises:
+        ValueError: The cursor is not one made by encode_cursor.
+    """
+    return json.loads(base64.urlsafe_b64decode(cursor.encode()))
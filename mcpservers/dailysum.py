@@ -1,13 +1,16 @@
 import os
-import random
-import httpx
-import markdown
+import re
+import asyncio
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from datetime import datetime
-from typing import Any
-from mcp.server.fastmcp import FastMCP
-from collections import defaultdict
-from markdown2 import markdown as md_to_html
-from bs4 import BeautifulSoup
+from typing import AsyncIterator, List, Optional, Tuple
+from mcp.server.fastmcp import FastMCP, Context
+from progress import ProgressReporter
+from cursor import encode_cursor, decode_cursor
+from recent_index import RecentIndex, parse_time, scan_newest, modified_at
+from note_cache import SummaryCache
 
 # Initialize FastMCP server
 mcp = FastMCP("dailysummary")
@@ -15,6 +18,35 @@ mcp = FastMCP("dailysummary")
 from pathlib import Path
 OBSIDIAN_VAULT_PATH = Path(os.getenv("OBSIDIAN_VAULT_PATH", "/Users/sparkt/Documents/ObsidianVault2024/daily/"))
 
+# Version of extract_summary_from_markdown, cached summaries of other versions are recomputed
+SUMMARY_VERSION = 2
+
+# Summaries of unchanged notes are reused across calls and restarts
+cache = SummaryCache(version=SUMMARY_VERSION)
+
+# Notes are listed newest first from a recency index of the vault, started with the server.
+# Ordered by modification time: the inode change time moves on every chmod, restore or sync
+DAILYSUM_INDEX_SIZE = int(os.getenv("DAILYSUM_INDEX_SIZE", "100000"))
+index = RecentIndex(str(OBSIDIAN_VAULT_PATH), size=DAILYSUM_INDEX_SIZE, key=modified_at)
+
+# Seconds a call waits for the first scan of the vault
+INDEX_WAIT = float(os.getenv("DAILYSUM_INDEX_WAIT", "600"))
+
+DEFAULT_LIMIT = 20
+MAX_LIMIT = 200
+CATEGORIES = ("daily", "research", "other")
+
+# Date pattern for daily notes (e.g., 2024-02-22.md)
+DATE_PATTERN = re.compile(r"\d{4}-\d{2}-\d{2}")
+
+# Processes summarizing notes, notes per batch, and bytes read per note (summaries use the first paragraphs).
+# At most two batches per worker are in flight, which bounds the memory of a cold run
+DAILYSUM_WORKERS = int(os.getenv("DAILYSUM_WORKERS", str(os.cpu_count() or 1)))
+DAILYSUM_BATCH = int(os.getenv("DAILYSUM_BATCH", "64"))
+NOTE_READ_BYTES = 64 * 1024
+
+_pool: Optional[ProcessPoolExecutor] = None
+
 
 def debug_log(message: str, filename="debug.log") -> None:
     """Appends debug messages to a log file."""
@@ -22,67 +54,266 @@ def debug_log(message: str, filename="debug.log") -> None:
     with open(log_path, "a", encoding="utf-8") as log_file:
         log_file.write(f"{datetime.now()} - {message}\n")
 
-import os
-import re
-from collections import defaultdict
+
+def note_category(path: str) -> str:
+    """The category of a note: "daily", "research" or "other"."""
+    folder, file = os.path.split(os.path.relpath(path, index.root))
+    if "daily" in file.lower() or DATE_PATTERN.match(file):
+        return "daily"
+    if "research" in folder.lower() or "research" in file.lower():
+        return "research"
+    return "other"
 
 
 @mcp.tool()
-def summarize_obsidian_notes() -> dict:
+async def summarize_obsidian_notes(ctx: Context, since: Optional[str] = None, until: Optional[str] = None,
+                                   category: Optional[str] = None, limit: int = DEFAULT_LIMIT,
+                                   cursor: Optional[str] = None) -> dict:
     """
-    Summarize key insights from daily and research notes in the Obsidian vault.
-    
-    This function scans all markdown files (*.md), extracts summaries, and categorizes them into:
-    - "daily_notes": Summarized entries from daily logs (e.g., YYYY-MM-DD.md, 'daily' in filename).
-    - "research_notes": Summarized entries from research-related notes.
-    - "recent_notes": Notes modified within the last 7 days.
+    Summarize notes of the Obsidian vault, most recently modified first.
+
+    Only the notes returned are read, so ask for the window the question is about,
+    e.g. since the start of the week for "what did I do this week".
+
+    Args:
+        since: Only notes modified at or after this ISO date or date and time, e.g. "2024-02-19".
+        until: Only notes modified at or before this ISO date or date and time; a date includes the whole day.
+        category: Only "daily" notes (YYYY-MM-DD.md, 'daily' in the name), "research" notes or "other" notes.
+        limit: Number of notes to return (at most 200).
+        cursor: The next_cursor of a previous call, to get the following notes.
 
     Returns:
-        dict: A dictionary containing categorized summaries of notes.
+        dict: "notes", each with its file, category, modification time and summary, newest first,
+        and "next_cursor" if there are more.
     """
-    summaries = {
-        "daily_notes": {},
-        "research_notes": {},
-        "recent_notes": {}
-    }
-
     if not os.path.exists(OBSIDIAN_VAULT_PATH):
         return {"error": f"Obsidian vault path '{OBSIDIAN_VAULT_PATH}' not found."}
+    if category is not None and category not in CATEGORIES:
+        return {"error": f"Unknown category '{category}', use one of {', '.join(CATEGORIES)}."}
+    try:
+        start, end = parse_time(since), parse_time(until, end_of_day=True)
+    except ValueError as e:
+        return {"error": str(e)}
+    limit = max(1, min(int(limit), MAX_LIMIT))
+
+    after = None
+    if cursor:
+        try:
+            state = decode_cursor(cursor)
+            after = tuple(state["after"])
+        except (ValueError, KeyError, TypeError):
+            return {"error": "Invalid cursor."}
+        if [state.get("since"), state.get("until"), state.get("category")] != [since, until, category]:
+            return {"error": "The cursor belongs to a different query."}
+
+    # The first call after startup waits for the one full scan of the vault
+    if not await asyncio.to_thread(index.wait_ready, INDEX_WAIT):
+        return {"error": f"'{OBSIDIAN_VAULT_PATH}' is still being scanned, try again later."}
+
+    def accept(path: str) -> bool:
+        return path.endswith(".md") and (category is None or note_category(path) == category)
+
+    # One note more than asked tells whether there is a next page
+    keys = index.newest(limit + 1, accept, start, end, before=after)
+    cutoff = index.cutoff
+    if cutoff is not None and (start is None or start <= cutoff) \
+            and (len(keys) <= limit or keys[-1][0] <= cutoff):
+        # The vault has more files than the index holds and the page reaches past it
+        keys = await asyncio.to_thread(scan_newest, index.root, limit + 1, accept, start, end, after, modified_at)
+    page = keys[:limit]
+
+    # The file work runs in threads so progress notifications go out while the notes are read
+    await asyncio.to_thread(cache.load)
+    notes = await asyncio.to_thread(stat_notes, [path for _, path in page])
+    progress = ProgressReporter(ctx, total=len(notes))
+    result = {"notes": []}
+
+    # Only new and changed notes are read, in batches spread over the worker processes
+    stats = {path: st for path, st in notes}
+    modified = {path: ts for ts, path in page}
+    missing = [path for path, st in notes if cache.get(path, st.st_mtime_ns, st.st_size) is None]
+    done = len(notes) - len(missing)
+    async for batch in summarize_notes(missing):
+        for path, summary, error in batch:
+            if error is not None:
+                result["error"] = f"Error processing {os.path.basename(path)}: {error}"
+                continue
+            st = stats[path]
+            cache.put(path, st.st_mtime_ns, st.st_size, summary)
+        done += len(batch)
+        await progress(done, f"Summarized {os.path.basename(batch[-1][0])}")
 
-    # Date pattern for daily notes (e.g., 2024-02-22.md)
-    date_pattern = re.compile(r"\d{4}-\d{2}-\d{2}")
+    for path, st in notes:
+        summary = cache.get(path, st.st_mtime_ns, st.st_size)
+        if summary is None:
+            continue  # Could not be read
+        result["notes"].append({
+            "file": os.path.relpath(path, index.root),
+            "category": note_category(path),
+            "modified": datetime.fromtimestamp(modified[path]).strftime("%Y-%m-%d %H:%M"),
+            "summary": summary,
+        })
+    await progress(len(notes), f"Summarized {len(notes)} notes")
 
-    for root, _, files in os.walk(OBSIDIAN_VAULT_PATH):
-        for file in files:
-            if file.endswith(".md"):
-                file_path = os.path.join(root, file)
+    if not page:
+        result["message"] = "No notes found."
+    if len(keys) > limit:
+        result["next_cursor"] = encode_cursor({"since": since, "until": until, "category": category,
+                                               "after": list(page[-1])})
+    if missing:
+        # Notes were added or changed, drop the summaries of deleted ones if the index holds the whole vault
+        if index.cutoff is None:
+            cache.retain((path for path in index.paths() if path.endswith(".md")), index.root)
+        await asyncio.to_thread(cache.save)
+    return result
+
+
+def stat_notes(paths: List[str]) -> list:
+    """Lists the path and stat of the notes that still exist."""
+    notes = []
+    for path in paths:
+        try:
+            notes.append((path, os.stat(path)))
+        except OSError:
+            continue  # Removed since it was indexed
+    return notes
+
+
+def summarize_file(file_path: str) -> str:
+    """Reads the start of a markdown file and extracts its summary."""
+    with open(file_path, "r", encoding="utf-8") as md_file:
+        return extract_summary_from_markdown(md_file.read(NOTE_READ_BYTES))
+
+
+def summarize_batch(paths: List[str]) -> List[Tuple[str, Optional[str], Optional[str]]]:
+    """Summarizes a batch of notes, in a worker process. Returns (path, summary, error) of each note."""
+    results = []
+    for path in paths:
+        try:
+            results.append((path, summarize_file(path), None))
+        except Exception as e:
+            results.append((path, None, str(e)))
+    return results
+
+
+def get_pool() -> Optional[ProcessPoolExecutor]:
+    """The worker processes, started on first use. None when there is a single worker."""
+    global _pool
+    if _pool is None and DAILYSUM_WORKERS > 1:
+        # Spawned, not forked: the server process runs threads
+        _pool = ProcessPoolExecutor(max_workers=DAILYSUM_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+    return _pool
+
+
+def drop_pool(pool: ProcessPoolExecutor):
+    """Shuts down a broken pool, so its management thread and remaining workers exit, and stops using it."""
+    global _pool
+    pool.shutdown(wait=False, cancel_futures=True)
+    if _pool is pool:
+        _pool = None
+
+
+async def summarize_notes(paths: List[str]) -> AsyncIterator[List[Tuple[str, Optional[str], Optional[str]]]]:
+    """
+    Summarizes notes in batches, on the worker processes when there is more than one batch.
+
+    Args:
+        paths (List[str]): The notes.
+
+    Yields:
+        List[Tuple[str, Optional[str], Optional[str]]]: (path, summary, error) of each note of a finished batch.
+    """
+    loop = asyncio.get_running_loop()
+    batches = iter([paths[i:i + DAILYSUM_BATCH] for i in range(0, len(paths), DAILYSUM_BATCH)])
+    pool = get_pool() if len(paths) > DAILYSUM_BATCH else None
+    in_flight = max(1, DAILYSUM_WORKERS) * 2
+    pending = {}
+    try:
+        while True:
+            while len(pending) < in_flight:
+                batch = next(batches, None)
+                if batch is None:
+                    break
+                try:
+                    future = loop.run_in_executor(pool, summarize_batch, batch)
+                except BrokenProcessPool:
+                    # The pool broke between calls
+                    drop_pool(pool)
+                    pool = None
+                    future = loop.run_in_executor(None, summarize_batch, batch)
+                pending[future] = batch
+            if not pending:
+                return
+            finished, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for future in finished:
+                batch = pending.pop(future)
                 try:
-                    with open(file_path, "r", encoding="utf-8") as md_file:
-                        content = md_file.read()
-                        summary = extract_summary_from_markdown(content)
+                    yield future.result()
+                except BrokenProcessPool:
+                    # A worker died (e.g. out of memory); this batch and the rest run in threads
+                    if pool is not None:
+                        drop_pool(pool)
+                        pool = None
+                    yield await asyncio.to_thread(summarize_batch, batch)
+    finally:
+        for future in pending:
+            future.cancel()
+
+
+# Lines that start a block without paragraph text: headings, list items, HTML, tables, rules
+BLOCK_START = re.compile(r"^ {0,3}(#{1,6}(\s|$)|[-*+]\s|\d+[.)]\s|<|\||([-*_]\s*){3,}$)")
+SETEXT_UNDERLINE = re.compile(r"^ {0,3}(=+|-+)\s*$")
+FENCE = re.compile(r"^ {0,3}(```|~~~)")
+
+# Inline Markdown reduced to its text
+INLINE = [
+    (re.compile(r"!\[[^\]]*\]\([^)]*\)"), ""),                             # Images
+    (re.compile(r"\[\[([^\]|]+)(?:\|([^\]]+))?\]\]"), lambda m: m.group(2) or m.group(1)),  # Wiki links
+    (re.compile(r"\[([^\]]+)\]\([^)]*\)"), r"\1"),                          # Links
+    (re.compile(r"(\*\*|~~|\*)(?=\S)(.+?)(?<=\S)\1"), r"\2"),                 # Emphasis
+    (re.compile(r"(?<!\w)(__|_)(?=\S)(.+?)(?<=\S)\1(?!\w)"), r"\2"),         # Emphasis, not inside words
+    (re.compile(r"`([^`]*)`"), r"\1"),                                      # Code spans
+    (re.compile(r"<[^>\n]+>"), ""),                                          # Inline HTML
+]
 
-                        # Classify as daily note, research note, or recent note
-                        if "daily" in file.lower() or date_pattern.match(file):
-                            summaries["daily_notes"][file] = summary
-                        elif "research" in root.lower() or "research" in file.lower():
-                            summaries["research_notes"][file] = summary
-                        if os.path.getmtime(file_path) > (time.time() - 7 * 86400):
-                            summaries["recent_notes"][file] = summary
-                except Exception as e:
-                    summaries["error"] = f"Error processing {file}: {str(e)}"
 
-    return summaries
+def extract_summary_from_markdown(content: str, max_paragraphs: int = 3, max_chars: int = 300) -> str:
+    """Extract a summary from markdown text: the text of its first paragraphs, without markup."""
+    paragraphs = []
+    current = []
+    in_fence = False
+    lines = content.splitlines()
 
+    # YAML front matter
+    start = 0
+    if lines and lines[0].strip() == "---":
+        start = next((i + 1 for i in range(1, len(lines)) if lines[i].strip() in ("---", "...")), 0)
 
-def extract_summary_from_markdown(content: str) -> str:
-    """Extract a summary from markdown text."""
-    # Convert Markdown to HTML for better parsing
-    html_content = md_to_html(content)
-    soup = BeautifulSoup(html_content, "html.parser")
+    for line in lines[start:]:
+        if FENCE.match(line):
+            in_fence = not in_fence
+        elif in_fence:
+            continue
+        elif current and SETEXT_UNDERLINE.match(line):
+            current = []  # The lines above were a heading
+            continue
+        elif line.strip() and not BLOCK_START.match(line) and not (not current and line.startswith(("    ", "\t"))):
+            # Paragraph text, also inside block quotes; indented lines only continue a paragraph
+            current.append(line.strip().lstrip(">").strip())
+            continue
+        # Anything else ends the paragraph
+        if any(current):
+            paragraphs.append(" ".join(part for part in current if part))
+            if len(paragraphs) >= max_paragraphs:
+                break
+        current = []
+    if any(current) and len(paragraphs) < max_paragraphs:
+        paragraphs.append(" ".join(part for part in current if part))
 
-    # Extract first 3 paragraphs or first 300 characters (whichever is shorter)
-    paragraphs = [p.get_text().strip() for p in soup.find_all("p") if p.get_text().strip()]
-    summary = " ".join(paragraphs[:3])[:300]
+    text = " ".join(paragraphs[:max_paragraphs])
+    for pattern, replacement in INLINE:
+        text = pattern.sub(replacement, text)
+    summary = " ".join(text.split())[:max_chars]
 
     return summary if summary else "No significant content found."
 
@@ -90,4 +321,10 @@ def extract_summary_from_markdown(content: str) -> str:
 
 if __name__ == "__main__":
     # Initialize and run the server
-    mcp.run(transport="stdio")
+    index.start()
+    try:
+        mcp.run(transport="stdio")
+    finally:
+        index.stop()
+        if _pool is not None:
+            _pool.shutdown(cancel_futures=True)
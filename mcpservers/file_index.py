@@ -0,0 +1,369 @@
+"""
+Persistent file name index for the filesystem servers.
+
+Walking the whole search tree on every query takes tens of seconds on a
+large disk. FileIndex walks it once and keeps the file names in a segment
+file that is memory-mapped, so a restarted server answers from the last
+index right away, and a substring query is a few C-level find() calls over
+one buffer instead of a walk.
+
+Segment layout (little-endian, offsets relative to their section):
+
+    header   magic, entry count, names size, paths size
+    names    "\\n" + lowercased file names, each followed by "\\n", padded to 8 bytes
+    starts   entry count + 1 offsets of the names in the names section
+    paths    offsets (entry count + 1) of the full paths, then the paths
+
+The segment is immutable. Changes reported by watchfiles (when it is
+installed and the tree can be watched) go into a small in-memory delta of
+added and removed paths, and a background rescan, every
+FILE_INDEX_RESCAN seconds or once the delta grows past FILE_INDEX_DELTA_MAX,
+writes a fresh segment and swaps it in.
+"""
+import os
+import re
+import mmap
+import time
+import struct
+import hashlib
+import logging
+import threading
+from array import array
+from bisect import bisect_right
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from walker import walk, DEFAULT_EXCLUDER
+
+logger = logging.getLogger(__name__)
+
+# Directory of the index segments
+FILE_INDEX_DIR = os.path.expanduser(os.getenv("FILE_INDEX_DIR", "~/.cache/mcp-filesearch"))
+
+# Seconds between full rescans, which catch changes the watcher missed (0 disables)
+FILE_INDEX_RESCAN = float(os.getenv("FILE_INDEX_RESCAN", "3600"))
+
+# Pending changes that trigger an early rescan
+FILE_INDEX_DELTA_MAX = int(os.getenv("FILE_INDEX_DELTA_MAX", "50000"))
+
+_MAGIC = b"MCPFIDX1"
+_HEADER = struct.Struct("<8sQQQ")
+
+def _encode(text: str) -> bytes:
+    return text.encode("utf-8", "surrogateescape")
+
+def _key(name: str) -> bytes:
+    """The form a name is matched in: lowercased, on a single line."""
+    return _encode(name.lower().replace("\n", " "))
+
+def _pad(n: int) -> int:
+    return -n % 8
+
+class Segment:
+    """
+    A read-only, memory-mapped index of (name, path) entries.
+    """
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.count, names_size, paths_size = _HEADER.unpack_from(self._mm, 0)
+        if magic != _MAGIC:
+            raise ValueError(f"{path} is not a file index")
+        self.names_start = _HEADER.size
+        self.names_end = self.names_start + names_size
+        starts = self.names_end + _pad(names_size)
+        view = memoryview(self._mm)
+        self.starts = view[starts:starts + 8 * (self.count + 1)].cast("Q")
+        offsets = starts + 8 * (self.count + 1)
+        self.offsets = view[offsets:offsets + 8 * (self.count + 1)].cast("Q")
+        self.paths_start = offsets + 8 * (self.count + 1)
+
+    @staticmethod
+    def write(path: str, entries: Iterable[Tuple[str, str]]) -> int:
+        """
+        Writes a segment atomically.
+
+        Args:
+            path (str): The segment file.
+            entries (Iterable[Tuple[str, str]]): (file name, full path) of every file.
+
+        Returns:
+            int: The number of entries written.
+        """
+        names = bytearray(b"\n")
+        starts = array("Q")
+        paths = bytearray()
+        offsets = array("Q")
+        for name, full in entries:
+            starts.append(len(names))
+            names += _key(name) + b"\n"
+            offsets.append(len(paths))
+            paths += _encode(full)
+        starts.append(len(names))
+        offsets.append(len(paths))
+
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(_HEADER.pack(_MAGIC, len(offsets) - 1, len(names), len(paths)))
+            f.write(names)
+            f.write(b"\0" * _pad(len(names)))
+            f.write(starts.tobytes())
+            f.write(offsets.tobytes())
+            f.write(paths)
+        os.replace(tmp, path)
+        return len(offsets) - 1
+
+    def path_of(self, i: int) -> str:
+        """The full path of entry i."""
+        start = self.paths_start + self.offsets[i]
+        return self._mm[start:self.paths_start + self.offsets[i + 1]].decode("utf-8", "surrogateescape")
+
+    def name_of(self, i: int) -> str:
+        """The lowercased name of entry i."""
+        start = self.names_start + self.starts[i]
+        return self._mm[start:self.names_start + self.starts[i + 1] - 1].decode("utf-8", "surrogateescape")
+
+    def find(self, needle: bytes) -> Iterator[int]:
+        """
+        Yields the entries whose lowercased name contains needle, in index order.
+
+        Args:
+            needle (bytes): The lowercased, encoded query.
+        """
+        # Between the leading and the trailing "\n": a match, even an empty one, always falls in a name
+        end = self.names_end - 1
+        pos = self._mm.find(needle, self.names_start + 1, end)
+        while pos != -1:
+            i = bisect_right(self.starts, pos - self.names_start) - 1
+            yield i
+            # Continue after this name, one hit per entry
+            pos = self._mm.find(needle, self.names_start + self.starts[i + 1], end)
+
+    def match(self, pattern: "re.Pattern[bytes]") -> Iterator[int]:
+        """
+        Yields the entries whose lowercased name matches a pattern that cannot span lines, in index order.
+
+        Args:
+            pattern (re.Pattern[bytes]): The compiled pattern.
+        """
+        end = self.names_end - 1
+        found = pattern.search(self._mm, self.names_start + 1, end)
+        while found is not None:
+            i = bisect_right(self.starts, found.start() - self.names_start) - 1
+            yield i
+            found = pattern.search(self._mm, self.names_start + self.starts[i + 1], end)
+
+def watch_tree(root: str, stop: threading.Event, apply: Callable[[List[Tuple[bool, str]]], None], what: str):
+    """
+    Feeds the changes under root to apply until stop is set, while watchfiles can watch the tree.
+
+    Changes to paths the walker leaves out (.git, node_modules, ...) are not passed on.
+
+    Args:
+        root (str): The directory to watch.
+        stop (threading.Event): Ends the watch.
+        apply (Callable): Called with the (deleted, path) of each batch of changes.
+        what (str): What the changes keep current, for the log.
+    """
+    try:
+        from watchfiles import watch, Change
+    except ImportError:
+        logger.info(f"watchfiles is not installed, {what} is refreshed by rescans only")
+        return
+    try:
+        for changes in watch(root, watch_filter=None, stop_event=stop, raise_interrupt=False):
+            kept = [(change == Change.deleted, path) for change, path in changes
+                    if not DEFAULT_EXCLUDER.excludes_path(path)]
+            if kept:
+                apply(kept)
+    except Exception as e:  # Watch limits, unsupported filesystems
+        logger.warning(f"Cannot watch {root} ({e}), {what} is refreshed by rescans only")
+
+class FileIndex:
+    """
+    File name index of a directory tree, kept current in the background.
+    """
+    def __init__(self, root: str, index_dir: str = FILE_INDEX_DIR,
+                 rescan_interval: float = FILE_INDEX_RESCAN, delta_max: int = FILE_INDEX_DELTA_MAX):
+        self.root = os.path.abspath(root)
+        self.rescan_interval = rescan_interval
+        self.delta_max = delta_max
+        digest = hashlib.sha1(_encode(self.root)).hexdigest()[:12]
+        self.path = os.path.join(index_dir, f"{digest}.idx")
+        self.segment: Optional[Segment] = None
+        self.watching = False
+        self.built_at = 0.0
+        # Changes since the segment was written: path -> (lowercased name, time), path -> time
+        self._added: Dict[str, Tuple[bytes, float]] = {}
+        self._removed: Dict[str, float] = {}
+        self._lock = threading.Lock()
+        self._ready = threading.Event()
+        self._rescan = threading.Event()
+        self._stop = threading.Event()
+        self._threads: List[threading.Thread] = []
+
+    def start(self) -> "FileIndex":
+        """
+        Opens the persisted index, if any, and starts the rescan and watch threads.
+
+        Returns:
+            FileIndex: self.
+        """
+        try:
+            self.segment = Segment(self.path)
+            self.built_at = os.path.getmtime(self.path)
+            self._ready.set()
+            logger.info(f"Opened file index {self.path} with {self.segment.count} entries")
+        except (OSError, ValueError) as e:
+            logger.info(f"No usable file index for {self.root} ({e}), building it")
+        # A persisted index is refreshed right away: the tree changed while the server was down
+        self._rescan.set()
+        for target in (self._rescan_loop, self._watch):
+            thread = threading.Thread(target=target, name=f"file-index-{target.__name__}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        return self
+
+    def stop(self, timeout: float = 5.0):
+        """Stops the background threads and waits for them to exit."""
+        self._stop.set()
+        self._rescan.set()
+        for thread in self._threads:
+            thread.join(timeout)
+
+    def wait_ready(self, timeout: Optional[float] = None) -> bool:
+        """Waits until the index can answer queries, at the latest after the first build."""
+        return self._ready.wait(timeout)
+
+    def rebuild(self):
+        """Scans the tree and swaps in a new segment."""
+        started = time.time()
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        count = Segment.write(self.path, ((entry.name, entry.path) for entry in walk(self.root)))
+        segment = Segment(self.path)
+        with self._lock:
+            self.segment = segment
+            self.built_at = started
+            # Changes seen during the scan may be missing from the new segment; keep those
+            self._added = {p: v for p, v in self._added.items() if v[1] >= started}
+            self._removed = {p: t for p, t in self._removed.items() if t >= started}
+        self._ready.set()
+        logger.info(f"Indexed {count} files under {self.root} in {time.time() - started:.1f}s")
+
+    def _rescan_loop(self):
+        while not self._stop.is_set():
+            self._rescan.wait(self.rescan_interval or None)
+            if self._stop.is_set():
+                return
+            self._rescan.clear()
+            try:
+                self.rebuild()
+            except OSError as e:
+                logger.warning(f"File index rebuild failed: {e}")
+
+    def _watch(self):
+        """Feeds filesystem changes into the delta while watchfiles can watch the tree."""
+        def apply(changes: List[Tuple[bool, str]]):
+            self.watching = True
+            self.apply(changes)
+        try:
+            watch_tree(self.root, self._stop, apply, "the file index")
+        finally:
+            self.watching = False
+
+    def apply(self, changes: Iterable[Tuple[bool, str]]):
+        """
+        Records changes to the tree.
+
+        Args:
+            changes (Iterable[Tuple[bool, str]]): (deleted, path) of each changed path.
+        """
+        now = time.time()
+        updates = []
+        for deleted, path in changes:
+            if deleted or not os.path.lexists(path):
+                updates.append((path, None))
+            elif os.path.isdir(path) and not os.path.islink(path):
+                updates.extend((entry.path, entry.name) for entry in walk(path))  # A directory moved into the tree
+            else:
+                updates.append((path, os.path.basename(path)))
+        with self._lock:
+            for path, name in updates:
+                if name is None:
+                    if self._added.pop(path, None) is None:
+                        # Possibly a directory: files added under it since the segment was written go with it
+                        prefix = os.path.join(path, "")
+                        for gone in [p for p in self._added if p.startswith(prefix)]:
+                            del self._added[gone]
+                    self._removed[path] = now
+                else:
+                    self._removed.pop(path, None)
+                    self._added[path] = (_key(name), now)
+            pending = len(self._added) + len(self._removed)
+        if pending > self.delta_max:
+            self._rescan.set()
+
+    def _is_removed(self, path: str, removed: Dict[str, float]) -> bool:
+        """Whether the path or one of its directories was deleted since the segment was written."""
+        while True:
+            if path in removed:
+                return True
+            parent = os.path.dirname(path)
+            if parent == path or len(parent) < len(self.root):
+                return False
+            path = parent
+
+    def search(self, query: str) -> Iterator[Tuple[str, str]]:
+        """
+        Yields the files whose name contains query, case-insensitively.
+
+        Args:
+            query (str): Part of a file name.
+
+        Yields:
+            Tuple[str, str]: (lowercased file name, full path).
+        """
+        needle = _key(query)
+        return self._entries(lambda segment: segment.find(needle), lambda name: needle in name)
+
+    def search_fuzzy(self, query: str) -> Iterator[Tuple[str, str]]:
+        """
+        Yields the files whose name contains the characters of query in order, but not query itself.
+
+        Args:
+            query (str): Characters of a file name.
+
+        Yields:
+            Tuple[str, str]: (lowercased file name, full path).
+        """
+        needle = _key(query)
+        pattern = re.compile(b"[^\n]*?".join(re.escape(c.encode("utf-8", "surrogateescape"))
+                                              for c in needle.decode("utf-8", "surrogateescape")))
+        matches = self._entries(lambda segment: segment.match(pattern), lambda name: pattern.search(name) is not None)
+        return ((name, path) for name, path in matches if query.lower() not in name)
+
+    def _entries(self, in_segment, in_delta) -> Iterator[Tuple[str, str]]:
+        """Yields the current entries selected by a segment matcher and a name predicate for the delta."""
+        with self._lock:
+            segment = self.segment
+            added = dict(self._added)
+            removed = dict(self._removed)
+        if segment is not None:
+            for i in in_segment(segment):
+                path = segment.path_of(i)
+                if path in added or (removed and self._is_removed(path, removed)):
+                    continue
+                yield segment.name_of(i), path
+        for path, (name, _) in added.items():
+            if in_delta(name):
+                yield name.decode("utf-8", "surrogateescape"), path
+
+    def status(self) -> Dict[str, object]:
+        """Size and freshness of the index."""
+        return {
+            "root": self.root,
+            "entries": self.segment.count if self.segment is not None else 0,
+            "pending_changes": len(self._added) + len(self._removed),
+            "built_at": self.built_at,
+            "watching": self.watching,
+        }
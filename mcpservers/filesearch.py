@@ -1,7 +1,14 @@
-from typing import Any
-import httpx
-from mcp.server.fastmcp import FastMCP
+from mcp.server.fastmcp import FastMCP, Context
 import os
+import heapq
+import asyncio
+from collections import deque
+from typing import Callable, Iterable, Iterator, List, Optional, Tuple
+from file_index import FileIndex
+from walker import walk
+from content_search import ContentSearch
+from progress import ProgressReporter
+from cursor import encode_cursor, decode_cursor
 
 # Initialize FastMCP server
 mcp = FastMCP("filesearch")
@@ -9,6 +16,28 @@ mcp = FastMCP("filesearch")
 # Constants
 SEARCH_DIRECTORY = os.getenv("SEARCH_DIRECTORY", "/")
 
+# Seconds a query waits for the first index build before giving up
+INDEX_WAIT = float(os.getenv("FILE_INDEX_WAIT", "600"))
+
+# Results per page of search_files
+DEFAULT_LIMIT = 20
+MAX_LIMIT = 200
+
+# Limits of search_file_contents
+MAX_CONTENT_HITS = 200
+CONTENT_SEARCH_TIMEOUT = float(os.getenv("CONTENT_SEARCH_TIMEOUT", "20"))
+CONTENT_SEARCH_MAX_MB = float(os.getenv("CONTENT_SEARCH_MAX_MB", "20"))
+
+# Match tiers, best first
+EXACT, PREFIX, SUBSTRING, FUZZY = range(4)
+
+# File name index of SEARCH_DIRECTORY, started with the server
+index = FileIndex(SEARCH_DIRECTORY)
+
+# Sort key of a match: (tier, spread, name length, path), spread is where the query starts in the
+# name for substring matches and how many characters its fuzzy match spans
+RankKey = Tuple[int, int, int, str]
+
 def debug_log(message: str, filename="debug.log") -> None:
     """Appends debug messages to a log file."""
     log_path = os.path.join(os.getcwd(), filename)  # Save log in the current directory
@@ -16,31 +45,166 @@ def debug_log(message: str, filename="debug.log") -> None:
         log_file.write(f"{message}\n")
 
 
+def substring_key(query: str, name: str, path: str) -> RankKey:
+    """Ranks a name that contains the query."""
+    if name == query:
+        return (EXACT, 0, len(name), path)
+    position = name.find(query)
+    return (PREFIX if position == 0 else SUBSTRING, position, len(name), path)
+
+def fuzzy_key(query: str, name: str, path: str) -> RankKey:
+    """Ranks a name that contains the characters of the query in order."""
+    start = position = name.find(query[0])
+    for char in query[1:]:
+        position = name.find(char, position + 1)
+    return (FUZZY, position - start + 1, len(name), path)
+
+def top_k(matches: Iterable[Tuple[str, str]], key: Callable[[str, str, str], RankKey], query: str,
+          accept: Callable[[str, str], bool], after: Optional[RankKey], k: int) -> List[RankKey]:
+    """The k best-ranked matches after the cursor position, kept in a bounded heap."""
+    keys: Iterator[RankKey] = (key(query, name, path) for name, path in matches if accept(name, path))
+    if after is not None:
+        keys = (rank for rank in keys if rank > after)
+    return heapq.nsmallest(k, keys)
+
 @mcp.tool()
-def search_files(partial_name: str) -> list[str]:
+async def search_files(partial_name: str, limit: int = DEFAULT_LIMIT, extensions: Optional[List[str]] = None,
+                       directory: Optional[str] = None, cursor: Optional[str] = None) -> dict:
     """Search for files with a partial name match in a user-specified folder.
 
+    Matches are ranked: exact name, then names starting with partial_name, then names
+    containing it, then names containing its characters in order.
+
     Args:
         partial_name: Partial filename to search for.
+        limit: Number of results to return (at most 200).
+        extensions: Only files with these extensions, e.g. ["pdf", "md"].
+        directory: Only files under this directory.
+        cursor: The next_cursor of a previous call, to get the following results.
 
     Returns:
-        List of matching file paths.
+        Dict with "results", the matching file paths best first, and "next_cursor" if there are more.
     """
-    matching_files = []
-
     # Validate search directory
     if not os.path.exists(SEARCH_DIRECTORY):
-        return [f"Error: Directory '{SEARCH_DIRECTORY}' does not exist."]
+        return {"error": f"Directory '{SEARCH_DIRECTORY}' does not exist."}
+
+    query = partial_name.lower()
+    if not query:
+        return {"error": "partial_name is empty."}
+    limit = max(1, min(int(limit), MAX_LIMIT))
+    suffixes = tuple(f".{e.lower().lstrip('.')}" for e in extensions or ())
+    under = os.path.join(os.path.abspath(os.path.expanduser(directory)), "") if directory else ""
+
+    after = None
+    if cursor:
+        try:
+            state = decode_cursor(cursor)
+            after = tuple(state["after"])
+        except (ValueError, KeyError, TypeError):
+            return {"error": "Invalid cursor."}
+        if [state.get("q"), state.get("ext"), state.get("dir")] != [query, list(suffixes), under]:
+            return {"error": "The cursor belongs to a different search."}
+
+    # The first build of the index walks the whole tree once. The waiting and the scans of the index run
+    # in threads, so the server keeps answering other calls, such as a running search_file_contents
+    if not await asyncio.to_thread(index.wait_ready, INDEX_WAIT):
+        return {"error": f"The file index of '{SEARCH_DIRECTORY}' is still being built, try again later."}
+
+    def accept(name: str, path: str) -> bool:
+        return (not suffixes or name.endswith(suffixes)) and (not under or path.startswith(under))
+
+    def rank() -> List[RankKey]:
+        # One result more than asked tells whether there is a next page
+        keys = top_k(index.search(query), substring_key, query, accept, after, limit + 1)
+        if len(keys) <= limit:
+            # Fuzzy matches rank after all substring matches, they are only looked for to fill the page
+            keys += top_k(index.search_fuzzy(query), fuzzy_key, query, accept, after, limit + 1 - len(keys))
+        return keys
+
+    keys = await asyncio.to_thread(rank)
+
+    page = keys[:limit]
+    result = {"results": [key[3] for key in page]}
+    if not page:
+        result["message"] = "No matching files found."
+    if len(keys) > limit:
+        result["next_cursor"] = encode_cursor({"q": query, "ext": list(suffixes), "dir": under, "after": list(page[-1])})
+    return result
+
+
+@mcp.tool()
+async def search_file_contents(text: str, ctx: Context, directory: Optional[str] = None,
+                               extensions: Optional[List[str]] = None, regex: bool = False,
+                               case_sensitive: bool = False, max_hits: int = 20, context_lines: int = 1) -> dict:
+    """Search inside files for a text, like grep, and return the matching lines with context.
+
+    Args:
+        text: Text to look for, or a regular expression if regex is true.
+        directory: Folder to search in, defaults to the whole search folder. Narrow folders are much faster.
+        extensions: Only files with these extensions, e.g. ["md", "txt"].
+        regex: Treat text as a regular expression.
+        case_sensitive: Match case.
+        max_hits: Number of matching lines to return (at most 200).
+        context_lines: Lines shown before and after each match.
+
+    Returns:
+        Dict with "hits" (path, line number and context of each match) and what was scanned.
+    """
+    root = os.path.abspath(os.path.expanduser(directory)) if directory else SEARCH_DIRECTORY
+    if not os.path.isdir(root):
+        return {"error": f"Directory '{root}' does not exist."}
+    if not text:
+        return {"error": "text is empty."}
+    suffixes = tuple(f".{e.lower().lstrip('.')}" for e in extensions or ())
+    max_hits = max(1, min(int(max_hits), MAX_CONTENT_HITS))
+    try:
+        search = ContentSearch(text, regex=regex, case_sensitive=case_sensitive, max_hits=max_hits,
+                               context_lines=max(0, min(int(context_lines), 5)),
+                               max_file_size=int(CONTENT_SEARCH_MAX_MB * 1024 * 1024),
+                               timeout=CONTENT_SEARCH_TIMEOUT)
+    except Exception as e:  # re.error
+        return {"error": f"Invalid pattern: {e}"}
 
-    # Recursively search for files
-    for root, _, files in os.walk(SEARCH_DIRECTORY):
-        for file in files:
-            if partial_name.lower() in file.lower():  # Case-insensitive match
-                matching_files.append(os.path.join(root, file))
+    files = (entry.path for entry in walk(root) if not suffixes or entry.name.lower().endswith(suffixes))
+    found = deque()  # Appended by the search threads, drained here into progress reports
+    progress = ProgressReporter(ctx, total=max_hits)
+    task = asyncio.create_task(asyncio.to_thread(search.run, files, found.append))
+    reported = 0
+    try:
+        # Hits are streamed to the client as partial results while the search runs
+        while True:
+            done, _ = await asyncio.wait({task}, timeout=0.2)
+            while found:
+                hit = found.popleft()
+                reported += 1
+                await progress(reported, f"{reported} matches, {search.stats.files_scanned} files searched",
+                               partial=f"{hit.path}\n{hit.context}")
+            if done:
+                break
+        hits = task.result()
+    finally:
+        if not task.done():
+            search.cancel()  # The call was cancelled, stop the threads
 
-    return matching_files if matching_files else ["No matching files found."]
+    stats = search.stats
+    result = {
+        "hits": [hit.as_dict() for hit in hits],
+        "files_scanned": stats.files_scanned,
+        "files_skipped": stats.files_skipped,
+        "seconds": round(stats.elapsed, 2),
+    }
+    if stats.stopped in ("hit limit", "time limit"):
+        result["stopped_at"] = stats.stopped
+    if not hits:
+        result["message"] = "No matches found."
+    return result
 
 
 if __name__ == "__main__":
     # Initialize and run the server
-    mcp.run(transport="stdio")
+    index.start()
+    try:
+        mcp.run(transport="stdio")
+    finally:
+        index.stop()
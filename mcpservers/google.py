@@ -1,18 +1,19 @@
-import os
 import random
 import asyncio
 import httpx
 import logging
-import json
 from typing import List
-from bs4 import BeautifulSoup
 from time import sleep
 
 from mcp.server.fastmcp import FastMCP
+import cancellation
 
 # Initialize FastMCP server
 mcp = FastMCP("google_search")
 
+# Let the chat app cancel tool calls it no longer needs
+cancellation.install()
+
 # Alternative: Brave Search API (Recommended)
 SEARCH_ENGINE_URL = "https://www.google.com.tw/search?q="
 
@@ -80,6 +81,8 @@ async def fetch_page(query: str) -> str:
 
 def extract_links(html: str) -> List[str]:
     """Extract valid search result links from Google search HTML."""
+    from bs4 import BeautifulSoup
+
     soup = BeautifulSoup(html, "html.parser")
     links = []
     
@@ -102,6 +105,7 @@ async def google_search(query: str, max_results: int = 5) -> List[str]:
     if not html:
         return ["Failed to fetch results. Google may have blocked the request."]
 
+    from bs4 import BeautifulSoup
     soup = BeautifulSoup(html, "html.parser")
 
     # Detect CAPTCHA challenge
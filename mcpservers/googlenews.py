@@ -1,7 +1,5 @@
-import os
 import random
 import httpx
-from bs4 import BeautifulSoup
 from mcp.server.fastmcp import FastMCP
 from typing import List, Dict
 
@@ -57,6 +55,7 @@ def news_search(query: str, max_results: int = 5) -> List[Dict[str, str]]:
         response.raise_for_status()
 
         # Extract news articles
+        from bs4 import BeautifulSoup
         soup = BeautifulSoup(response.text, "html.parser")
         
         return soup.text
@@ -69,6 +68,8 @@ def news_search(query: str, max_results: int = 5) -> List[Dict[str, str]]:
 
 def extract_news_articles(html: str) -> List[Dict[str, str]]:
     """Extracts news article titles and URLs from Google News Search results."""
+    from bs4 import BeautifulSoup
+
     soup = BeautifulSoup(html, "html.parser")
     articles = []
 
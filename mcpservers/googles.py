@@ -1,22 +1,24 @@
 
 
-import os
 import random
 import asyncio
 import httpx
 import logging
-import json
 from typing import List
-from bs4 import BeautifulSoup
 from time import sleep
 
-from mcp.server.fastmcp import FastMCP
+from mcp.server.fastmcp import FastMCP, Context
+import cancellation
+from progress import ProgressReporter
 import sys
 sys.path.append('/Users/sparkt/2024_CODE/duoagent/duoagent/')
 
 # Initialize FastMCP server
 mcp = FastMCP("google_search")
 
+# Let the chat app cancel tool calls it no longer needs
+cancellation.install()
+
 # Alternative: Brave Search API (Recommended)
 SEARCH_ENGINE_URL = "https://www.google.com.tw/search?q="
 
@@ -83,15 +85,19 @@ async def fetch_page(query: str) -> str:
     return ""
 
 @mcp.tool()
-async def google_search(query: str, max_results: int = 5) -> List[str]:
+async def google_search(query: str, ctx: Context, max_results: int = 5) -> List[str]:
     """Perform a Google search and return a list of result URLs."""
     logging.info(f"Performing Google search for: {query}")
     
     from googlesearch import search
+    from bs4 import BeautifulSoup
     import util
+    progress = ProgressReporter(ctx, total=5)
+    await progress(0, f"Searching for {query}")
     results = search(query)
     result_text = []
     for i, result in enumerate(results):
+        await progress(i, f"Reading {result}")
         html = await fetch_page(result)
         soup = BeautifulSoup(html, "html.parser")        
         rewrite_version = util.prompt_to_llm(
@@ -100,6 +106,7 @@ async def google_search(query: str, max_results: int = 5) -> List[str]:
         )
         summary = f"{rewrite_version} from {result}"
         result_text.append(summary)
+        await progress(i + 1, f"Summarized {result}", partial=summary)
         if i>3:
             break
 
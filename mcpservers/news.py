@@ -1,7 +1,5 @@
-import os
 import random
 import httpx
-from bs4 import BeautifulSoup
 from mcp.server.fastmcp import FastMCP
 from typing import List, Dict
 
@@ -74,6 +72,8 @@ def news_search(query: str, max_results: int = 5) -> List[Dict[str, str]]:
 
 def extract_news_articles(html: str) -> List[Dict[str, str]]:
     """Extracts news article titles and URLs from Bing News Search results."""
+    from bs4 import BeautifulSoup
+
     soup = BeautifulSoup(html, "html.parser")
     articles = []
 
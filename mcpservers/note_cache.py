@@ -0,0 +1,125 @@
+"""
+Persistent cache of note summaries.
+
+A note's summary only changes when the note does, so summaries are kept in
+a SQLite file keyed by path and checked against the note's mtime and size:
+a repeat scan of an unchanged vault costs one stat per note and no reads.
+The whole cache is loaded into memory on first use; changed entries are
+written back in one transaction.
+"""
+import os
+import sqlite3
+import logging
+import threading
+from typing import Dict, Iterable, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# SQLite file of the cache (empty string keeps it in memory only)
+SUMMARY_CACHE_PATH = os.path.expanduser(os.getenv("SUMMARY_CACHE_PATH", "~/.cache/mcp-dailysum/summaries.sqlite3"))
+
+class SummaryCache:
+    """
+    Note summaries keyed by path, valid while the note's mtime and size are unchanged.
+    """
+    def __init__(self, path: Optional[str] = SUMMARY_CACHE_PATH, version: int = 1):
+        """
+        Args:
+            path (Optional[str]): The SQLite file, None or "" to not persist.
+            version (int): Version of the summary extraction; entries of other versions are stale.
+        """
+        self.path = path or None
+        self.version = version
+        self._entries: Dict[str, Tuple[int, int, str]] = {}  # path -> (mtime_ns, size, summary)
+        self._dirty: Dict[str, Optional[Tuple[int, int, str]]] = {}  # None marks a removed entry
+        self._loaded = False
+        self._lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        db = sqlite3.connect(self.path)
+        db.execute("CREATE TABLE IF NOT EXISTS summaries "
+                   "(path TEXT PRIMARY KEY, mtime_ns INTEGER, size INTEGER, version INTEGER, summary TEXT)")
+        return db
+
+    def load(self):
+        """Reads the persisted entries, once."""
+        with self._lock:
+            if self._loaded:
+                return
+            self._loaded = True
+            if self.path is None:
+                return
+            try:
+                db = self._connect()
+                try:
+                    rows = db.execute("SELECT path, mtime_ns, size, summary FROM summaries WHERE version = ?",
+                                      (self.version,)).fetchall()
+                finally:
+                    db.close()
+            except (sqlite3.Error, OSError) as e:
+                logger.warning(f"Could not read the summary cache {self.path}: {e}")
+                return
+            self._entries = {path: (mtime_ns, size, summary) for path, mtime_ns, size, summary in rows}
+
+    def get(self, path: str, mtime_ns: int, size: int) -> Optional[str]:
+        """
+        Returns the cached summary of a note.
+
+        Args:
+            path (str): The note.
+            mtime_ns (int): Its current modification time, in nanoseconds.
+            size (int): Its current size.
+
+        Returns:
+            Optional[str]: The summary, or None if it is not cached or the note changed.
+        """
+        entry = self._entries.get(path)
+        if entry is None or entry[0] != mtime_ns or entry[1] != size:
+            return None
+        return entry[2]
+
+    def put(self, path: str, mtime_ns: int, size: int, summary: str):
+        """Caches the summary of a note in the state it was read in."""
+        with self._lock:
+            self._entries[path] = self._dirty[path] = (mtime_ns, size, summary)
+
+    def retain(self, paths: Iterable[str], under: str):
+        """
+        Drops the entries of notes under a directory that no longer exist.
+
+        Args:
+            paths (Iterable[str]): The notes that exist under the directory.
+            under (str): The directory that was scanned.
+        """
+        keep = set(paths)
+        prefix = os.path.join(under, "")
+        with self._lock:
+            for path in [p for p in self._entries if p.startswith(prefix) and p not in keep]:
+                del self._entries[path]
+                self._dirty[path] = None
+
+    def save(self):
+        """Writes the changed entries."""
+        with self._lock:
+            dirty, self._dirty = self._dirty, {}
+        if not dirty or self.path is None:
+            return
+        try:
+            db = self._connect()
+            try:
+                with db:
+                    db.executemany("DELETE FROM summaries WHERE path = ?",
+                                   [(path,) for path, entry in dirty.items() if entry is None])
+                    db.executemany("INSERT OR REPLACE INTO summaries VALUES (?, ?, ?, ?, ?)",
+                                   [(path, *entry[:2], self.version, entry[2])
+                                    for path, entry in dirty.items() if entry is not None])
+            finally:
+                db.close()
+        except (sqlite3.Error, OSError) as e:
+            logger.warning(f"Could not write the summary cache {self.path}: {e}")
+
+    def __len__(self) -> int:
+        return len(self._entries)
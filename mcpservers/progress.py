@@ -0,0 +1,65 @@
+"""
+Progress and partial results for long-running tools.
+
+A client that wants progress puts a progress token in the request's "_meta"
+(the chat app does for every tool call it shows). A tool takes a FastMCP
+Context argument and reports through a ProgressReporter:
+
+    @mcp.tool()
+    async def slow_tool(query: str, ctx: Context) -> str:
+        progress = ProgressReporter(ctx, total=len(pages))
+        for i, page in enumerate(pages, 1):
+            ...
+            await progress(i, f"Read {page}", partial=summary)
+
+Each report is a standard "notifications/progress" with two extra fields the
+chat app displays: "message", what the tool is doing, and "partial", content
+of the result the tool already has. Status-only reports are rate limited;
+reports carrying partial content, and the final one, are always sent.
+Without a progress token reports are dropped, so tools behave the same for
+other clients.
+"""
+import time
+from typing import Optional
+
+from mcp import types
+
+# Minimum seconds between two status-only reports
+MIN_INTERVAL = 0.2
+
+class ProgressReporter:
+    """
+    Sends the progress of one tool call to the client.
+    """
+    def __init__(self, ctx, total: Optional[float] = None, min_interval: float = MIN_INTERVAL):
+        meta = ctx.request_context.meta if ctx is not None else None
+        self.token = meta.progressToken if meta is not None else None
+        self.session = ctx.request_context.session if self.token is not None else None
+        self.total = total
+        self.min_interval = min_interval
+        self.last = 0.0
+
+    async def __call__(self, progress: float, message: Optional[str] = None, partial: Optional[str] = None):
+        """
+        Reports progress.
+
+        Args:
+            progress (float): Work done so far, in the unit of total.
+            message (Optional[str]): What the tool is doing.
+            partial (Optional[str]): Content of the result that is already known.
+        """
+        if self.token is None:
+            return
+        now = time.monotonic()
+        if partial is None and progress != self.total and now - self.last < self.min_interval:
+            return
+        self.last = now
+
+        params = types.ProgressNotificationParams(progressToken=self.token, progress=progress, total=self.total,
+                                                  message=message, partial=partial)
+        try:
+            await self.session.send_notification(types.ServerNotification(
+                types.ProgressNotification(method="notifications/progress", params=params)
+            ))
+        except Exception:
+            self.token = None  # The client went away, stop reporting
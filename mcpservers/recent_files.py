@@ -1,8 +1,9 @@
-from typing import Any
 import os
-import heapq
+import asyncio
 from datetime import datetime
+from typing import List, Optional
 from mcp.server.fastmcp import FastMCP
+from recent_index import RecentIndex, parse_time, scan_newest
 
 # Initialize FastMCP server
 mcp = FastMCP("recentfiles")
@@ -11,6 +12,13 @@ mcp = FastMCP("recentfiles")
 SEARCH_DIRECTORY = os.getenv("SEARCH_DIRECTORY", "/")
 
 TOP_N = 20  # Number of top recent files to retrieve
+MAX_N = 500
+
+# Seconds a call waits for the first scan of the tree
+INDEX_WAIT = float(os.getenv("RECENT_INDEX_WAIT", "600"))
+
+# Most recently changed files of SEARCH_DIRECTORY, started with the server
+index = RecentIndex(SEARCH_DIRECTORY)
 
 
 def debug_log(message: str, filename="debug.log") -> None:
@@ -20,9 +28,21 @@ def debug_log(message: str, filename="debug.log") -> None:
         log_file.write(f"{message}\n")
 
 
+def format_time(ts: float) -> str:
+    return datetime.fromtimestamp(ts).strftime('%Y-%m-%d %H:%M:%S')
+
+
 @mcp.tool()
-def get_recent_files() -> list[str]:
-    """Retrieve the top 20 most recently created or updated files in the directory.
+async def get_recent_files(n: int = TOP_N, directory: Optional[str] = None, extensions: Optional[List[str]] = None,
+                           since: Optional[str] = None, until: Optional[str] = None) -> list[str]:
+    """Retrieve the most recently created or updated files in the directory.
+
+    Args:
+        n: Number of files to return (at most 500).
+        directory: Only files under this directory.
+        extensions: Only files with these extensions, e.g. ["py", "md"].
+        since: Only files changed at or after this ISO date or date and time, e.g. "2024-02-20".
+        until: Only files changed at or before this ISO date or date and time.
 
     Returns:
         List of file paths sorted by most recent first.
@@ -30,37 +50,47 @@ def get_recent_files() -> list[str]:
     if not os.path.exists(SEARCH_DIRECTORY):
         return [f"Error: Directory '{SEARCH_DIRECTORY}' does not exist."]
 
-    recent_files = []
-
-    # Walk through the directory and gather file modification times
-    for root, _, files in os.walk(SEARCH_DIRECTORY):
-        for file in files:
-            file_path = os.path.join(root, file)
-            try:
-                # Get file creation and modification time
-                mod_time = os.path.getmtime(file_path)
-                creation_time = os.path.getctime(file_path)
-                latest_time = max(mod_time, creation_time)  # Use the most recent timestamp
-
-                # Maintain a heap for top N recent files
-                heapq.heappush(recent_files, (latest_time, file_path))
-                if len(recent_files) > TOP_N:
-                    heapq.heappop(recent_files)  # Keep only the top N elements
-            except Exception as e:
-                debug_log(f"Error accessing file {file_path}: {e}")
-
-    # Sort results in descending order (most recent first)
-    recent_files = sorted(recent_files, key=lambda x: x[0], reverse=True)
+    try:
+        start, end = parse_time(since), parse_time(until, end_of_day=True)
+    except ValueError as e:
+        return [f"Error: {e}"]
+    n = max(1, min(int(n), MAX_N))
+    under = os.path.join(os.path.abspath(os.path.expanduser(directory)), "") if directory else ""
+    suffixes = tuple(f".{e.lower().lstrip('.')}" for e in extensions or ())
+
+    def accept(path: str) -> bool:
+        return path.startswith(under) and (not suffixes or path.lower().endswith(suffixes))
+
+    # The first call after startup waits for the one full scan; the waiting and walking run in threads
+    # so the server keeps answering pings, cancellations and other calls meanwhile
+    if not await asyncio.to_thread(index.wait_ready, INDEX_WAIT):
+        return [f"Error: '{SEARCH_DIRECTORY}' is still being scanned, try again later."]
+    recent_files = index.newest(n, accept, start, end)
+
+    # The index holds only the newest files of the whole tree: when the answer reaches past its cutoff,
+    # older files may be missing, so a directory is walked and otherwise the answer says so
+    note = None
+    cutoff = index.cutoff
+    if cutoff is not None and (start is None or start <= cutoff) \
+            and (len(recent_files) < n or recent_files[-1][0] <= cutoff):
+        if directory:
+            recent_files = await asyncio.to_thread(scan_newest, under, n, accept, start, end)
+        else:
+            note = (f"Note: the index only covers files changed after {format_time(cutoff)}, "
+                    f"give a directory to also search older files.")
 
     # Format the output with timestamps
-    formatted_results = [
-        f"{datetime.fromtimestamp(ts).strftime('%Y-%m-%d %H:%M:%S')} - {path}"
-        for ts, path in recent_files
-    ]
+    formatted_results = [f"{format_time(ts)} - {path}" for ts, path in recent_files]
+    if note is not None:
+        formatted_results.append(note)
 
     return formatted_results if formatted_results else ["No files found."]
 
 
 if __name__ == "__main__":
     # Initialize and run the server
-    mcp.run(transport="stdio")
+    index.start()
+    try:
+        mcp.run(transport="stdio")
+    finally:
+        index.stop()
@@ -0,0 +1,268 @@
+"""
+Recency index of a directory tree.
+
+RecentIndex keeps the RECENT_INDEX_SIZE most recently changed files of a
+tree in memory, newest last, so "what changed recently" is read off the end
+of the index instead of walking and stat-ing the whole tree. It is seeded by
+one parallel walk with a single stat per file, then fed by watchfiles change
+notifications; a rescan every RECENT_RESCAN seconds catches what the watcher
+missed, or keeps the index current where the tree cannot be watched.
+
+Once the tree has more files than the index holds, older files fall out of
+it: the index only answers for files changed after its cutoff, and callers
+look for older files with scan_newest().
+"""
+import os
+import stat
+import time
+import heapq
+import logging
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from typing import Callable, Iterator, List, Optional, Tuple
+
+from walker import walk
+from file_index import watch_tree
+
+logger = logging.getLogger(__name__)
+
+# Files tracked
+RECENT_INDEX_SIZE = int(os.getenv("RECENT_INDEX_SIZE", "10000"))
+
+# Seconds between full rescans (0 disables)
+RECENT_RESCAN = float(os.getenv("RECENT_RESCAN", "3600"))
+
+def parse_time(value: Optional[str], end_of_day: bool = False) -> Optional[float]:
+    """Timestamp of an ISO date or date and time, None if not given. A bare date can mean the end of that day."""
+    if not value:
+        return None
+    moment = datetime.fromisoformat(value)
+    if end_of_day and len(value) == 10:
+        moment = moment.replace(hour=23, minute=59, second=59, microsecond=999999)
+    return moment.timestamp()
+
+def changed_at(st: os.stat_result) -> float:
+    """When a file was last created or updated."""
+    return max(st.st_mtime, st.st_ctime)
+
+def modified_at(st: os.stat_result) -> float:
+    """When a file's content was last written, kept across copies, syncs and checkouts that preserve it."""
+    return st.st_mtime
+
+class RecentIndex:
+    """
+    The most recently changed files of a tree, kept current in the background.
+    """
+    def __init__(self, root: str, size: int = RECENT_INDEX_SIZE, rescan_interval: float = RECENT_RESCAN,
+                 key: Callable[[os.stat_result], float] = changed_at):
+        """
+        Args:
+            root (str): The tree.
+            size (int): Files kept.
+            rescan_interval (float): Seconds between full rescans, 0 for none.
+            key (Callable[[os.stat_result], float]): The time files are ordered by.
+        """
+        self.root = os.path.abspath(root)
+        self.key = key
+        self.size = max(1, size)
+        self.rescan_interval = rescan_interval
+        self._files: "OrderedDict[str, float]" = OrderedDict()  # path -> change time, oldest first
+        self._unordered = False  # Set when a change older than the newest entry was appended
+        self._cutoff: Optional[float] = None  # Newest change time of a file left out, None if none was
+        self._lock = threading.Lock()
+        self._ready = threading.Event()
+        self._stop = threading.Event()
+        self._threads: List[threading.Thread] = []
+
+    def start(self) -> "RecentIndex":
+        """
+        Starts the seeding scan, the periodic rescans and the watch thread.
+
+        Returns:
+            RecentIndex: self.
+        """
+        for target in (self._rescan_loop, self._watch):
+            thread = threading.Thread(target=target, name=f"recent-index-{target.__name__}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        return self
+
+    def stop(self, timeout: float = 5.0):
+        """Stops the background threads and waits for them to exit."""
+        self._stop.set()
+        for thread in self._threads:
+            thread.join(timeout)
+
+    def wait_ready(self, timeout: Optional[float] = None) -> bool:
+        """Waits until the seeding scan has finished."""
+        return self._ready.wait(timeout)
+
+    def rescan(self):
+        """Replaces the index with the newest files found by a full scan."""
+        started = time.time()
+        newest: List[Tuple[float, str]] = []
+        cutoff = None
+        for entry in walk(self.root):
+            try:
+                item = (self.key(entry.stat(follow_symlinks=False)), entry.path)
+            except OSError:
+                continue
+            if len(newest) < self.size:
+                heapq.heappush(newest, item)
+                continue
+            if item > newest[0]:
+                item = heapq.heapreplace(newest, item)
+            cutoff = item[0] if cutoff is None else max(cutoff, item[0])
+        with self._lock:
+            self._cutoff = cutoff
+            # Changes seen during the scan are newer than anything it found
+            recent = [(path, ts) for path, ts in self._files.items() if ts >= started]
+            self._files = OrderedDict((path, ts) for ts, path in sorted(newest))
+            for path, ts in recent:
+                self._files[path] = ts
+                self._files.move_to_end(path)
+            self._unordered = bool(recent)
+            self._trim()
+        self._ready.set()
+        logger.info(f"Recency index of {self.root}: {len(self._files)} files, scanned in {time.time() - started:.1f}s")
+
+    def _rescan_loop(self):
+        while not self._stop.is_set():
+            try:
+                self.rescan()
+            except OSError as e:
+                logger.warning(f"Recency index rescan failed: {e}")
+                self._ready.set()
+            if not self.rescan_interval or self._stop.wait(self.rescan_interval):
+                return
+
+    def _watch(self):
+        watch_tree(self.root, self._stop, self.apply, "the recency index")
+
+    def apply(self, changes: List[Tuple[bool, str]]):
+        """
+        Records changes to the tree.
+
+        Args:
+            changes (List[Tuple[bool, str]]): (deleted, path) of each changed path.
+        """
+        updates = []
+        for deleted, path in changes:
+            try:
+                st = None if deleted else os.stat(path, follow_symlinks=False)
+            except OSError:
+                st = None
+            if st is None:
+                updates.append((path, None))
+            elif stat.S_ISDIR(st.st_mode):
+                # A directory moved into the tree brings its files
+                for entry in walk(path):
+                    try:
+                        updates.append((entry.path, self.key(entry.stat(follow_symlinks=False))))
+                    except OSError:
+                        continue
+            else:
+                updates.append((path, self.key(st)))
+
+        with self._lock:
+            for path, ts in updates:
+                if ts is None:
+                    self._remove(path)
+                    continue
+                self._files.pop(path, None)
+                if self._files and ts < next(reversed(self._files.values())):
+                    self._unordered = True  # Moved or copied with its old time
+                self._files[path] = ts
+            self._trim()
+
+    def _remove(self, path: str):
+        """Drops a path, or everything under it if it was a directory."""
+        if self._files.pop(path, None) is None:
+            prefix = os.path.join(path, "")
+            for gone in [p for p in self._files if p.startswith(prefix)]:
+                del self._files[gone]
+
+    def _trim(self):
+        """Restores the order if needed and keeps the newest size entries."""
+        if self._unordered:
+            self._files = OrderedDict(sorted(self._files.items(), key=lambda item: item[1]))
+            self._unordered = False
+        while len(self._files) > self.size:
+            _, ts = self._files.popitem(last=False)
+            self._cutoff = ts if self._cutoff is None else max(self._cutoff, ts)
+
+    @property
+    def cutoff(self) -> Optional[float]:
+        """Change time at or before which files may be missing from the index, None if it holds the whole tree."""
+        return self._cutoff
+
+    def paths(self) -> List[str]:
+        """The indexed files, oldest first."""
+        with self._lock:
+            return list(self._files)
+
+    def newest(self, n: int, accept: Optional[Callable[[str], bool]] = None, since: Optional[float] = None,
+               until: Optional[float] = None, before: Optional[Tuple[float, str]] = None) -> List[Tuple[float, str]]:
+        """
+        The most recently changed files, newest first.
+
+        Args:
+            n (int): Number of files.
+            accept (Optional[Callable[[str], bool]]): Path filter.
+            since (Optional[float]): Only files changed at or after this timestamp.
+            until (Optional[float]): Only files changed at or before this timestamp.
+            before (Optional[Tuple[float, str]]): Only files after this (change time, path) in the order, to page.
+
+        Returns:
+            List[Tuple[float, str]]: (change time, path) of up to n files, ties ordered by path.
+        """
+        found = []
+        with self._lock:
+            items: Iterator[Tuple[str, float]] = reversed(self._files.items())
+            for path, ts in items:
+                if since is not None and ts < since:
+                    break  # Everything after is older
+                if len(found) >= n and ts < found[-1][0]:
+                    break  # Files changed at the same time as the last one found are all looked at
+                if (until is not None and ts > until) or (before is not None and (ts, path) >= before):
+                    continue
+                if accept is None or accept(path):
+                    found.append((ts, path))
+        found.sort(reverse=True)
+        return found[:n]
+
+def scan_newest(root: str, n: int, accept: Optional[Callable[[str], bool]] = None, since: Optional[float] = None,
+                until: Optional[float] = None, before: Optional[Tuple[float, str]] = None,
+                key: Callable[[os.stat_result], float] = changed_at) -> List[Tuple[float, str]]:
+    """
+    The most recently changed files under a directory, found by walking it, for what the index does not cover.
+
+    Args:
+        root (str): The directory.
+        n (int): Number of files.
+        accept (Optional[Callable[[str], bool]]): Path filter.
+        since (Optional[float]): Only files changed at or after this timestamp.
+        until (Optional[float]): Only files changed at or before this timestamp.
+        before (Optional[Tuple[float, str]]): Only files after this (change time, path) in the order, to page.
+        key (Callable[[os.stat_result], float]): The time files are ordered by.
+
+    Returns:
+        List[Tuple[float, str]]: (change time, path) of up to n files, newest first, ties ordered by path.
+    """
+    newest: List[Tuple[float, str]] = []
+    for entry in walk(root):
+        if accept is not None and not accept(entry.path):
+            continue
+        try:
+            item = (key(entry.stat(follow_symlinks=False)), entry.path)
+        except OSError:
+            continue
+        if (since is not None and item[0] < since) or (until is not None and item[0] > until) \
+                or (before is not None and item >= before):
+            continue
+        if len(newest) < n:
+            heapq.heappush(newest, item)
+        elif item > newest[0]:
+            heapq.heapreplace(newest, item)
+    return sorted(newest, reverse=True)
@@ -0,0 +1,220 @@
+"""
+Parallel, pruned directory walker shared by the filesystem servers.
+
+walk() lists directories concurrently with os.scandir on a thread pool
+(the listing syscalls release the GIL) and streams the file entries to the
+caller as they are found, so a caller that has what it needs can stop
+early and the walk stops with it. It never descends into:
+
+- directories matching an exclude glob (WALK_EXCLUDE): a glob without "/"
+  is matched against names (".git", "node_modules"), one with "/" against
+  full paths,
+- pseudo and network filesystems (/proc, /sys, NFS, SMB, sshfs mounts),
+  found in /proc/mounts where it exists,
+- symlinked directories, or beyond max_depth.
+
+Entries are os.DirEntry objects: is_dir()/is_file() come from the
+directory listing and stat() is cached on the entry, so callers stat each
+file at most once.
+"""
+import os
+import re
+import time
+import queue
+import fnmatch
+import logging
+import threading
+from functools import lru_cache
+from typing import FrozenSet, Iterable, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Names or paths (globs) never walked into
+WALK_EXCLUDE = [g.strip() for g in os.getenv(
+    "WALK_EXCLUDE", ".git,.hg,.svn,node_modules,__pycache__,/proc,/sys,/dev,/run"
+).split(",") if g.strip()]
+
+# Threads listing directories
+WALK_WORKERS = int(os.getenv("WALK_WORKERS", str(min(16, (os.cpu_count() or 1) * 2))))
+
+# Filesystem types that are not walked: kernel pseudo filesystems and network mounts
+SKIP_FSTYPES = frozenset({
+    "proc", "sysfs", "devtmpfs", "devpts", "cgroup", "cgroup2", "debugfs", "tracefs", "securityfs",
+    "pstore", "bpf", "configfs", "fusectl", "mqueue", "hugetlbfs", "autofs", "binfmt_misc",
+    "nfs", "nfs4", "cifs", "smbfs", "smb3", "afs", "9p", "fuse.sshfs", "fuse.rclone", "davfs", "ncpfs",
+})
+
+# Directory batches buffered between the walking threads and the caller
+_BUFFERED = 256
+_DONE = object()
+
+@lru_cache(maxsize=1)
+def skipped_mounts() -> FrozenSet[str]:
+    """Mount points of the filesystems in SKIP_FSTYPES, empty where /proc/mounts does not exist."""
+    mounts = set()
+    try:
+        with open("/proc/mounts", "r", encoding="utf-8") as f:
+            for line in f:
+                fields = line.split()
+                if len(fields) > 2 and fields[2] in SKIP_FSTYPES:
+                    # Mount points escape spaces and tabs as octal
+                    mounts.add(re.sub(r"\\([0-7]{3})", lambda m: chr(int(m.group(1), 8)), fields[1]))
+    except OSError:
+        pass
+    mounts.discard("/")
+    return frozenset(mounts)
+
+class Excluder:
+    """
+    Decides which paths a walk leaves out.
+    """
+    def __init__(self, globs: Iterable[str] = WALK_EXCLUDE, skip_mounts: bool = True):
+        """
+        Args:
+            globs (Iterable[str]): Name globs, or path globs if they contain "/".
+            skip_mounts (bool): Leave out pseudo and network filesystems.
+        """
+        globs = list(globs)
+        names = [fnmatch.translate(g) for g in globs if "/" not in g]
+        paths = [fnmatch.translate(g) for g in globs if "/" in g]
+        self._names = re.compile("|".join(names)) if names else None
+        self._paths = re.compile("|".join(paths)) if paths else None
+        self._mounts = skipped_mounts() if skip_mounts else frozenset()
+
+    def excludes(self, name: str, path: str) -> bool:
+        """Whether the entry with this name and path is left out."""
+        return bool((self._names is not None and self._names.match(name))
+                    or (self._paths is not None and self._paths.match(path))
+                    or path in self._mounts)
+
+    def excludes_path(self, path: str) -> bool:
+        """Whether the path or any directory above it is left out, for paths not found by a walk."""
+        while True:
+            parent, name = os.path.split(path)
+            if name and self.excludes(name, path):
+                return True
+            if not name or parent == path:
+                return False
+            path = parent
+
+DEFAULT_EXCLUDER = Excluder()
+
+class _Walk:
+    """
+    State shared by the threads of one walk.
+    """
+    def __init__(self, excluder: Excluder, max_depth: Optional[int], deadline: Optional[float]):
+        self.excluder = excluder
+        self.max_depth = max_depth
+        self.deadline = deadline
+        self.dirs: "queue.SimpleQueue[Optional[Tuple[str, int]]]" = queue.SimpleQueue()
+        self.out: "queue.Queue" = queue.Queue(maxsize=_BUFFERED)
+        self.stop = threading.Event()
+        self.timed_out = False
+        self._pending = 0
+        self._lock = threading.Lock()
+
+    def add(self, path: str, depth: int):
+        with self._lock:
+            self._pending += 1
+        self.dirs.put((path, depth))
+
+    def work(self, workers: int):
+        while not self.stop.is_set():
+            item = self.dirs.get()
+            if item is None:
+                return
+            path, depth = item
+            files: List[os.DirEntry] = []
+            try:
+                if self.deadline is not None and time.monotonic() > self.deadline:
+                    self.timed_out = True
+                    self.stop.set()
+                else:
+                    files = self._list(path, depth)
+            finally:
+                if files:
+                    self._emit(files)
+                with self._lock:
+                    self._pending -= 1
+                    finished = self._pending == 0
+                if finished or self.stop.is_set():
+                    for _ in range(workers):
+                        self.dirs.put(None)
+                    self._emit(_DONE)
+                    return
+
+    def _list(self, path: str, depth: int) -> List[os.DirEntry]:
+        """Lists a directory, queues its subdirectories and returns its files."""
+        files = []
+        try:
+            with os.scandir(path) as it:
+                for entry in it:
+                    if self.excluder.excludes(entry.name, entry.path):
+                        continue
+                    try:
+                        is_dir = entry.is_dir(follow_symlinks=False)
+                        if not is_dir and entry.is_symlink() and entry.is_dir():
+                            continue  # Symlinked directory, neither walked nor a file
+                    except OSError:
+                        continue
+                    if not is_dir:
+                        files.append(entry)
+                    elif self.max_depth is None or depth < self.max_depth:
+                        self.add(entry.path, depth + 1)
+        except OSError:
+            pass  # Unreadable or vanished directory
+        return files
+
+    def _emit(self, item):
+        while not self.stop.is_set() or item is _DONE:
+            try:
+                self.out.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                if item is _DONE:
+                    return  # The caller is gone
+                continue
+
+def walk(root: str, excluder: Excluder = DEFAULT_EXCLUDER, max_depth: Optional[int] = None,
+         timeout: Optional[float] = None, workers: int = WALK_WORKERS) -> Iterator[os.DirEntry]:
+    """
+    Yields the files under root, in no particular order, listing directories in parallel.
+
+    Args:
+        root (str): The directory to walk.
+        excluder (Excluder): What to leave out.
+        max_depth (Optional[int]): Levels of subdirectories walked into, None for all.
+        timeout (Optional[float]): Seconds after which the walk stops, None for no limit.
+        workers (int): Threads listing directories.
+
+    Yields:
+        os.DirEntry: Every file (anything that is not a directory) found.
+    """
+    workers = max(1, workers)
+    deadline = time.monotonic() + timeout if timeout is not None else None
+    state = _Walk(excluder, max_depth, deadline)
+    state.add(root, 0)
+    threads = [threading.Thread(target=state.work, args=(workers,), name="walker", daemon=True)
+               for _ in range(workers)]
+    for thread in threads:
+        thread.start()
+    try:
+        while True:
+            try:
+                batch = state.out.get(timeout=0.1)
+            except queue.Empty:
+                if deadline is not None and time.monotonic() > deadline:
+                    state.timed_out = True
+                    break
+                continue
+            if batch is _DONE:
+                break
+            yield from batch
+    finally:
+        # Also runs when the caller stops early: the threads finish their current directory and exit
+        state.stop.set()
+        for _ in range(workers):
+            state.dirs.put(None)
+    if state.timed_out:
+        logger.warning(f"Walk of {root} stopped after {timeout}s")
@@ -1,11 +1,15 @@
 from typing import Any
 import httpx
 from mcp.server.fastmcp import FastMCP
+import cancellation
 import os
 
 # Initialize FastMCP server
 mcp = FastMCP("weather")
 
+# Let the chat app cancel tool calls it no longer needs
+cancellation.install()
+
 # Constants
 NWS_API_BASE = "https://api.weather.gov"
 USER_AGENT = "weather-app/1.0"
@@ -0,0 +1,9 @@
+import os
+import sys
+
+# The app imports its packages from app/, the MCP servers their siblings from mcpservers/
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+for directory in ("app", "mcpservers"):
+    path = os.path.join(ROOT, directory)
+    if path not in sys.path:
+        sys.path.insert(0, path)
@@ -0,0 +1,117 @@
+import asyncio
+
+from graph import compaction
+from graph.compaction import compact_tool_output, history_text, select_passages
+from graph.history import ConversationBuffer, ToolResultStore
+from graph.nodes import initial_invoke, tool_call_and_second_invoke
+from graph.plan import execute_plan, synthesize_answer
+from graph.state import GraphState, MyState
+from utils.tokens import count_tokens
+
+
+def page(paragraphs=200):
+    body = [f"Paragraph {i} talks about topic{i % 7} with some filler words to make it long enough." for i in range(paragraphs)]
+    body[120] = "The quarterly revenue of Contoso grew by twelve percent."
+    return "Accept all cookies\nHome\nNews\nSports\nWeather\n\n" + "\n\n".join(body)
+
+
+def test_short_output_is_kept_as_is():
+    text = "A short result."
+    assert compact_tool_output(text, "anything", 100) is text
+    assert history_text(ToolResultStore(), text, "question") is text
+
+
+def test_long_output_keeps_relevant_passages_within_budget():
+    compacted = compact_tool_output(page(), "Contoso revenue", 200)
+    assert count_tokens(compacted) <= 220
+    assert "Contoso grew by twelve percent" in compacted
+    assert "cookies" not in compacted and "[…]" in compacted
+
+
+def test_history_text_stores_the_original():
+    store = ToolResultStore()
+    text = page()
+    shortened = history_text(store, text, "Contoso revenue", {"query": "Contoso"}, budget=200)
+    ref = shortened.rsplit('"ref": "', 1)[1].split('"')[0]
+    assert store.get(ref) == text
+    assert f'"{compaction.EXPAND_TOOL}"' in shortened
+
+
+def test_each_passage_is_counted_once(monkeypatch):
+    calls = []
+
+    def counting(text):
+        calls.append(text)
+        return count_tokens(text)
+
+    monkeypatch.setattr(compaction, "count_tokens", counting)
+    text = compaction.clean(page())
+    select_passages(text, "Contoso", 200)
+    assert len(calls) == len(set(calls))
+
+
+class LLM:
+    """Records the messages of each call and answers with the queued responses."""
+    def __init__(self, *responses):
+        self.responses = list(responses)
+        self.calls = []
+
+    async def ainvoke(self, messages, model=None):
+        self.calls.append(messages)
+        return self.responses.pop(0)
+
+
+def shortened_history(question="Contoso revenue"):
+    """A history holding a shortened page, and the ref of its original."""
+    history = ConversationBuffer(spill_dir=None)
+    shortened = history_text(history.results, page(), question, budget=200)
+    history.append_tool_results([("Tool result from web fetch below:\n", shortened)])
+    return history, shortened.rsplit('"ref": "', 1)[1].split('"')[0]
+
+
+class ToolManager:
+    tools = {}
+    catalog_version = 0
+
+
+def sent(messages):
+    return "\n".join(m["content"] for m in messages)
+
+
+def test_expanded_result_is_sent_in_full_for_the_current_message_only(monkeypatch):
+    monkeypatch.setattr(compaction, "TOOL_RESULT_BUDGET", 200)
+    history, ref = shortened_history()
+    full = history.results.get(ref)
+    my_state = MyState(user_input="What did paragraph 150 say?", chat_history=history)
+    my_state.tool_manager = ToolManager()
+    my_state.llm = LLM('{"tool_call": false, "response": "It talks about topic0."}')
+    config = {"configurable": {"my_state": my_state}}
+
+    state = GraphState(tool_invocation_needed=True, tool_server=compaction.RESULT_SERVER,
+                       tool_name=compaction.EXPAND_TOOL, tool_arguments={"ref": ref})
+    asyncio.run(tool_call_and_second_invoke(state, config))
+    asyncio.run(initial_invoke(GraphState(tool_result=full), config))
+
+    # The answer of this message was written from the full text
+    assert "Paragraph 150 talks" in sent(my_state.llm.calls[0])
+    # Later messages get the shortened result and a reference to read it again
+    later = sent(history.recent(10))
+    assert "Paragraph 150 talks" not in later
+    assert f'"ref": "{ref}"' in later and count_tokens(later) < 400
+
+
+def test_plan_step_expanding_a_result_keeps_it_out_of_the_history(monkeypatch):
+    monkeypatch.setattr(compaction, "TOOL_RESULT_BUDGET", 200)
+    history, ref = shortened_history()
+    my_state = MyState(user_input="What did paragraph 150 say?", chat_history=history)
+    my_state.llm = LLM("It talks about topic0.")
+    config = {"configurable": {"my_state": my_state}}
+    steps = [{"id": "s1", "tool_server": compaction.RESULT_SERVER, "tool": compaction.EXPAND_TOOL,
+              "tool_args": {"ref": ref}, "depends_on": []}]
+
+    asyncio.run(execute_plan(GraphState(plan=steps), config))
+    asyncio.run(synthesize_answer(GraphState(), config))
+
+    assert "Paragraph 150 talks" in sent(my_state.llm.calls[0])
+    later = sent(history.recent(10))
+    assert "Paragraph 150 talks" not in later and f'"ref": "{ref}"' in later
@@ -0,0 +1,55 @@
+import os
+
+from content_search import ContentSearch, MMAP_THRESHOLD
+
+
+def files(tmp_path, count=20):
+    paths = []
+    for i in range(count):
+        path = tmp_path / f"f{i}.txt"
+        path.write_text(f"first\nneedle {i}\nlast\n")
+        paths.append(str(path))
+    return paths
+
+
+def test_hit_limit_stops_the_search(tmp_path):
+    search = ContentSearch("needle", max_hits=3, workers=4)
+    assert len(search.run(files(tmp_path))) == 3
+    assert search.stats.stopped == "hit limit"
+
+
+def test_time_limit_stops_the_search(tmp_path):
+    search = ContentSearch("needle", timeout=0)
+    assert search.run(files(tmp_path)) == []
+    assert search.stats.stopped == "time limit"
+
+
+def test_cancelled_search_starts_no_files(tmp_path):
+    search = ContentSearch("needle")
+    search.cancel()
+    assert search.run(files(tmp_path)) == []
+    assert search.stats.stopped == "cancelled" and search.stats.files_scanned == 0
+
+
+def test_large_files_are_mapped_and_oversized_ones_skipped(tmp_path):
+    big = tmp_path / "big.log"
+    big.write_bytes(b"filler line\n" * (MMAP_THRESHOLD // 12 + 1) + b"the NEEDLE\n")
+    lines = big.read_bytes().count(b"\n")
+    hits = ContentSearch("needle").run([str(big)])
+    assert [(hit.line, hit.context.splitlines()[-1]) for hit in hits] == [(lines, f"{lines}> the NEEDLE")]
+
+    search = ContentSearch("needle", max_file_size=1024)
+    assert search.run([str(big)]) == [] and search.stats.files_skipped == 1
+
+
+def test_special_files_binary_files_and_regex(tmp_path):
+    fifo = tmp_path / "pipe"
+    os.mkfifo(fifo)
+    binary = tmp_path / "x.bin"
+    binary.write_bytes(b"needle\0")
+    text = tmp_path / "a.txt"
+    text.write_text("Needle\nneedle-2\n")
+    search = ContentSearch(r"needle-\d", regex=True, case_sensitive=True, context_lines=0)
+    hits = search.run([str(fifo), str(binary), str(text)])
+    assert [(hit.line, hit.context) for hit in hits] == [(2, "2> needle-2")]
+    assert search.stats.files_skipped == 2
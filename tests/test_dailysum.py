@@ -0,0 +1,90 @@
+import asyncio
+import os
+from datetime import datetime
+
+import pytest
+
+import dailysum
+from note_cache import SummaryCache
+from recent_index import RecentIndex, modified_at
+
+
+@pytest.fixture
+def vault(tmp_path, monkeypatch):
+    """Daily notes last edited in March 2023, restored today (their inode change time is now)."""
+    for day in range(1, 11):
+        path = tmp_path / f"2023-03-{day:02d}.md"
+        path.write_text(f"Worked on item {day}.\n")
+        ts = datetime(2023, 3, day, 12).timestamp()
+        os.utime(path, (ts, ts))
+    (tmp_path / "research").mkdir()
+    (tmp_path / "research" / "paper.md").write_text("A paper.\n")
+    index = RecentIndex(str(tmp_path), size=1000, rescan_interval=0, key=modified_at)
+    index.rescan()
+    monkeypatch.setattr(dailysum, "index", index)
+    monkeypatch.setattr(dailysum, "OBSIDIAN_VAULT_PATH", tmp_path)
+    monkeypatch.setattr(dailysum, "cache", SummaryCache(None, version=dailysum.SUMMARY_VERSION))
+    monkeypatch.setattr(dailysum, "DAILYSUM_WORKERS", 1)
+    return tmp_path
+
+
+def summarize(**kwargs):
+    return asyncio.run(dailysum.summarize_obsidian_notes(None, **kwargs))
+
+
+def test_window_uses_modification_time(vault):
+    result = summarize(since="2023-03-03", until="2023-03-05")
+    assert [note["file"] for note in result["notes"]] == ["2023-03-05.md", "2023-03-04.md", "2023-03-03.md"]
+    assert result["notes"][0]["modified"] == "2023-03-05 12:00"
+    assert result["notes"][0]["summary"] == "Worked on item 5."
+    assert "next_cursor" not in result
+
+
+def test_category_and_pages(vault):
+    assert [note["file"] for note in summarize(category="research")["notes"]] == [os.path.join("research", "paper.md")]
+    seen, cursor = [], None
+    while True:
+        result = summarize(category="daily", limit=3, **({"cursor": cursor} if cursor else {}))
+        seen += [note["file"] for note in result["notes"]]
+        cursor = result.get("next_cursor")
+        if not cursor:
+            break
+    assert seen == [f"2023-03-{day:02d}.md" for day in range(10, 0, -1)]
+
+
+def test_cursor_belongs_to_its_query(vault):
+    cursor = summarize(limit=2)["next_cursor"]
+    assert "error" in summarize(limit=2, cursor=cursor, category="daily")
+    assert summarize(cursor="not a cursor") == {"error": "Invalid cursor."}
+
+
+def test_notes_past_the_index_are_found(vault, monkeypatch):
+    index = RecentIndex(str(vault), size=3, rescan_interval=0, key=modified_at)
+    index.rescan()
+    monkeypatch.setattr(dailysum, "index", index)
+    result = summarize(until="2023-03-02")
+    assert [note["file"] for note in result["notes"]] == ["2023-03-02.md", "2023-03-01.md"]
+
+
+def test_broken_worker_pool_is_shut_down(vault, monkeypatch):
+    # A pool whose worker died, as after the out-of-memory killer
+    pool = dailysum.ProcessPoolExecutor(max_workers=2, mp_context=dailysum.multiprocessing.get_context("spawn"))
+    with pytest.raises(dailysum.BrokenProcessPool):
+        pool.submit(os._exit, 1).result()
+    shutdowns = []
+    shutdown = pool.shutdown
+    pool.shutdown = lambda **kwargs: shutdowns.append(kwargs) or shutdown(**kwargs)
+    monkeypatch.setattr(dailysum, "_pool", pool)
+    monkeypatch.setattr(dailysum, "DAILYSUM_WORKERS", 2)
+    monkeypatch.setattr(dailysum, "DAILYSUM_BATCH", 2)
+
+    async def run(paths):
+        return [item async for batch in dailysum.summarize_notes(paths) for item in batch]
+
+    paths = sorted(str(path) for path in vault.glob("*.md"))
+    results = asyncio.run(run(paths))
+    # Every note is summarized in threads instead, and the broken pool is shut down once and dropped
+    assert sorted(path for path, _, _ in results) == paths
+    assert all(summary and error is None for _, summary, error in results)
+    assert shutdowns == [{"wait": False, "cancel_futures": True}]
+    assert dailysum._pool is None
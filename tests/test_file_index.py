@@ -0,0 +1,124 @@
+import os
+
+import pytest
+
+from file_index import FileIndex, Segment
+
+
+def names(matches):
+    return sorted(os.path.basename(path) for _, path in matches)
+
+
+@pytest.fixture
+def tree(tmp_path):
+    root = tmp_path / "tree"
+    for path in ("Report.pdf", "report-2024.md", "notes/meeting report.txt", "notes/todo.md", "src/main.py"):
+        (root / path).parent.mkdir(parents=True, exist_ok=True)
+        (root / path).write_text(path)
+    return root
+
+
+@pytest.fixture
+def index(tree, tmp_path):
+    index = FileIndex(str(tree), index_dir=str(tmp_path / "idx"), rescan_interval=0)
+    index.rebuild()
+    return index
+
+
+def test_segment_round_trip(tmp_path):
+    entries = [("Alpha.txt", "/x/Alpha.txt"), ("bétä.md", "/x/y/bétä.md"), ("alphabet", "/alphabet"), ("", "/empty")]
+    path = str(tmp_path / "seg.idx")
+    assert Segment.write(path, entries) == 4
+    segment = Segment(path)
+    assert segment.count == 4
+    assert [segment.path_of(i) for i in range(4)] == [p for _, p in entries]
+    assert [segment.name_of(i) for i in range(4)] == ["alpha.txt", "bétä.md", "alphabet", ""]
+    assert list(segment.find(b"alpha")) == [0, 2]
+    assert list(segment.find("ét".encode())) == [1]
+    # One hit per entry, even when the name contains the query twice; no match across names
+    assert list(segment.find(b"t")) == [0, 1, 2]
+    assert list(segment.find(b"")) == [0, 1, 2, 3]
+
+
+def test_empty_segment(tmp_path):
+    path = str(tmp_path / "seg.idx")
+    Segment.write(path, [])
+    assert list(Segment(path).find(b"")) == []
+
+
+def test_segment_rejects_other_files(tmp_path):
+    path = tmp_path / "other"
+    path.write_bytes(b"x" * 64)
+    with pytest.raises(ValueError):
+        Segment(str(path))
+
+
+def test_search_is_case_insensitive(index):
+    assert names(index.search("REPORT")) == ["Report.pdf", "meeting report.txt", "report-2024.md"]
+    assert names(index.search("nothing")) == []
+
+
+def test_query_cannot_span_names(index):
+    assert names(index.search("pdf\nreport")) == []
+
+
+def test_fuzzy_search_leaves_out_substring_matches(index):
+    assert names(index.search_fuzzy("rpt")) == ["Report.pdf", "meeting report.txt", "report-2024.md"]
+    assert names(index.search_fuzzy("report")) == []
+
+
+def test_added_and_deleted_files_are_seen_before_a_rebuild(index, tree):
+    (tree / "new report.doc").write_text("x")
+    (tree / "Report.pdf").unlink()
+    index.apply([(False, str(tree / "new report.doc")), (True, str(tree / "Report.pdf"))])
+    assert names(index.search("report")) == ["meeting report.txt", "new report.doc", "report-2024.md"]
+    assert index.status()["pending_changes"] == 2
+
+
+def test_rename_and_directory_delete(index, tree):
+    os.rename(tree / "notes" / "todo.md", tree / "notes" / "done.md")
+    index.apply([(True, str(tree / "notes" / "todo.md")), (False, str(tree / "notes" / "done.md"))])
+    assert names(index.search(".md")) == ["done.md", "report-2024.md"]
+
+    # Deleting a directory hides everything that was under it
+    for path in (tree / "notes").iterdir():
+        path.unlink()
+    (tree / "notes").rmdir()
+    index.apply([(True, str(tree / "notes"))])
+    assert names(index.search("")) == ["Report.pdf", "main.py", "report-2024.md"]
+
+
+def test_directory_moved_in_is_indexed(index, tree, tmp_path):
+    outside = tmp_path / "outside"
+    (outside / "deep").mkdir(parents=True)
+    (outside / "deep" / "report.csv").write_text("x")
+    os.rename(outside, tree / "moved")
+    index.apply([(False, str(tree / "moved"))])
+    assert "report.csv" in names(index.search("report"))
+
+
+def test_rebuild_merges_the_delta_into_a_new_segment(index, tree):
+    (tree / "late.txt").write_text("x")
+    (tree / "src" / "main.py").unlink()
+    index.apply([(False, str(tree / "late.txt")), (True, str(tree / "src" / "main.py"))])
+    index.rebuild()
+    assert index.status()["pending_changes"] == 0
+    assert index.status()["entries"] == 5
+    assert names(index.search("late")) == ["late.txt"]
+    assert names(index.search("main")) == []
+
+
+def test_persisted_segment_answers_after_a_restart(index, tree, tmp_path):
+    restarted = FileIndex(str(tree), index_dir=str(tmp_path / "idx"), rescan_interval=0)
+    restarted.start()
+    try:
+        assert restarted.wait_ready(0)
+        assert names(restarted.search("todo")) == ["todo.md"]
+    finally:
+        restarted.stop()
+
+
+def test_delta_past_the_limit_triggers_a_rescan(index, tree):
+    index.delta_max = 1
+    index.apply([(False, str(tree / "a")), (False, str(tree / "b"))])
+    assert index._rescan.is_set()
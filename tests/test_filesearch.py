@@ -0,0 +1,118 @@
+import asyncio
+import os
+
+import pytest
+
+import filesearch
+from file_index import FileIndex
+
+
+@pytest.fixture
+def tree(tmp_path, monkeypatch):
+    root = tmp_path / "tree"
+    files = ["report", "report.pdf", "Report_final.docx", "annual report.md", "old/report.pdf",
+             "r-e-p-o-r-t.txt", "notes/weekly.md", "data/bin.dat"]
+    files += [f"bulk/report{i:02d}.txt" for i in range(30)]
+    for path in files:
+        (root / path).parent.mkdir(parents=True, exist_ok=True)
+        (root / path).write_text(f"line one\nthe needle in {path}\nline three\n")
+    (root / "data" / "bin.dat").write_bytes(b"needle\0binary")
+    index = FileIndex(str(root), index_dir=str(tmp_path / "idx"), rescan_interval=0)
+    index.rebuild()
+    monkeypatch.setattr(filesearch, "index", index)
+    monkeypatch.setattr(filesearch, "SEARCH_DIRECTORY", str(root))
+    return root
+
+
+def search_files(*args, **kwargs):
+    return asyncio.run(filesearch.search_files(*args, **kwargs))
+
+
+def relative(root, paths):
+    return [os.path.relpath(path, root) for path in paths]
+
+
+def test_ranking_tiers(tree):
+    results = relative(tree, search_files("report", limit=200)["results"])
+    # Exact name, then prefixes (shorter names first, then by path), then substrings, then fuzzy matches
+    assert results[:3] == ["report", os.path.join("old", "report.pdf"), "report.pdf"]
+    assert results[3:33] == [os.path.join("bulk", f"report{i:02d}.txt") for i in range(30)]
+    assert results[33:] == ["Report_final.docx", "annual report.md", "r-e-p-o-r-t.txt"]
+
+
+def test_pages_have_no_repeats_or_skips(tree):
+    everything = search_files("report", limit=200)["results"]
+    assert "next_cursor" not in search_files("report", limit=200)
+    paged, cursor = [], None
+    while True:
+        page = search_files("report", limit=7, cursor=cursor)
+        assert len(page["results"]) <= 7
+        paged += page["results"]
+        cursor = page.get("next_cursor")
+        if cursor is None:
+            break
+    assert paged == everything and len(everything) == 36
+
+
+def test_cursor_belongs_to_its_search(tree):
+    cursor = search_files("report", limit=2)["next_cursor"]
+    assert search_files("report", limit=2, extensions=["pdf"], cursor=cursor) == \
+        {"error": "The cursor belongs to a different search."}
+    assert search_files("report", cursor="!!") == {"error": "Invalid cursor."}
+
+
+def test_extensions_and_directory(tree):
+    pdfs = search_files("report", extensions=[".PDF"])["results"]
+    assert relative(tree, pdfs) == [os.path.join("old", "report.pdf"), "report.pdf"]
+    under = search_files("report", directory=str(tree / "old"))["results"]
+    assert relative(tree, under) == [os.path.join("old", "report.pdf")]
+
+
+def test_no_match(tree):
+    assert search_files("zzzz") == {"results": [], "message": "No matching files found."}
+    assert "error" in search_files("")
+
+
+def search_contents(**kwargs):
+    return asyncio.run(filesearch.search_file_contents(ctx=None, **kwargs))
+
+
+def test_content_search_skips_binary_files(tree):
+    result = search_contents(text="NEEDLE", directory=str(tree / "data"))
+    assert result["hits"] == [] and result["files_skipped"] == 1
+
+
+def test_content_search_stops_at_max_hits(tree):
+    result = search_contents(text="needle", directory=str(tree / "bulk"), max_hits=5)
+    assert len(result["hits"]) == 5 and result["stopped_at"] == "hit limit"
+    hit = result["hits"][0]
+    assert hit["line"] == 2 and "2> the needle in" in hit["context"] and "1: line one" in hit["context"]
+
+
+def test_content_search_errors(tree):
+    assert "error" in search_contents(text="(", regex=True)
+    assert "error" in search_contents(text="x", directory=str(tree / "missing"))
+
+
+def test_waiting_for_the_index_does_not_block_the_server(tmp_path, monkeypatch):
+    monkeypatch.setattr(filesearch, "index", FileIndex(str(tmp_path), index_dir=str(tmp_path / "idx"), rescan_interval=0))
+    monkeypatch.setattr(filesearch, "SEARCH_DIRECTORY", str(tmp_path))
+    monkeypatch.setattr(filesearch, "INDEX_WAIT", 0.3)
+
+    async def main():
+        ticks = 0
+
+        async def tick():
+            nonlocal ticks
+            while True:
+                await asyncio.sleep(0.01)
+                ticks += 1
+
+        ticker = asyncio.create_task(tick())
+        result = await filesearch.search_files("report")
+        ticker.cancel()
+        return result, ticks
+
+    result, ticks = asyncio.run(main())
+    assert "still being built" in result["error"]
+    assert ticks > 10
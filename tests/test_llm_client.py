@@ -0,0 +1,29 @@
+import asyncio
+
+import httpx
+import pytest
+
+from tools.llm_client import SingleLLMClient, LLMRequestError
+
+
+def client_for(handler):
+    client = SingleLLMClient("http://stub/v1/", "key", "m")
+    client._async_client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    return client
+
+
+def test_ainvoke_returns_the_completion():
+    def handler(request):
+        assert request.url.path == "/v1/chat/completions"
+        return httpx.Response(200, json={"choices": [{"message": {"content": "hello"}}]})
+
+    assert asyncio.run(client_for(handler).ainvoke([{"role": "user", "content": "hi"}])) == "hello"
+
+
+def test_error_status_raises_with_retry_after():
+    def handler(request):
+        return httpx.Response(429, text="slow down", headers={"Retry-After": "7"})
+
+    with pytest.raises(LLMRequestError) as e:
+        asyncio.run(client_for(handler).ainvoke([{"role": "user", "content": "hi"}]))
+    assert e.value.status == 429 and e.value.retry_after == 7.0 and e.value.retryable
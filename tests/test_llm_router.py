@@ -0,0 +1,101 @@
+import asyncio
+import json
+
+import httpx
+import pytest
+
+from tools import llm_router
+from tools.llm_client import LLMRequestError
+from tools.llm_router import RoutingLLMClient
+
+MESSAGES = [{"role": "user", "content": "hi"}]
+
+
+def completion(text):
+    return httpx.Response(200, json={"choices": [{"message": {"content": text}}]})
+
+
+class Stub:
+    """A local stub endpoint: answers after a delay with a status, and records what happened."""
+    def __init__(self, text, delay=0.0, status=200):
+        self.text = text
+        self.delay = delay
+        self.status = status
+        self.requests = 0
+        self.cancelled = 0
+
+    async def __call__(self, request):
+        self.requests += 1
+        assert json.loads(request.content)["messages"] == MESSAGES
+        try:
+            await asyncio.sleep(self.delay)
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        if self.status != 200:
+            return httpx.Response(self.status, text="error", headers={"Retry-After": "2"})
+        return completion(self.text)
+
+
+def router(*stubs):
+    client = RoutingLLMClient([{"endpoint": f"http://stub{i}/v1", "api_key": "k", "model": "m"}
+                               for i in range(len(stubs))])
+    for ep, stub in zip(client.endpoints, stubs):
+        ep._client = httpx.AsyncClient(transport=httpx.MockTransport(stub))
+    return client
+
+
+@pytest.fixture(autouse=True)
+def short_hedge_delay(monkeypatch):
+    monkeypatch.setattr(llm_router, "LLM_HEDGE_DELAY", 0.05)
+
+
+def test_slow_request_is_hedged_and_the_loser_cancelled():
+    slow, fast = Stub("slow", delay=5), Stub("fast")
+    client = router(slow, fast)
+    assert asyncio.run(client.ainvoke(MESSAGES)) == "fast"
+    # The loser was cancelled before ainvoke returned, and counted as a slow sample
+    assert slow.cancelled == 1 and fast.requests == 1
+    assert len(client.endpoints[0].latencies) == 1 and client.endpoints[0].latencies[0] >= 0.05
+
+
+def test_fast_request_is_not_hedged():
+    first, second = Stub("first"), Stub("second")
+    assert asyncio.run(router(first, second).ainvoke(MESSAGES)) == "first"
+    assert second.requests == 0
+
+
+def test_server_error_fails_over_and_cools_down():
+    broken, healthy = Stub("broken", status=503), Stub("healthy")
+    client = router(broken, healthy)
+
+    async def run():
+        assert await client.ainvoke(MESSAGES) == "healthy"
+        # The failed endpoint is ranked last during its cooldown
+        assert await client.ainvoke(MESSAGES) == "healthy"
+
+    asyncio.run(run())
+    assert broken.requests == 1 and healthy.requests == 2
+    assert not client.endpoints[0].healthy
+
+
+def test_client_errors_are_not_failed_over():
+    rejected, other = Stub("rejected", status=400), Stub("other")
+    with pytest.raises(LLMRequestError) as e:
+        asyncio.run(router(rejected, other).ainvoke(MESSAGES))
+    assert e.value.status == 400 and other.requests == 0
+
+
+def test_all_endpoints_failing_raises_the_last_error():
+    with pytest.raises(LLMRequestError) as e:
+        asyncio.run(router(Stub("a", status=502), Stub("b", status=429)).ainvoke(MESSAGES))
+    assert e.value.status == 429 and e.value.retry_after == 2.0
+
+
+def test_hedge_delay_follows_the_observed_p95(monkeypatch):
+    monkeypatch.setattr(llm_router, "LLM_HEDGE_MIN_SAMPLES", 5)
+    client = router(Stub("a"))
+    ep = client.endpoints[0]
+    assert ep.hedge_delay == 0.05
+    ep.latencies.extend([0.1] * 19 + [2.0])
+    assert ep.hedge_delay == 2.0
@@ -0,0 +1,103 @@
+import asyncio
+
+import pytest
+
+from tools.llm_client import LLMRequestError
+from tools.llm_scheduler import LLMScheduler, ScheduledLLMClient, INTERACTIVE, BACKGROUND
+
+
+def test_burst_of_429s_halves_the_limit_once():
+    async def run():
+        scheduler = LLMScheduler(max_concurrency=8, max_retries=0)
+        started = asyncio.Event()
+        running = 0
+
+        async def throttled():
+            nonlocal running
+            running += 1
+            if running == 8:
+                started.set()
+            await started.wait()
+            raise LLMRequestError("throttled", status=429, retry_after=0.01)
+
+        results = await asyncio.gather(*(scheduler.run(throttled, 10) for _ in range(8)), return_exceptions=True)
+        assert all(isinstance(r, LLMRequestError) for r in results)
+        return scheduler.limit
+
+    assert asyncio.run(run()) == 4.0
+
+
+def test_calls_sent_after_a_decrease_decrease_again():
+    async def run():
+        scheduler = LLMScheduler(max_concurrency=8, max_retries=0)
+
+        async def throttled():
+            raise LLMRequestError("throttled", status=429, retry_after=0.01)
+
+        for _ in range(2):
+            with pytest.raises(LLMRequestError):
+                await scheduler.run(throttled, 10)
+        return scheduler.limit
+
+    assert asyncio.run(run()) == 2.0
+
+
+def test_throttled_call_is_retried_after_retry_after():
+    async def run():
+        scheduler = LLMScheduler(max_concurrency=4)
+        attempts = []
+
+        async def call():
+            attempts.append(asyncio.get_running_loop().time())
+            if len(attempts) == 1:
+                raise LLMRequestError("throttled", status=429, retry_after=0.05)
+            return "ok"
+
+        assert await scheduler.run(call, 10) == "ok"
+        return attempts
+
+    attempts = asyncio.run(run())
+    assert len(attempts) == 2 and attempts[1] - attempts[0] >= 0.04
+
+
+def test_interactive_calls_are_admitted_before_background_work():
+    async def run():
+        scheduler = LLMScheduler(max_concurrency=1)
+        release = asyncio.Event()
+        order = []
+
+        async def blocker():
+            await release.wait()
+
+        def call(name):
+            async def record():
+                order.append(name)
+            return record
+
+        first = asyncio.ensure_future(scheduler.run(blocker, 10))
+        await asyncio.sleep(0)
+        queued = [asyncio.ensure_future(scheduler.run(call("background"), 10, BACKGROUND)),
+                  asyncio.ensure_future(scheduler.run(call("interactive"), 10, INTERACTIVE))]
+        await asyncio.sleep(0)
+        release.set()
+        await asyncio.gather(first, *queued)
+        return order
+
+    assert asyncio.run(run()) == ["interactive", "background"]
+
+
+def test_warm_up_goes_through_the_scheduler():
+    class Client:
+        model = "m"
+        warmed = False
+
+        async def awarm(self):
+            Client.warmed = True
+
+    async def run():
+        scheduler = LLMScheduler()
+        await ScheduledLLMClient(Client(), scheduler).with_priority(BACKGROUND).awarm()
+        return scheduler.requests.tokens
+
+    tokens = asyncio.run(run())
+    assert Client.warmed and tokens < 500
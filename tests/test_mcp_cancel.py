@@ -0,0 +1,77 @@
+import asyncio
+
+import anyio
+from mcp.server.fastmcp import Context, FastMCP
+from mcp.shared.memory import create_client_server_memory_streams
+
+import cancellation
+from tools.mcp_manager import MCPToolManager
+from tools.mcp_progress import ProgressClientSession
+
+cancellation.install()
+
+
+def make_server(seen, cancelled):
+    """A server whose tool records the request id it runs as and waits until it is cancelled."""
+    mcp = FastMCP("Test")
+
+    @mcp.tool()
+    async def echo(text: str) -> str:
+        return text
+
+    @mcp.tool()
+    async def wait(ctx: Context) -> str:
+        seen.append(ctx.request_id)
+        try:
+            await anyio.sleep(30)
+        except anyio.get_cancelled_exc_class():
+            cancelled.set()
+            raise
+        return "done"
+
+    return mcp._mcp_server
+
+
+async def with_manager(test):
+    seen, cancelled = [], asyncio.Event()
+    server = make_server(seen, cancelled)
+    async with create_client_server_memory_streams() as (client_streams, server_streams):
+        async with anyio.create_task_group() as tg:
+            tg.start_soon(lambda: server.run(*server_streams, server.create_initialization_options()))
+            async with ProgressClientSession(*client_streams) as session:
+                await session.initialize()
+                manager = MCPToolManager([])
+                manager.cassette = None
+                manager.sessions["Test"] = session
+                manager.cancellable.add("Test")
+                await test(manager, session, seen, cancelled)
+            tg.cancel_scope.cancel()
+
+
+def test_on_request_gets_the_id_the_request_is_sent_with():
+    async def test(manager, session, seen, cancelled):
+        ids = []
+        await session.call_tool("echo", {"text": "a"}, on_request=ids.append)
+        await session.call_tool("echo", {"text": "b"}, progress=lambda update: None, on_request=ids.append)
+        task = asyncio.create_task(session.call_tool("wait", {}, on_request=ids.append))
+        while not seen:
+            await asyncio.sleep(0.01)
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        assert ids[0] + 1 == ids[1] and str(ids[2]) == seen[0]
+
+    asyncio.run(with_manager(test))
+
+
+def test_cancelled_call_cancels_its_request_on_the_server():
+    async def test(manager, session, seen, cancelled):
+        # Calls sent before move the session's counter past the ids seen so far
+        await manager.call_tool("Test", "echo", {"text": "a"})
+        task = asyncio.create_task(manager.call_tool("Test", "wait", {}))
+        while not seen:
+            await asyncio.sleep(0.01)
+        task.cancel()
+        await asyncio.wait_for(cancelled.wait(), 5)
+        await asyncio.gather(task, return_exceptions=True)
+
+    asyncio.run(with_manager(test))
@@ -0,0 +1,36 @@
+import os
+
+from note_cache import SummaryCache
+
+
+def test_summaries_persist_across_instances(tmp_path):
+    path = str(tmp_path / "cache" / "summaries.sqlite3")
+    cache = SummaryCache(path)
+    cache.load()
+    cache.put("/vault/a.md", 1, 10, "summary of a")
+    cache.save()
+
+    reloaded = SummaryCache(path)
+    reloaded.load()
+    assert reloaded.get("/vault/a.md", 1, 10) == "summary of a"
+    assert reloaded.get("/vault/a.md", 2, 10) is None
+
+
+def test_unusable_cache_directory_is_not_fatal(tmp_path):
+    # The cache directory cannot be created where a file is in the way
+    blocker = tmp_path / "blocker"
+    blocker.write_text("")
+    cache = SummaryCache(os.path.join(str(blocker), "summaries.sqlite3"))
+    cache.load()
+    cache.put("/vault/a.md", 1, 10, "summary of a")
+    cache.save()
+    assert cache.get("/vault/a.md", 1, 10) == "summary of a"
+
+
+def test_file_in_the_working_directory(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    cache = SummaryCache("summaries.sqlite3")
+    cache.load()
+    cache.put("/vault/a.md", 1, 10, "summary of a")
+    cache.save()
+    assert os.path.exists(tmp_path / "summaries.sqlite3")
@@ -0,0 +1,155 @@
+import asyncio
+import json
+import os
+
+import pytest
+
+from graph import plan
+from graph.builder import build_plan_graph
+from graph.plan import execute_plan
+from graph.state import GraphState, MyState
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class ToolManager:
+    def __init__(self):
+        self.calls = []
+        self.tools = {"search": "google_search", "agent": "call_agent_iq"}
+        self.catalog_version = 0
+
+    async def call_tool(self, server, tool, args, progress=None):
+        self.calls.append((server, tool, args))
+        return f"{tool} result {len(self.calls)}"
+
+
+def step(step_id, tool, depends_on=()):
+    return {"id": step_id, "tool_server": "srv", "tool": tool, "tool_args": {"q": step_id},
+            "depends_on": list(depends_on)}
+
+
+class LLM:
+    """Answers with the queued responses in turn, recording the messages it got."""
+    def __init__(self, *responses):
+        self.responses = list(responses)
+        self.calls = []
+
+    async def ainvoke(self, messages, model=None):
+        self.calls.append(messages)
+        return self.responses.pop(0)
+
+
+def run_plan(steps, max_tool_uses=1):
+    my_state = MyState(user_input="question", max_tool_uses=max_tool_uses)
+    my_state.tool_manager = ToolManager()
+    command = asyncio.run(execute_plan(GraphState(plan=steps), {"configurable": {"my_state": my_state}}))
+    return my_state, command.update["step_results"]
+
+
+def prompt_example():
+    """The example plan of the planner prompt."""
+    with open(os.path.join(ROOT, "prompts", "prompt_plan.txt"), encoding="utf-8") as f:
+        template = f.read()
+    example = template.split("### **Example JSON return:**", 1)[1].split("###", 1)[0]
+    return example.replace("{{", "{").replace("}}", "}").strip()
+
+
+def test_the_prompt_example_plan_runs_end_to_end(monkeypatch):
+    monkeypatch.chdir(ROOT)  # The prompt templates are read relative to the repository
+    my_state = MyState(user_input="Compare the weather in Seattle and Boston")
+    my_state.tool_manager = ToolManager()
+    my_state.llm = LLM(prompt_example(), "Seattle is colder.")
+
+    result = asyncio.run(build_plan_graph().ainvoke(GraphState(), {"configurable": {"my_state": my_state}}))
+
+    assert [call[:2] for call in my_state.tool_manager.calls] == [
+        ("search", "google_search"), ("search", "google_search"), ("agent", "call_agent_iq")]
+    assert my_state.tool_manager.calls[2][2] == {"question": "Compare these results: google_search result 1 and google_search result 2"}
+    assert not any(r.startswith(("Tool usage limit", "Skipped")) for r in result["step_results"].values())
+    assert result["final_answer"] == "Seattle is colder."
+    assert "at most 4 times" in my_state.llm.calls[0][0]["content"]
+
+
+def test_plan_steps_respect_the_tool_usage_limit(monkeypatch):
+    monkeypatch.setattr(plan, "PLAN_MAX_TOOL_USES", 1)
+    my_state, results = run_plan([step("s1", "search"), step("s2", "search"), step("s3", "fetch", ["s2"])])
+    assert my_state.tool_manager.calls == [("srv", "search", {"q": "s1"})]
+    assert results["s1"] == "search result 1"
+    assert results["s2"].startswith("Tool usage limit reached: search")
+    assert results["s3"].startswith("Skipped: depends on failed steps")
+    assert my_state.tool_usage_counts == {"srv": {"search": 1}}
+
+
+def test_limit_is_shared_with_earlier_calls_of_the_message():
+    my_state = MyState(user_input="question", tool_usage_counts={"srv": {"fetch": 4}})
+    my_state.tool_manager = ToolManager()
+    command = asyncio.run(execute_plan(GraphState(plan=[step("s1", "fetch")]), {"configurable": {"my_state": my_state}}))
+    assert my_state.tool_manager.calls == []
+    assert command.update["step_results"]["s1"].startswith("Tool usage limit reached")
+
+
+def test_plan_limit_is_capped_by_the_plan_size(monkeypatch):
+    monkeypatch.setattr(plan, "PLAN_MAX_TOOL_USES", 100)
+    my_state, results = run_plan([step(f"s{i}", "search") for i in range(1, 10)])
+    assert len(my_state.tool_manager.calls) == plan.PLAN_MAX_STEPS
+
+
+def test_plan_limit_is_never_below_max_tool_uses(monkeypatch):
+    monkeypatch.setattr(plan, "PLAN_MAX_TOOL_USES", 1)
+    my_state, results = run_plan([step("s1", "search"), step("s2", "search")], max_tool_uses=2)
+    assert len(my_state.tool_manager.calls) == 2
+
+
+def planned(response, *steps):
+    return json.dumps({"response": response, "steps": list(steps)})
+
+
+def run_planner(*responses):
+    my_state = MyState(user_input="question")
+    my_state.tool_manager = ToolManager()
+    my_state.llm = LLM(*responses)
+    command = asyncio.run(plan.plan_invoke(GraphState(), {"configurable": {"my_state": my_state}}))
+    return my_state, command.update
+
+
+def test_no_steps_means_the_response_is_the_answer(monkeypatch):
+    monkeypatch.chdir(ROOT)
+    my_state, update = run_planner(planned("It is 4."))
+    assert update == {"plan": [], "final_answer": "It is 4."}
+    assert len(my_state.llm.calls) == 1
+
+
+def test_invalid_plan_is_sent_back_for_correction(monkeypatch):
+    monkeypatch.chdir(ROOT)
+    my_state, update = run_planner(
+        planned("I will search.", step("s1", "search", ["s9"])),
+        planned("I will search.", step("s1", "search")),
+    )
+    assert [s["id"] for s in update["plan"]] == ["s1"]
+    assert "depends on unknown steps" in my_state.llm.calls[1][-1]["content"]
+    assert my_state.final_answer == ""
+
+
+def test_plan_invalid_twice_gives_an_explicit_failure(monkeypatch):
+    monkeypatch.chdir(ROOT)
+    cycle = [step("s1", "search", ["s2"]), step("s2", "search", ["s1"])]
+    my_state, update = run_planner(planned("I will search.", *cycle), planned("I will search.", *cycle))
+    assert update["plan"] == []
+    assert update["final_answer"].startswith("Sorry, I could not plan")
+    assert "I will search." not in update["final_answer"]
+
+
+def test_referenced_steps_become_dependencies():
+    steps = plan.validate_plan([
+        {"id": "s1", "tool_server": "srv", "tool": "search", "tool_args": {"q": "Seattle"}},
+        {"id": "s2", "tool_server": "srv", "tool": "fetch", "tool_args": {"urls": ["$s1"], "note": "costs $5"}},
+    ])
+    assert steps[1]["depends_on"] == ["s1"]
+
+    my_state, results = run_plan(steps)
+    assert my_state.tool_manager.calls[1][2] == {"urls": ["search result 1"], "note": "costs $5"}
+
+
+def test_step_referencing_itself_is_invalid():
+    with pytest.raises(plan.PlanError, match="cycle"):
+        plan.validate_plan([{"id": "s1", "tool_server": "srv", "tool": "search", "tool_args": {"q": "$s1"}}])
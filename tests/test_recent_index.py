@@ -0,0 +1,81 @@
+import asyncio
+import os
+
+import recent_files
+from recent_index import RecentIndex
+
+
+def make_tree(root):
+    """One file in old/, then six newer files in new/."""
+    for directory, names in (("old", ["a.txt"]), ("new", [f"{i}.txt" for i in range(6)])):
+        os.makedirs(root / directory)
+        for name in names:
+            (root / directory / name).write_text(name)
+
+
+def test_full_index_sets_cutoff(tmp_path):
+    make_tree(tmp_path)
+    index = RecentIndex(str(tmp_path), size=5, rescan_interval=0)
+    index.rescan()
+    assert len(index.newest(10)) == 5
+    assert index.cutoff is not None
+    # old/a.txt fell out of the index
+    assert index.newest(10, lambda path: "/old/" in path) == []
+
+
+def test_index_holding_the_tree_has_no_cutoff(tmp_path):
+    make_tree(tmp_path)
+    index = RecentIndex(str(tmp_path), size=50, rescan_interval=0)
+    index.rescan()
+    assert index.cutoff is None
+    assert [path for _, path in index.newest(10, lambda path: "/old/" in path)] == [str(tmp_path / "old" / "a.txt")]
+
+
+def test_get_recent_files_walks_directory_past_cutoff(tmp_path, monkeypatch):
+    make_tree(tmp_path)
+    index = RecentIndex(str(tmp_path), size=5, rescan_interval=0)
+    index.rescan()
+    monkeypatch.setattr(recent_files, "index", index)
+    monkeypatch.setattr(recent_files, "SEARCH_DIRECTORY", str(tmp_path))
+
+    found = asyncio.run(recent_files.get_recent_files(n=5, directory=str(tmp_path / "old")))
+    assert len(found) == 1 and found[0].endswith(str(tmp_path / "old" / "a.txt"))
+
+    # Without a directory the answer says what the index covers
+    found = asyncio.run(recent_files.get_recent_files(n=10))
+    assert len(found) == 6 and found[-1].startswith("Note: the index only covers files changed after")
+
+
+def test_get_recent_files_within_index_has_no_note(tmp_path, monkeypatch):
+    make_tree(tmp_path)
+    index = RecentIndex(str(tmp_path), size=5, rescan_interval=0)
+    index.rescan()
+    monkeypatch.setattr(recent_files, "index", index)
+    monkeypatch.setattr(recent_files, "SEARCH_DIRECTORY", str(tmp_path))
+    found = asyncio.run(recent_files.get_recent_files(n=3))
+    assert len(found) == 3 and not any(line.startswith("Note") for line in found)
+
+
+def test_waiting_for_the_first_scan_does_not_block_the_server(tmp_path, monkeypatch):
+    index = RecentIndex(str(tmp_path), size=5, rescan_interval=0)  # Never scanned, so never ready
+    monkeypatch.setattr(recent_files, "index", index)
+    monkeypatch.setattr(recent_files, "SEARCH_DIRECTORY", str(tmp_path))
+    monkeypatch.setattr(recent_files, "INDEX_WAIT", 0.3)
+
+    async def main():
+        ticks = 0
+
+        async def tick():
+            nonlocal ticks
+            while True:
+                await asyncio.sleep(0.01)
+                ticks += 1
+
+        ticker = asyncio.create_task(tick())
+        found = await recent_files.get_recent_files(n=3)
+        ticker.cancel()
+        return found, ticks
+
+    found, ticks = asyncio.run(main())
+    assert found[0].startswith("Error:") and "still being scanned" in found[0]
+    assert ticks > 10
@@ -0,0 +1,62 @@
+import asyncio
+from types import SimpleNamespace
+
+from graph.history import ConversationBuffer
+from runtime.sessions import SessionRegistry, SESSION_RESET_NOTICE
+from ui import streamlit_handlers
+
+
+def test_resume_reopens_a_closed_session_once():
+    async def main():
+        registry = SessionRegistry(reap_interval=3600)
+        reopened = []
+
+        async def reopen():
+            reopened.append(True)
+            await registry.register("s1", None, ConversationBuffer())
+
+        first = await registry.resume("s1", None, reopen)
+        again = await registry.resume("s1", None, reopen)
+        await registry.close_all()
+        return first, again, reopened
+
+    first, again, reopened = asyncio.run(main())
+    assert (first, again, reopened) == (True, False, [True])
+
+
+class Graph:
+    """Answers every message with how many messages the history held before it."""
+    async def astream(self, state, stream_mode, config):
+        my_state = config["configurable"]["my_state"]
+        my_state.final_answer = f"{len(my_state.chat_history.recent(100))} earlier messages"
+        my_state.chat_history.append("user", my_state.user_input)
+        my_state.chat_history.append("assistant", my_state.final_answer)
+        yield {}
+
+
+def test_streamlit_message_after_the_session_was_reaped(monkeypatch):
+    registry = SessionRegistry(reap_interval=3600)
+    runtime = SimpleNamespace(graph=Graph(), llm=None, model_policy=None, local_router=None,
+                              cassette=None, langfuse_handler=None)
+
+    async def open_session(session):
+        await registry.register(session.session_id, None, session.chat_history)
+
+    monkeypatch.setattr(streamlit_handlers, "get_session_registry", lambda: registry)
+    monkeypatch.setattr(streamlit_handlers, "get_runtime", lambda: runtime)
+    monkeypatch.setattr(streamlit_handlers, "open_session", open_session)
+
+    async def main():
+        session = streamlit_handlers.StreamlitSession()
+        await open_session(session)
+        answers = [await streamlit_handlers.process_message(session, "one")]
+        answers.append(await streamlit_handlers.process_message(session, "two"))
+        await registry.close(session.session_id, "idle")
+        answers.append(await streamlit_handlers.process_message(session, "three"))
+        await registry.close_all()
+        return answers
+
+    first, second, after_reap = asyncio.run(main())
+    assert (first, second) == ("0 earlier messages", "2 earlier messages")
+    # The history is gone, and the answer says so
+    assert after_reap == f"_{SESSION_RESET_NOTICE}_\n\n0 earlier messages"
@@ -0,0 +1,16 @@
+import os
+import importlib.util
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+spec = importlib.util.spec_from_file_location("startup", os.path.join(ROOT, "benchmarks", "startup.py"))
+startup = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(startup)
+
+def test_only_server_scripts_are_benchmarked():
+    server_dir = os.path.join(ROOT, "mcpservers")
+    servers = {name for name in os.listdir(server_dir)
+               if name.endswith(".py") and startup.is_server_script(os.path.join(server_dir, name))}
+    assert {"filesearch.py", "recent_files.py", "dailysum.py", "obsidian.py"} <= servers
+    assert not servers & {"walker.py", "file_index.py", "recent_index.py", "content_search.py",
+                          "note_cache.py", "progress.py", "cancellation.py", "cursor.py"}
@@ -0,0 +1,52 @@
+import os
+
+from walker import walk, Excluder
+
+NO_EXCLUDES = Excluder([], skip_mounts=False)
+
+
+def walked(root, **kwargs):
+    return sorted(os.path.relpath(entry.path, root) for entry in walk(str(root), **kwargs))
+
+
+def make_tree(root):
+    for path in ("a.txt", "sub/b.txt", "sub/deep/c.txt", "node_modules/d.js", ".git/HEAD"):
+        (root / path).parent.mkdir(parents=True, exist_ok=True)
+        (root / path).write_text(path)
+
+
+def test_matches_os_walk(tmp_path):
+    make_tree(tmp_path)
+    expected = sorted(os.path.relpath(os.path.join(folder, name), tmp_path)
+                      for folder, _, names in os.walk(tmp_path) for name in names)
+    assert walked(tmp_path, excluder=NO_EXCLUDES) == expected
+
+
+def test_symlinked_directory_is_not_walked_or_yielded(tmp_path):
+    make_tree(tmp_path)
+    (tmp_path / "linked").symlink_to(tmp_path / "sub", target_is_directory=True)
+    (tmp_path / "link.txt").symlink_to(tmp_path / "a.txt")
+    files = walked(tmp_path, excluder=NO_EXCLUDES)
+    assert not any(path.startswith("linked") for path in files)
+    # Symlinks to files are files, as in os.walk
+    assert "link.txt" in files
+
+
+def test_excludes_names_and_paths(tmp_path):
+    make_tree(tmp_path)
+    excluder = Excluder(["node_modules", ".git", str(tmp_path / "sub" / "deep")], skip_mounts=False)
+    assert walked(tmp_path, excluder=excluder) == ["a.txt", os.path.join("sub", "b.txt")]
+
+
+def test_max_depth(tmp_path):
+    make_tree(tmp_path)
+    assert walked(tmp_path, excluder=NO_EXCLUDES, max_depth=0) == ["a.txt"]
+
+
+def test_stops_early(tmp_path):
+    for i in range(50):
+        (tmp_path / f"d{i}").mkdir()
+        (tmp_path / f"d{i}" / "f.txt").write_text("x")
+    entries = walk(str(tmp_path), excluder=NO_EXCLUDES, workers=4)
+    assert next(entries).name == "f.txt"
+    entries.close()